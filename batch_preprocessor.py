@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from mri_preprocessor import (INTERMEDIATE_STAGES, PREVIEW_FORMATS, add_preprocessing_arguments,
+                              open_preprocessing_cache, preprocessing_options_from_args, run_preprocessing)
+
+MANIFEST_FILENAME = "batch_manifest.json"
+
+
+def is_nifti_path(path):
+    return path.endswith('.nii') or path.endswith('.nii.gz')
+
+
+def discover_studies(root_dir):
+    """
+    Walks root_dir and returns the studies found in it: every NIfTI file,
+    and every directory that directly contains .dcm files (one DICOM series each).
+    """
+    studies = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        if any(f.endswith('.dcm') for f in filenames):
+            studies.append(dirpath)
+        studies.extend(os.path.join(dirpath, f) for f in sorted(filenames) if is_nifti_path(f))
+    return studies
+
+
+def read_study_list(list_path):
+    """
+    Reads a study list file: one NIfTI file or DICOM series directory per line.
+    Blank lines and lines starting with '#' are ignored.
+    """
+    with open(list_path, 'r') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def study_output_name(study_path, base_dir):
+    """
+    Derives a flat, unique output directory name for a study from its path relative to base_dir:
+    the path with separators replaced by '__' and the NIfTI extension dropped, plus a short hash
+    of the full relative path, since flattening alone maps a__b/c and a/b__c (or x.nii and
+    x.nii.gz) to the same name.
+    """
+    relative = os.path.relpath(os.path.abspath(study_path), os.path.abspath(base_dir))
+    if relative in ('.', ''):
+        relative = os.path.basename(os.path.abspath(study_path))
+    digest = hashlib.sha1(relative.encode()).hexdigest()[:8]
+    for suffix in ('.nii.gz', '.nii'):
+        if relative.endswith(suffix):
+            relative = relative[:-len(suffix)]
+            break
+    return f"{relative.replace(os.sep, '__')}_{digest}"
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {"studies": {}}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Writes the manifest atomically so an interrupted run never leaves a truncated file.
+    """
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, manifest_path)
+
+
+def _process_study(study_path, output_dir, target_shape, threshold_factor, dicom_workers, keep_intermediates,
+                   cache_dir=None, cache_max_gb=10.0, save_dtype='float32', preprocess_options=None,
+                   preview_format=None):
+    """
+    Worker entry point. Runs in a pool process and returns a manifest entry instead of raising.
+    """
+    try:
+        cache = open_preprocessing_cache(cache_dir, cache_max_gb)
+        summary = run_preprocessing(study_path, output_dir, target_shape, threshold_factor,
+                                    dicom_workers=dicom_workers, keep_intermediates=keep_intermediates,
+                                    cache=cache, save_dtype=save_dtype,
+                                    preprocess_options=preprocess_options, preview_format=preview_format)
+        return {"status": "done", "output_dir": output_dir, **summary}
+    except Exception as e:
+        return {"status": "failed", "output_dir": output_dir, "error": str(e)}
+
+
+def run_batch(studies, base_dir, output_root, target_shape=(128, 128, 128), threshold_factor=0.1,
+              workers=None, dicom_workers=1, keep_intermediates=(), retry_failed=False,
+              cache_dir=None, cache_max_gb=10.0, save_dtype='float32', preprocess_options=None,
+              preview_format=None):
+    """
+    Preprocesses every study on a process pool, recording per-study status in a manifest
+    under output_root. Studies already marked done (and failed ones, unless retry_failed)
+    are skipped, so an interrupted run resumes where it stopped.
+    Returns the manifest and an aggregate throughput summary.
+    """
+    os.makedirs(output_root, exist_ok=True)
+    manifest_path = os.path.join(output_root, MANIFEST_FILENAME)
+    manifest = load_manifest(manifest_path)
+    entries = manifest["studies"]
+
+    skip_statuses = {"done"} if retry_failed else {"done", "failed"}
+    pending = [s for s in studies if entries.get(s, {}).get("status") not in skip_statuses]
+    print(f"Found {len(studies)} studies, {len(studies) - len(pending)} already processed, {len(pending)} to run.")
+
+    for study_path in pending:
+        entries[study_path] = {"status": "pending",
+                               "output_dir": os.path.join(output_root, study_output_name(study_path, base_dir))}
+    save_manifest(manifest, manifest_path)
+
+    start_time = time.perf_counter()
+    completed, failed, total_voxels, cache_hits = 0, 0, 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_process_study, study_path, entries[study_path]["output_dir"], target_shape,
+                            threshold_factor, dicom_workers, tuple(keep_intermediates),
+                            cache_dir, cache_max_gb, save_dtype, preprocess_options,
+                            preview_format): study_path
+            for study_path in pending
+        }
+        for future in as_completed(futures):
+            study_path = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                # _process_study never raises, so this is the pool itself failing
+                # (e.g. BrokenProcessPool after a worker was killed).
+                entry = {"status": "failed", "output_dir": entries[study_path]["output_dir"],
+                         "error": f"{type(e).__name__}: {e}"}
+            entries[study_path] = entry
+            save_manifest(manifest, manifest_path)
+
+            if entry["status"] == "done":
+                completed += 1
+                total_voxels += entry["input_voxels"]
+                cache_hits += entry["cache_hit"]
+                print(f"[{completed + failed}/{len(pending)}] Done: {study_path} ({entry['seconds']:.2f}s)")
+            else:
+                failed += 1
+                print(f"[{completed + failed}/{len(pending)}] Failed: {study_path}: {entry['error']}")
+
+    elapsed = time.perf_counter() - start_time
+    summary = {
+        "processed": completed,
+        "failed": failed,
+        "skipped": len(studies) - len(pending),
+        "elapsed_seconds": elapsed,
+        "studies_per_minute": completed / elapsed * 60 if elapsed > 0 else 0.0,
+        "voxels_per_second": total_voxels / elapsed if elapsed > 0 else 0.0,
+        "cache_hits": cache_hits,
+    }
+    print(f"Batch complete: {completed} processed, {failed} failed, {summary['skipped']} skipped in {elapsed:.1f}s "
+          f"({summary['studies_per_minute']:.1f} studies/min, {summary['voxels_per_second']:.3g} voxels/s).")
+    if cache_dir:
+        print(f"Preprocessing cache: {cache_hits} hits, {completed - cache_hits} misses.")
+    print(f"Per-study status written to {manifest_path}")
+    return manifest, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch MRI preprocessing over a study tree or a study list.")
+    parser.add_argument("input", type=str,
+                        help="Root directory to search for NIfTI files and DICOM series, or a text file listing one study path per line.")
+    parser.add_argument("--output_dir", type=str, default="./processed_mri_batch",
+                        help="Root directory for per-study outputs and the status manifest.")
+    parser.add_argument("--target_shape", type=str, default="128,128,128",
+                        help="Target shape for resizing, e.g., '128,128,128'.")
+    parser.add_argument("--threshold_factor", type=float, default=0.1,
+                        help="Threshold factor for simple skull stripping (0.0 to 1.0).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: number of CPUs).")
+    parser.add_argument("--dicom_workers", type=int, default=1,
+                        help="DICOM decode threads per worker process.")
+    parser.add_argument("--keep_intermediates", nargs="*", default=[], choices=INTERMEDIATE_STAGES,
+                        help="Intermediate stages to save as .npy for every study.")
+    parser.add_argument("--retry_failed", action="store_true",
+                        help="Re-run studies the manifest marks as failed.")
+    parser.add_argument("--save_dtype", type=str, default="float32", choices=["float32", "float16"],
+                        help="Dtype of each study's saved processed volume.")
+    parser.add_argument("--preview_format", type=str, default=None, choices=PREVIEW_FORMATS,
+                        help="Also write axial, coronal and sagittal previews for every study.")
+    add_preprocessing_arguments(parser)
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Directory of the preprocessed-volume cache shared by all workers. Disabled if not set.")
+    parser.add_argument("--cache_max_gb", type=float, default=10.0,
+                        help="Size cap of the preprocessed-volume cache in GB.")
+
+    args = parser.parse_args()
+    target_shape = tuple(map(int, args.target_shape.split(',')))
+
+    if os.path.isdir(args.input):
+        base_dir = args.input
+        studies = discover_studies(args.input)
+    else:
+        studies = read_study_list(args.input)
+        base_dir = os.path.commonpath([os.path.abspath(s) for s in studies]) if studies else os.getcwd()
+        if len(studies) == 1:
+            base_dir = os.path.dirname(base_dir)
+
+    if not studies:
+        print(f"No NIfTI files or DICOM series found in {args.input}.")
+        return
+
+    run_batch(studies, base_dir, args.output_dir, target_shape, args.threshold_factor,
+              workers=args.workers, dicom_workers=args.dicom_workers,
+              keep_intermediates=args.keep_intermediates, retry_failed=args.retry_failed,
+              cache_dir=args.cache_dir, cache_max_gb=args.cache_max_gb, save_dtype=args.save_dtype,
+              preprocess_options=preprocessing_options_from_args(args), preview_format=args.preview_format)
+
+
+if __name__ == "__main__":
+    main()
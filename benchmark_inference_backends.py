@@ -0,0 +1,87 @@
+import time
+import argparse
+
+import numpy as np
+
+from benchmark_resampling import make_phantom
+from inference_backends import AUTOCAST_DTYPES, INFERENCE_BACKENDS, build_inference_model
+
+
+def dice(a, b):
+    """
+    Binary Dice between two masks (1.0 when both are empty).
+    """
+    total = np.count_nonzero(a) + np.count_nonzero(b)
+    return 2.0 * np.count_nonzero(a & b) / total if total else 1.0
+
+
+def run_backend(model, batch, repeats, threshold=0.5):
+    """
+    Runs one untimed warm-up pass (tracing, compilation, session start-up), then `repeats`
+    timed passes over batch. Returns (per-pass wall times in seconds, masks of the last pass).
+    """
+    import torch
+    from segmentation_engine import threshold_batch_output
+
+    with torch.inference_mode():
+        model(batch)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            output = model(batch)
+            times.append(time.perf_counter() - start)
+    return times, threshold_batch_output(output, threshold).astype(bool)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CPU inference backends against eager PyTorch.")
+    parser.add_argument("--volume_shape", type=str, default="128,128,128",
+                        help="Shape of each synthetic input volume.")
+    parser.add_argument("--batch_size", type=int, default=2,
+                        help="Volumes per forward pass.")
+    parser.add_argument("--backends", nargs="+", default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS,
+                        help="Backends to benchmark.")
+    parser.add_argument("--autocast", nargs="*", default=[], choices=AUTOCAST_DTYPES,
+                        help="Also benchmark the torch backends under these autocast dtypes.")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Intra-op threads for every backend (default: the backend's setting).")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Timed passes per backend.")
+    parser.add_argument("--model_path", type=str, default=None,
+                        help="Path to a trained state_dict (.pt); the dummy model is used if not set.")
+
+    args = parser.parse_args()
+    import torch
+    from segmentation_engine import load_model
+
+    shape = tuple(map(int, args.volume_shape.split(',')))
+    torch.manual_seed(0)
+    model = load_model(args.model_path, device='cpu')
+    volumes = np.stack([make_phantom(shape, seed=i)[0] for i in range(args.batch_size)])
+    batch = torch.from_numpy(volumes)[:, None]
+    print(f"{args.batch_size} x {shape} volumes per pass, {args.repeats} timed passes, "
+          f"{torch.get_num_threads() if args.threads is None else args.threads} threads.")
+
+    configurations = [(backend, None) for backend in args.backends]
+    configurations += [(backend, dtype) for dtype in args.autocast for backend in args.backends if backend != 'onnx']
+    reference = None
+    print(f"{'backend':<18} {'p50 ms':>9} {'min ms':>9} {'vol/s':>8} {'dice vs eager':>14}")
+    for backend, dtype in configurations:
+        name = backend + (f"+{dtype}" if dtype else "")
+        try:
+            runnable = build_inference_model(model, backend, threads=args.threads, autocast=dtype,
+                                             example_shape=(1, 1) + shape)
+            times, masks = run_backend(runnable, batch, args.repeats)
+        except Exception as e:
+            print(f"{name:<18} failed: {e}")
+            continue
+        if backend == 'eager' and dtype is None:
+            # Eager fp32 is listed first and is the reference for every other configuration.
+            reference = masks
+        agreement = np.mean([dice(m, r) for m, r in zip(masks, reference)]) if reference is not None else float('nan')
+        print(f"{name:<18} {np.median(times) * 1000:>9.1f} {min(times) * 1000:>9.1f} "
+              f"{args.batch_size / np.median(times):>8.2f} {agreement:>14.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import argparse
+import tempfile
+
+import numpy as np
+
+from benchmark_resampling import make_phantom, time_call
+from mask_codec import MASK_CODECS, decode_mask, encode_mask
+
+
+def make_lesion_mask(shape, num_lesions=3, seed=0):
+    """
+    Sparse uint8 mask like a typical prediction: a few small ellipsoidal lesions labelled 1,
+    each with a label-2 core.
+    """
+    rng = np.random.default_rng(seed)
+    mask = np.zeros(shape, dtype=np.uint8)
+    grids = np.indices(shape, sparse=True)
+    for _ in range(num_lesions):
+        centre = [rng.uniform(0.3, 0.7) * n for n in shape]
+        radii = [rng.uniform(0.03, 0.08) * n for n in shape]
+        distance = np.sqrt(sum(((g - c) / r) ** 2 for g, c, r in zip(grids, centre, radii)))
+        mask[distance < 1.0] = 1
+        mask[distance < 0.5] = 2
+    return mask
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare .bmsk mask encodings against NIfTI .nii.gz.")
+    parser.add_argument("--shape", type=str, default="256,256,180",
+                        help="Mask shape.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9],
+                        help="zlib compression levels to try for .bmsk.")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Timed runs per configuration; the best run is reported.")
+
+    args = parser.parse_args()
+    import nibabel as nib
+
+    shape = tuple(map(int, args.shape.split(',')))
+    masks = {
+        "lesions": make_lesion_mask(shape),
+        "phantom": make_phantom(shape)[1],
+        "binary": (make_lesion_mask(shape) > 0).astype(np.uint8),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mask.nii.gz")
+        print(f"Mask shape {shape}, best of {args.repeats} runs.")
+        print(f"{'mask':<8} {'format':<14} {'bytes':>10} {'ratio':>7} {'encode ms':>10} {'decode ms':>10} {'exact':>6}")
+        for name, mask in masks.items():
+            image = nib.Nifti1Image(mask, np.eye(4))
+            encode_time, _ = time_call(lambda: nib.save(image, path), args.repeats)
+            reference_size = os.path.getsize(path)
+            decode_time, decoded = time_call(lambda: np.asarray(nib.load(path).dataobj), args.repeats)
+            print(f"{name:<8} {'nii.gz':<14} {reference_size:>10} {1.0:>6.1f}x {1000 * encode_time:>10.1f} "
+                  f"{1000 * decode_time:>10.1f} {str(np.array_equal(decoded, mask)):>6}")
+
+            for codec in MASK_CODECS:
+                for level in args.levels:
+                    encode_time, data = time_call(lambda: encode_mask(mask, codec, level, np.eye(4)), args.repeats)
+                    decode_time, (decoded, _) = time_call(lambda: decode_mask(data), args.repeats)
+                    print(f"{name:<8} {f'{codec} z{level}':<14} {len(data):>10} {reference_size / len(data):>6.1f}x "
+                          f"{1000 * encode_time:>10.1f} {1000 * decode_time:>10.1f} "
+                          f"{str(np.array_equal(decoded, mask)):>6}")
+
+
+if __name__ == "__main__":
+    main()
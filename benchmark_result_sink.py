@@ -0,0 +1,67 @@
+import os
+import time
+import argparse
+import tempfile
+
+from result_sink import ResultSink, SQLiteTable
+
+
+class DelayedTable:
+    """
+    Wraps a table and sleeps latency_ms before every insert call, like a database round trip.
+    """
+
+    def __init__(self, table, latency_ms):
+        self.table = table
+        self.latency_ms = latency_ms
+
+    def insert(self, rows):
+        time.sleep(self.latency_ms / 1000)
+        self.table.insert(rows)
+
+
+def make_row(index):
+    return {"input_data_path": f"scan_{index}", "segmentation_mask_path": f"segmentation_mask_scan_{index}.nii.gz",
+            "segment_1_volume_mm3": 1000.0 + index, "lesion_count": index % 7,
+            "dice_score_class_1": 0.9, "processed_at": "2024-01-01T00:00:00+00:00", "device_used": "cpu"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one blocking insert per result with the buffered ResultSink.")
+    parser.add_argument("--rows", type=int, default=500,
+                        help="Result rows to store.")
+    parser.add_argument("--latency_ms", type=float, default=20.0,
+                        help="Simulated round-trip time of every insert call.")
+    parser.add_argument("--batch_rows", type=int, default=100,
+                        help="ResultSink max_rows.")
+
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        direct = DelayedTable(SQLiteTable(os.path.join(tmp, "direct.sqlite")), args.latency_ms)
+        start = time.perf_counter()
+        for i in range(args.rows):
+            direct.insert([make_row(i)])
+        direct_seconds = time.perf_counter() - start
+
+        table = SQLiteTable(os.path.join(tmp, "buffered.sqlite"))
+        sink = ResultSink(DelayedTable(table, args.latency_ms), os.path.join(tmp, "journal.jsonl"),
+                          max_rows=args.batch_rows)
+        start = time.perf_counter()
+        for i in range(args.rows):
+            sink.put(make_row(i))
+        put_seconds = time.perf_counter() - start
+        sink.close()
+        buffered_seconds = time.perf_counter() - start
+        stored = len(table.select())
+
+    print(f"{args.rows} rows, {args.latency_ms:.0f} ms per insert call.")
+    print(f"{'mode':<18} {'total s':>8} {'rows/s':>9} {'caller ms/row':>14}")
+    print(f"{'blocking insert':<18} {direct_seconds:>8.3f} {args.rows / direct_seconds:>9.0f} "
+          f"{1000 * direct_seconds / args.rows:>14.3f}")
+    print(f"{'ResultSink':<18} {buffered_seconds:>8.3f} {args.rows / buffered_seconds:>9.0f} "
+          f"{1000 * put_seconds / args.rows:>14.3f}")
+    print(f"Rows stored by ResultSink: {stored}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+
+import numpy as np
+
+from benchmark_resampling import time_call
+from skull_stripping import morphological_brain_mask, threshold_mask
+from spatial_transforms import bounding_box
+
+
+def make_head_phantom(shape, seed=0):
+    """
+    Synthetic head: a brain ellipsoid with darker ventricles inside a dark skull shell and a
+    bright scalp shell, in a noisy background (magnitude of Gaussian noise, as in MRI).
+    Returns a float32 volume and the boolean brain mask.
+    """
+    rng = np.random.default_rng(seed)
+    grids = np.meshgrid(*[np.linspace(-1, 1, n, dtype=np.float32) for n in shape], indexing='ij')
+    radius = np.sqrt(sum((g / r) ** 2 for g, r in zip(grids, (0.75, 0.65, 0.8))))
+    brain = radius < 0.85
+    volume = np.zeros(shape, dtype=np.float32)
+    volume[brain] = 0.7 - 0.2 * radius[brain]
+    volume[radius < 0.25] = 0.25                          # ventricles (CSF)
+    volume[(radius >= 0.85) & (radius < 0.95)] = 0.04     # skull
+    volume[(radius >= 0.95) & (radius < 1.05)] = 0.8      # scalp and fat
+    volume = np.abs(volume + 0.06 * rng.standard_normal(shape).astype(np.float32))
+    return volume, brain
+
+
+def dice(a, b):
+    total = int(a.sum()) + int(b.sum())
+    return 2.0 * int((a & b).sum()) / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the global-threshold and proxy morphology skull strips.")
+    parser.add_argument("--shape", type=str, default="256,256,180",
+                        help="Shape of the synthetic head phantom.")
+    parser.add_argument("--threshold_factor", type=float, default=0.1,
+                        help="Intensity threshold relative to the maximum, shared by both methods.")
+    parser.add_argument("--proxy_factors", type=int, nargs="+", default=[1, 2, 4],
+                        help="Downsampling factors of the morphology proxy (1 = full resolution).")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Timed runs per method; the best run is reported.")
+
+    args = parser.parse_args()
+    shape = tuple(map(int, args.shape.split(',')))
+    volume, brain = make_head_phantom(shape)
+    threshold_time, reference = time_call(lambda: threshold_mask(volume, args.threshold_factor), args.repeats)
+
+    print(f"Head phantom {shape}, best of {args.repeats} runs. Dice is against the true brain mask;"
+          f" 'vs threshold' is the overlap with the current global threshold.")
+    print(f"{'method':<14} {'seconds':>8} {'dice':>7} {'vs threshold':>13} {'bbox voxels':>12}")
+    methods = [("threshold", threshold_time, reference)]
+    for factor in args.proxy_factors:
+        seconds, mask = time_call(
+            lambda: morphological_brain_mask(volume, args.threshold_factor, proxy_factor=factor), args.repeats)
+        methods.append((f"morphology x{factor}", seconds, mask))
+    for name, seconds, mask in methods:
+        box = bounding_box(mask)
+        box_fraction = np.prod(np.subtract(box[1], box[0])) / volume.size if box else 0.0
+        print(f"{name:<14} {seconds:>8.3f} {dice(mask, brain):>7.4f} {dice(mask, reference):>13.4f} "
+              f"{box_fraction:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
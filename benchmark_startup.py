@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+# Commands timed by default: argument parsing only, plus a full trend run on the dummy client.
+DEFAULT_COMMANDS = (
+    "segmentation_engine.py --help",
+    "mri_preprocessor.py --help",
+    "batch_preprocessor.py --help",
+    "security_utils.py --help",
+    "trend_analyzer.py --help",
+    "trend_analyzer.py --patient_id P001 --supabase_url YOUR_SUPABASE_URL --supabase_key YOUR_SUPABASE_ANON_KEY",
+)
+
+
+def time_command(argv, repeats):
+    """
+    Runs a Python command `repeats` times in fresh interpreters and returns the wall times in seconds.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def import_profile(argv, top=8):
+    """
+    Runs the command once under `-X importtime` and returns the `top` top-level packages by
+    cumulative import time as (package, seconds) pairs, plus the total import time.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime"] + argv,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Only top-level entries (no leading indentation) carry a package's full cumulative time.
+        if name.startswith(" ") and not name.startswith("  "):
+            package = name.strip()
+            packages[package] = packages.get(package, 0) + int(cumulative) / 1e6
+    total = sum(packages.values())
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return ranked, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI start-up time and where import time goes.")
+    parser.add_argument("--commands", nargs="+", default=list(DEFAULT_COMMANDS),
+                        help="Commands to time, each given as one quoted string relative to the repository.")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Fresh-interpreter runs per command; best and median are reported.")
+    parser.add_argument("--top", type=int, default=8,
+                        help="Number of slowest top-level imports listed per command.")
+    parser.add_argument("--output_file", type=str, default=None,
+                        help="Also write the report to this file.")
+
+    args = parser.parse_args()
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+    lines = [f"Python {sys.version.split()[0]}, best/median of {args.repeats} runs"]
+    for command in args.commands:
+        argv = command.split()
+        argv[0] = os.path.join(repo_dir, argv[0])
+        times = time_command(argv, args.repeats)
+        ranked, total = import_profile(argv, args.top)
+        lines.append("")
+        lines.append(f"$ python {command}")
+        lines.append(f"  wall: best {min(times):.3f} s, median {statistics.median(times):.3f} s; "
+                     f"imports: {total:.3f} s")
+        for package, seconds in ranked:
+            lines.append(f"    {seconds:8.3f} s  {package}")
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output_file:
+        with open(args.output_file, 'w') as f:
+            f.write(report + "\n")
+        print(f"\nReport written to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import numpy as np
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(filepath, hasher=None):
+    """
+    Feeds a file's bytes into a sha256 hasher in fixed-size chunks and returns the hasher.
+    """
+    hasher = hasher or hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher
+
+
+def hash_input(input_path):
+    """
+    Content hash of an MRI input. Files are hashed byte for byte; DICOM series directories
+    are identified by their sorted SOPInstanceUIDs, which avoids reading any pixel data.
+    """
+    hasher = hashlib.sha256()
+    if os.path.isdir(input_path):
+        import pydicom
+
+        uids = sorted(
+            str(pydicom.dcmread(os.path.join(input_path, f), stop_before_pixels=True).SOPInstanceUID)
+            for f in os.listdir(input_path) if f.endswith('.dcm')
+        )
+        if not uids:
+            raise ValueError("No DICOM files found in the directory.")
+        hasher.update("\n".join(uids).encode())
+    else:
+        hash_file(input_path, hasher)
+    return hasher.hexdigest()
+
+
+def make_cache_key(*parts):
+    """
+    Combines content hashes and JSON-serializable parameters into a single cache key.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class DiskCache:
+    """
+    On-disk cache of numpy arrays plus JSON metadata, with a total size cap and LRU eviction.
+
+    Each entry is a directory holding one .npy file per array and a meta.json. Arrays are
+    returned as copy-on-write memory maps, and an entry's modification time is bumped on every hit so
+    eviction removes the least recently used entries first.
+    """
+
+    def __init__(self, cache_dir, max_bytes=10 * 1024 ** 3, name="cache"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """
+        Returns (arrays, metadata) for key, or None on a miss.
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, "meta.json"), 'r') as f:
+                entry = json.load(f)
+            # Copy-on-write maps: callers may modify the arrays without touching the cached files.
+            arrays = {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode='c')
+                      for name in entry["arrays"]}
+            os.utime(entry_dir)
+        except (FileNotFoundError, ValueError, KeyError):
+            # Missing, partially evicted or unreadable entries all count as misses.
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays, entry["metadata"]
+
+    def put(self, key, arrays, metadata):
+        """
+        Stores arrays (dict of name -> ndarray) and JSON-serializable metadata under key,
+        then evicts least recently used entries until the cache fits its size cap.
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        with open(os.path.join(tmp_dir, "meta.json"), 'w') as f:
+            json.dump({"arrays": list(arrays), "metadata": metadata, "created_at": time.time()}, f)
+
+        # Publish the entry atomically; concurrent writers of the same key produce identical data.
+        if os.path.exists(entry_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def invalidate(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _entries(self):
+        """
+        Returns (mtime, size, path) for every complete entry in the cache.
+        """
+        entries = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+                if '.tmp-' in key:
+                    continue
+                try:
+                    size = sum(e.stat().st_size for e in os.scandir(entry_dir))
+                    entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+                except FileNotFoundError:
+                    continue
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Removes least recently used entries until the total size is within max_bytes.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes(),
+            "max_bytes": self.max_bytes,
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"{self.name.capitalize()} stats: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evictions, "
+              f"{stats['size_bytes'] / 1024 ** 2:.1f} / {stats['max_bytes'] / 1024 ** 2:.1f} MB used.")
@@ -0,0 +1,159 @@
+import os
+import inspect
+import tempfile
+
+import numpy as np
+
+# Inference backends selectable through load_model / build_inference_model.
+INFERENCE_BACKENDS = ('eager', 'torchscript', 'compile', 'onnx')
+AUTOCAST_DTYPES = ('bf16', 'fp16')
+DEFAULT_EXAMPLE_SHAPE = (1, 1, 32, 32, 32)
+
+
+def eager_model(model):
+    """
+    The eager torch module a backend model was built from (the model itself if it is eager).
+    Frozen TorchScript and onnxruntime models carry no state_dict, so weights are read here.
+    """
+    while hasattr(model, 'source_model'):
+        model = model.source_model
+    return model
+
+
+class ConvertedModel:
+    """
+    A TorchScript or torch.compile model, callable like it, that keeps the eager module it was
+    converted from as source_model.
+    """
+
+    def __init__(self, model, source_model):
+        self.model = model
+        self.source_model = source_model
+
+    def __call__(self, input_tensor):
+        return self.model(input_tensor)
+
+
+class AutocastModel:
+    """
+    Runs a torch callable under autocast (bf16 or fp16) on the input's device type (cpu, cuda,
+    mps) and returns float32 outputs, so callers thresholding the output see the same dtype as
+    with fp32 inference. source_model is the eager module the callable was built from.
+    """
+
+    def __init__(self, model, dtype, source_model=None):
+        self.model = model
+        self.dtype = dtype
+        self.source_model = source_model if source_model is not None else model
+
+    def __call__(self, input_tensor):
+        import torch
+
+        with torch.autocast(input_tensor.device.type, dtype=self.dtype):
+            return self.model(input_tensor).float()
+
+
+class OnnxRuntimeModel:
+    """
+    Wraps an onnxruntime CPU session so it can be called like a torch model:
+    takes a (B, C, D, H, W) float32 tensor and returns a float32 tensor.
+    temp_dir is a tempfile.TemporaryDirectory holding onnx_path that the wrapper owns;
+    it is removed by close() or when the wrapper is garbage collected. source_model is the
+    eager module the graph was exported from, if known.
+    """
+
+    def __init__(self, onnx_path, threads=None, temp_dir=None, source_model=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.onnx_path = onnx_path
+        self.temp_dir = temp_dir
+        if source_model is not None:
+            self.source_model = source_model
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, input_tensor):
+        import torch
+
+        array = np.ascontiguousarray(input_tensor.detach().cpu().numpy(), dtype=np.float32)
+        return torch.from_numpy(self.session.run(None, {self.input_name: array})[0])
+
+    def close(self):
+        if self.temp_dir is not None:
+            self.temp_dir.cleanup()
+            self.temp_dir = None
+
+
+def export_onnx(model, onnx_path, example_shape=DEFAULT_EXAMPLE_SHAPE):
+    """
+    Exports model to ONNX with dynamic batch and spatial axes, so one file serves any volume size.
+    The example input is created on the model's device, so a model already moved to a GPU exports too.
+    """
+    import torch
+
+    example = torch.zeros(example_shape, device=next(model.parameters()).device)
+    dynamic_axes = {'input': {0: 'batch', 2: 'depth', 3: 'height', 4: 'width'},
+                    'output': {0: 'batch', 2: 'depth', 3: 'height', 4: 'width'}}
+    # Newer torch defaults to the dynamo exporter; the TorchScript-based one handles dynamic_axes directly.
+    extra = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(model, example, onnx_path, input_names=['input'], output_names=['output'],
+                          dynamic_axes=dynamic_axes, opset_version=17, **extra)
+    return onnx_path
+
+
+def build_inference_model(model, backend='eager', threads=None, autocast=None,
+                          example_shape=DEFAULT_EXAMPLE_SHAPE, onnx_path=None):
+    """
+    Converts an eager model in eval mode into the requested inference backend.
+
+    'eager' returns the model as is, 'torchscript' traces it with example_shape, 'compile'
+    wraps it with torch.compile, and 'onnx' exports it (to onnx_path, or a temporary file)
+    and runs it with onnxruntime. threads sets the intra-op thread count (torch's global
+    setting, or the onnxruntime session's). autocast ('bf16' or 'fp16') runs the torch
+    backends under autocast on the input's device; onnxruntime always runs the exported
+    fp32 graph. A temporary ONNX file is owned and removed by the returned OnnxRuntimeModel.
+    The result is callable on a (B, C, D, H, W) tensor like the original model, and every
+    converted backend keeps the original as source_model (see eager_model).
+    """
+    import torch
+
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from {INFERENCE_BACKENDS}.")
+    if autocast is not None and autocast not in AUTOCAST_DTYPES:
+        raise ValueError(f"Unknown autocast dtype '{autocast}'. Choose from {AUTOCAST_DTYPES}.")
+    if threads:
+        torch.set_num_threads(threads)
+
+    if backend == 'onnx':
+        if autocast:
+            print(f"Warning: autocast '{autocast}' is not applied to the onnxruntime backend; running fp32.")
+        temp_dir = None
+        if onnx_path is None:
+            temp_dir = tempfile.TemporaryDirectory(prefix="segmentation_onnx_")
+            onnx_path = os.path.join(temp_dir.name, "model.onnx")
+        try:
+            export_onnx(model, onnx_path, example_shape)
+            return OnnxRuntimeModel(onnx_path, threads, temp_dir, source_model=model)
+        except BaseException:
+            if temp_dir is not None:
+                temp_dir.cleanup()
+            raise
+
+    source_model = model
+    if backend == 'torchscript':
+        with torch.no_grad():
+            example = torch.zeros(example_shape, device=next(model.parameters()).device)
+            model = torch.jit.freeze(torch.jit.trace(model, example))
+    elif backend == 'compile':
+        model = torch.compile(model)
+
+    if autocast:
+        return AutocastModel(model, torch.bfloat16 if autocast == 'bf16' else torch.float16, source_model)
+    if model is not source_model:
+        return ConvertedModel(model, source_model)
+    return model
@@ -0,0 +1,155 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from disk_cache import DiskCache, hash_file, make_cache_key
+
+# perform_inference options that only affect speed, not the output, and so stay out of cache keys.
+RUNTIME_ONLY_OPTIONS = ('threads', 'patch_batch_size')
+MODEL_INDEX_FILENAME = "models.json"
+
+
+def array_fingerprint(array):
+    """
+    Content hash of an array: dtype, shape and raw bytes.
+    """
+    array = np.ascontiguousarray(array)
+    hasher = hashlib.sha256(f"{array.dtype.str}{array.shape}".encode())
+    hasher.update(memoryview(array).cast('B'))
+    return hasher.hexdigest()
+
+
+def model_fingerprint(model, model_path=None):
+    """
+    Hash of the weights the model runs with: every state_dict tensor of the eager module it
+    was built from (inference_backends.eager_model; frozen TorchScript and onnxruntime models
+    have no state_dict of their own) in key order, plus the checkpoint file's bytes, since
+    TorchScript int8 models keep their packed weights outside the state_dict.
+    Returns None when neither is available, or when load_model fell back to the randomly
+    initialized dummy model (is_dummy), whose outputs must never be cached.
+    """
+    from inference_backends import eager_model
+
+    model = eager_model(model)
+    if getattr(model, "is_dummy", False):
+        return None
+    hasher = hashlib.sha256()
+    found = False
+    state_dict = getattr(model, "state_dict", None)
+    if callable(state_dict):
+        for name, tensor in state_dict().items():
+            hasher.update(name.encode())
+            if hasattr(tensor, "detach"):
+                tensor = tensor.detach().cpu()
+                if tensor.is_quantized:
+                    tensor = tensor.int_repr()
+                tensor = tensor.contiguous().numpy()
+            hasher.update(array_fingerprint(np.asarray(tensor)).encode())
+            found = True
+    if model_path and os.path.exists(model_path):
+        hasher.update(hash_file(model_path).digest())
+        found = True
+    return hasher.hexdigest() if found else None
+
+
+class InferenceCache:
+    """
+    Caches segmentation masks and probability maps (float16) on disk, keyed by the model's
+    weights, the preprocessed input's content and every inference option that changes the
+    output. Size cap and LRU eviction come from DiskCache.
+
+    bind_model() must be called with the loaded model first. It also remembers the fingerprint
+    per checkpoint path in models.json, so when a checkpoint file changes, the entries made with
+    its previous weights are removed right away instead of waiting to be evicted.
+    """
+
+    def __init__(self, cache_dir, max_bytes=5 * 1024 ** 3):
+        self.cache = DiskCache(cache_dir, max_bytes=max_bytes, name="inference cache")
+        self.fingerprint = None
+        self.model_options = {}
+
+    def bind_model(self, model, model_path=None, model_options=None):
+        """
+        Fingerprints the loaded model; model_options (backend, autocast, quantized, ...) join
+        every key. Returns False, leaving the cache disabled, when the model cannot be fingerprinted.
+        """
+        self.fingerprint = model_fingerprint(model, model_path)
+        self.model_options = dict(model_options or {})
+        if self.fingerprint is None:
+            print("Warning: Cannot fingerprint the model (or it is the untrained dummy model); "
+                  "the inference cache is disabled.")
+            return False
+        if model_path:
+            previous = self._update_model_index(os.path.abspath(model_path), self.fingerprint)
+            if previous is not None and previous != self.fingerprint:
+                removed = self.invalidate_model(previous)
+                print(f"Model checkpoint {model_path} changed; removed {removed} stale inference cache entries.")
+        return True
+
+    def _update_model_index(self, model_path, fingerprint):
+        index_path = os.path.join(self.cache.cache_dir, MODEL_INDEX_FILENAME)
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            index = {}
+        previous = index.get(model_path)
+        index[model_path] = fingerprint
+        tmp_path = f"{index_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=4)
+        os.replace(tmp_path, index_path)
+        return previous
+
+    def invalidate_model(self, fingerprint):
+        """
+        Removes every entry produced by the model with the given fingerprint. Returns the count.
+        """
+        removed = 0
+        for _, _, entry_dir in self.cache._entries():
+            try:
+                with open(os.path.join(entry_dir, "meta.json"), 'r') as f:
+                    entry_fingerprint = json.load(f)["metadata"].get("model_fingerprint")
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+            if entry_fingerprint == fingerprint:
+                self.cache.invalidate(os.path.basename(entry_dir))
+                removed += 1
+        return removed
+
+    def key(self, volume, inference_options=None):
+        params = {k: v for k, v in (inference_options or {}).items() if k not in RUNTIME_ONLY_OPTIONS}
+        return make_cache_key(self.fingerprint, array_fingerprint(volume), self.model_options, params)
+
+    def get(self, volume, inference_options=None):
+        """
+        Returns (mask, probabilities) for a cached prediction, or None on a miss.
+        """
+        if self.fingerprint is None:
+            return None
+        cached = self.cache.get(self.key(volume, inference_options))
+        if cached is None:
+            return None
+        arrays, _ = cached
+        return arrays["mask"], arrays["probabilities"]
+
+    def put(self, volume, inference_options, mask, probabilities):
+        if self.fingerprint is None:
+            return
+        self.cache.put(self.key(volume, inference_options),
+                       {"mask": mask, "probabilities": np.asarray(probabilities, dtype=np.float16)},
+                       {"model_fingerprint": self.fingerprint})
+
+    def print_stats(self):
+        self.cache.print_stats()
+
+
+def open_inference_cache(cache_dir, max_gb=5.0):
+    """
+    Returns an InferenceCache, or None when cache_dir is not set.
+    """
+    if not cache_dir:
+        return None
+    return InferenceCache(cache_dir, max_bytes=int(max_gb * 1024 ** 3))
@@ -0,0 +1,251 @@
+import io
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+import numpy as np
+
+from inference_backends import AUTOCAST_DTYPES, INFERENCE_BACKENDS
+
+DEFAULT_PORT = 8765
+LATENCY_WINDOW = 1000
+
+
+def encode_array(array):
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_array(payload):
+    return np.load(io.BytesIO(payload), allow_pickle=False)
+
+
+class DynamicBatcher:
+    """
+    Groups queued volumes into batches for one model call.
+
+    A background thread waits for the first request, then keeps collecting until either
+    max_batch_size requests are queued or max_wait_ms has passed since the first one.
+    Requests of the same shape in a batch are inferred together through infer_fn, which maps a
+    list of volumes to a list of masks in the same order. Each submit() returns a Future.
+    """
+
+    def __init__(self, infer_fn, max_batch_size=4, max_wait_ms=20):
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = Counter()
+        self.completed = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dynamic-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, volume):
+        future = Future()
+        self._queue.put((volume, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[0].shape, []).append(request)
+            for requests in groups.values():
+                self._infer_group(requests)
+
+    def _infer_group(self, requests):
+        try:
+            masks = self.infer_fn([volume for volume, _, _ in requests])
+        except Exception as e:
+            with self._lock:
+                self.failed += len(requests)
+            for _, future, _ in requests:
+                future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        with self._lock:
+            self.batch_sizes[len(requests)] += 1
+            self.completed += len(requests)
+            self._latencies.extend(finished - submitted for _, _, submitted in requests)
+        for (_, future, _), mask in zip(requests, masks):
+            future.set_result((mask, len(requests)))
+
+    def metrics(self):
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            return {
+                "queue_depth": self._queue.qsize(),
+                "completed": self.completed,
+                "failed": self.failed,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                "latency_ms_p95": float(np.percentile(latencies, 95)) if len(latencies) else None,
+                "latency_window": len(latencies),
+            }
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+
+def make_batch_infer_fn(model, device, memory_budget_mb=2048):
+    """
+    Returns an infer_fn running same-shape volumes through perform_batch_inference, which
+    stacks them into (B, 1, D, H, W) forward passes within memory_budget_mb.
+    """
+    from segmentation_engine import perform_batch_inference
+
+    def infer(volumes):
+        return list(perform_batch_inference(model, volumes, device, memory_budget_mb=memory_budget_mb))
+
+    return infer
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /segment with an .npy volume returns the .npy uint8 mask.
+    GET /metrics returns batcher statistics as JSON; GET /health returns {"status": "ok"}.
+    """
+
+    server_version = "BrainMRIInference/1.0"
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send_json(200, self.server.batcher.metrics())
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/segment":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            volume = decode_array(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if volume.ndim != 3:
+                raise ValueError(f"Expected a 3D volume, got shape {volume.shape}.")
+        except Exception as e:
+            self._send_json(400, {"error": f"Invalid volume: {e}"})
+            return
+        try:
+            mask, batch_size = self.server.batcher.submit(volume).result()
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send(200, encode_array(mask), "application/octet-stream", {"X-Batch-Size": str(batch_size)})
+
+    def log_message(self, format, *args):
+        # Per-request access logs would flood the console at batch rates; /metrics covers them.
+        pass
+
+
+def request_segmentation(server_url, volume, timeout=600):
+    """
+    Client side of POST /segment: sends a preprocessed volume and returns the uint8 mask.
+    """
+    request = Request(f"{server_url.rstrip('/')}/segment", data=encode_array(np.asarray(volume, dtype=np.float32)),
+                      headers={"Content-Type": "application/octet-stream"}, method="POST")
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return decode_array(response.read())
+    except HTTPError as e:
+        raise RuntimeError(f"Inference server error {e.code}: {e.read().decode(errors='replace')}") from e
+
+
+def fetch_metrics(server_url, timeout=10):
+    with urlopen(f"{server_url.rstrip('/')}/metrics", timeout=timeout) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local segmentation inference server with dynamic batching.")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="Address to bind. Keep the default so the server is only reachable locally.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="Port to listen on.")
+    parser.add_argument("--model_path", type=str, default=None,
+                        help="Path to the trained PyTorch model state_dict file (.pt).")
+    parser.add_argument("--quantized", action="store_true",
+                        help="model_path is an int8 TorchScript checkpoint from quantization.py (CPU only).")
+    parser.add_argument("--max_batch_size", type=int, default=4,
+                        help="Largest number of volumes inferred in one forward pass.")
+    parser.add_argument("--max_wait_ms", type=float, default=20,
+                        help="How long the first queued volume waits for others to join its batch.")
+    parser.add_argument("--memory_budget_mb", type=float, default=2048,
+                        help="Memory budget for one forward pass; larger batches are split into chunks that fit.")
+    parser.add_argument("--inference_threads", type=int, default=None,
+                        help="Intra-op threads used for inference (default: the backend's setting).")
+    parser.add_argument("--backend", type=str, default="eager", choices=INFERENCE_BACKENDS,
+                        help="Inference backend: eager PyTorch, TorchScript trace or torch.compile on the selected device, "
+                             "or onnxruntime, which always runs on the CPU.")
+    parser.add_argument("--autocast", type=str, default=None, choices=AUTOCAST_DTYPES,
+                        help="Run the torch backends under bf16/fp16 autocast on the selected device.")
+
+    args = parser.parse_args()
+
+    from segmentation_engine import load_model, select_device
+
+    device = select_device() if not args.quantized else "cpu"
+    model = load_model(args.model_path, device=device, backend=args.backend,
+                       threads=args.inference_threads, autocast=args.autocast, quantized=args.quantized)
+
+    batcher = DynamicBatcher(make_batch_infer_fn(model, device, args.memory_budget_mb), args.max_batch_size, args.max_wait_ms)
+    server = ThreadingHTTPServer((args.host, args.port), InferenceRequestHandler)
+    server.daemon_threads = True
+    server.batcher = batcher
+    print(f"Inference server listening on http://{args.host}:{args.port} (device {device}, "
+          f"max batch {args.max_batch_size}, max wait {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down inference server.")
+    finally:
+        server.server_close()
+        batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
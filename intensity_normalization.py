@@ -0,0 +1,212 @@
+import numpy as np
+
+# Normalization modes supported by normalize_volume.
+NORMALIZATION_MODES = ('minmax', 'percentile', 'zscore')
+DEFAULT_SLAB_SIZE = 16
+DEFAULT_MAX_BINS = 65536
+
+
+def slab_regions(shape, slab_size=DEFAULT_SLAB_SIZE, axis=-1):
+    """
+    Yields index tuples that split a volume of `shape` into slabs of slab_size along axis.
+    The tuples work on ndarrays, np.memmap and volume_io.LazyVolume alike.
+    """
+    axis = axis % len(shape)
+    for start in range(0, shape[axis], slab_size):
+        region = [slice(None)] * len(shape)
+        region[axis] = slice(start, min(start + slab_size, shape[axis]))
+        yield tuple(region)
+
+
+class IntensityStats:
+    """
+    Streaming intensity statistics: exact min/max/mean/std plus a histogram for percentiles.
+
+    The histogram uses bins of a power-of-two width anchored at zero. When new data would
+    need more than max_bins bins, the width is doubled and neighbouring bins are merged,
+    so a single pass never needs the value range up front. Integer data within
+    max_bins distinct values (e.g. most int16 scans) keeps unit-width, exact bins.
+    """
+
+    def __init__(self, max_bins=DEFAULT_MAX_BINS):
+        self.max_bins = max_bins
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self.bin_width = None
+        self.integer = False
+        self._first_bin = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _coarsen(self, factor_log2):
+        """
+        Multiplies the bin width by 2**factor_log2, merging the existing counts.
+        """
+        scale = 2 ** factor_log2
+        self.bin_width *= scale
+        self.integer = False
+        if not len(self.counts):
+            return
+        absolute = np.arange(self._first_bin, self._first_bin + len(self.counts))
+        merged = np.floor_divide(absolute, scale)
+        new_first = int(merged[0])
+        self.counts = np.bincount(merged - new_first, weights=self.counts).astype(np.int64)
+        self._first_bin = new_first
+
+    def update(self, values):
+        """
+        Adds a block of voxel values (any shape) to the statistics.
+        """
+        values = np.asarray(values).ravel()
+        if values.size == 0:
+            return
+        block_min, block_max = float(values.min()), float(values.max())
+
+        if self.bin_width is None:
+            self.integer = bool(np.issubdtype(values.dtype, np.integer))
+            if self.integer:
+                self.bin_width = 1.0
+            else:
+                # Start fine and let _coarsen widen the bins as the observed range grows.
+                magnitude = max(abs(block_min), abs(block_max), np.finfo(np.float32).eps)
+                self.bin_width = 2.0 ** (np.floor(np.log2(magnitude)) - 24)
+
+        low = min(self.min, block_min)
+        high = max(self.max, block_max)
+        span = np.floor(high / self.bin_width) - np.floor(low / self.bin_width) + 1
+        if span > self.max_bins:
+            self._coarsen(int(np.ceil(np.log2(span / self.max_bins))))
+            # Flooring can leave one bin over the limit; one more doubling always fits.
+            if np.floor(high / self.bin_width) - np.floor(low / self.bin_width) + 1 > self.max_bins:
+                self._coarsen(1)
+
+        # The histogram always spans exactly the bins of [min, max] seen so far.
+        first = int(np.floor(low / self.bin_width))
+        last = int(np.floor(high / self.bin_width))
+        if first != self._first_bin or len(self.counts) != last - first + 1:
+            counts = np.zeros(last - first + 1, dtype=np.int64)
+            if len(self.counts):
+                counts[self._first_bin - first:self._first_bin - first + len(self.counts)] = self.counts
+            self.counts, self._first_bin = counts, first
+        indices = np.floor(values / self.bin_width).astype(np.int64)
+        self.counts += np.bincount(indices - first, minlength=len(self.counts))
+
+        self.min, self.max = low, high
+        self.count += values.size
+        self._sum += float(values.sum(dtype=np.float64))
+        self._sum_sq += float(np.square(values, dtype=np.float64).sum())
+
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        if not self.count:
+            return 0.0
+        return float(np.sqrt(max(self._sum_sq / self.count - self.mean ** 2, 0.0)))
+
+    def percentile(self, q):
+        """
+        Approximate q-th percentile (0-100), interpolated linearly inside the histogram bin.
+        Integer data in unit-width bins returns the exact value of the bin reached.
+        """
+        if not self.count:
+            raise ValueError("No values have been added to the statistics.")
+        target = q / 100.0 * self.count
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, target, side='left'))
+        index = min(index, len(self.counts) - 1)
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (target - before) / self.counts[index] if self.counts[index] else 0.0
+        if self.integer:
+            value = float(self._first_bin + index)
+        else:
+            value = (self._first_bin + index + fraction) * self.bin_width
+        return float(np.clip(value, self.min, self.max))
+
+
+def compute_intensity_stats(volume, slab_size=DEFAULT_SLAB_SIZE, axis=-1, nonzero_only=False,
+                            max_bins=DEFAULT_MAX_BINS):
+    """
+    Computes IntensityStats in one streaming pass over slabs of volume (ndarray, np.memmap
+    or LazyVolume), so only one slab is ever held in memory.
+    With nonzero_only, exact zeros (e.g. skull-stripped background) are left out.
+    """
+    stats = IntensityStats(max_bins=max_bins)
+    for region in slab_regions(volume.shape, slab_size, axis):
+        slab = np.asarray(volume[region])
+        stats.update(slab[slab != 0] if nonzero_only else slab)
+    return stats
+
+
+def normalization_transform(stats, mode='minmax', lower_percentile=0.5, upper_percentile=99.5):
+    """
+    Returns (offset, scale, clip_range) so that normalized = clip((x - offset) * scale).
+    clip_range is None when the mode does not clip.
+    """
+    if mode == 'minmax':
+        low, high = stats.min, stats.max
+        clip_range = None
+    elif mode == 'percentile':
+        low, high = stats.percentile(lower_percentile), stats.percentile(upper_percentile)
+        clip_range = (0.0, 1.0)
+    elif mode == 'zscore':
+        std = stats.std
+        return stats.mean, (1.0 / std if std > 0 else 0.0), None
+    else:
+        raise ValueError(f"Unknown normalization mode '{mode}'. Choose from {NORMALIZATION_MODES}.")
+    scale = 1.0 / (high - low) if high > low else 0.0
+    return low, scale, clip_range
+
+
+def apply_normalization(volume, offset, scale, clip_range=None, out=None, slab_size=DEFAULT_SLAB_SIZE, axis=-1,
+                        nonzero_only=False):
+    """
+    Applies (x - offset) * scale (then clipping) slab by slab into out.
+    out may be volume itself for an in-place update, or any float array / np.memmap
+    of the same shape; by default a new float32 array is allocated.
+    With nonzero_only, exact zeros (background) are left at 0 instead of being transformed.
+    """
+    if out is None:
+        out = np.empty(volume.shape, dtype=np.float32)
+    offset, scale = np.float32(offset), np.float32(scale)
+    for region in slab_regions(volume.shape, slab_size, axis):
+        slab = out[region]
+        if out is not volume:
+            slab[...] = volume[region]
+        background = slab == 0 if nonzero_only else None
+        slab -= offset
+        slab *= scale
+        if clip_range is not None:
+            np.clip(slab, clip_range[0], clip_range[1], out=slab)
+        if background is not None:
+            slab[background] = 0
+    return out
+
+
+def normalize_volume(volume, mode='minmax', out=None, slab_size=DEFAULT_SLAB_SIZE, axis=-1,
+                     lower_percentile=0.5, upper_percentile=99.5, nonzero_only=False):
+    """
+    Normalizes a volume that may be larger than memory.
+    One streaming pass collects statistics, a second applies the transform slab by slab.
+
+    mode='minmax' scales to [0, 1] (the original behaviour), 'percentile' clips to the
+    given percentiles before scaling to [0, 1] so single hot voxels do not compress the
+    range, and 'zscore' gives zero mean and unit variance. With nonzero_only, statistics come
+    from nonzero voxels and only those are transformed, so the background stays 0 (rather than
+    e.g. -mean/std under 'zscore'). Returns the normalized volume (out) and the statistics used.
+    """
+    if mode not in NORMALIZATION_MODES:
+        raise ValueError(f"Unknown normalization mode '{mode}'. Choose from {NORMALIZATION_MODES}.")
+    stats = compute_intensity_stats(volume, slab_size, axis, nonzero_only=nonzero_only)
+    if not stats.count:
+        # Nothing to normalize against (e.g. an all-zero volume with nonzero_only).
+        offset, scale, clip_range = 0.0, 0.0, None
+    else:
+        offset, scale, clip_range = normalization_transform(stats, mode, lower_percentile, upper_percentile)
+    out = apply_normalization(volume, offset, scale, clip_range, out=out, slab_size=slab_size, axis=axis,
+                              nonzero_only=nonzero_only)
+    return out, stats
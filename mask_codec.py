@@ -0,0 +1,137 @@
+import zlib
+import struct
+
+import numpy as np
+
+from spatial_transforms import bounding_box
+
+# Compact label-mask container (.bmsk): a fixed header, the mask's bounding box, and the
+# labels inside that box either bit-packed or run-length encoded, then zlib-compressed.
+MASK_CODECS = ('bitpack', 'rle')
+MASK_EXTENSION = ".bmsk"
+_MAGIC = b"BMSK"
+_VERSION = 2
+# magic, version, codec, little-endian dtype code (e.g. b'<i8', b'|u1'), ndim, has_affine,
+# bits per voxel (bitpack) or run-length bytes (rle). Version 1 stored the platform-dependent dtype char.
+_HEADER = struct.Struct("<4sBB3sBBB")
+
+
+def _bitpack(values, bits):
+    """
+    Packs each voxel's low `bits` bits as separate bit planes (1 bit per voxel per plane).
+    """
+    return b"".join(np.packbits(((values >> plane) & 1).astype(np.uint8)).tobytes() for plane in range(bits))
+
+
+def _bitunpack(payload, bits, count, dtype):
+    plane_bytes = (count + 7) // 8
+    values = np.zeros(count, dtype=dtype)
+    for plane in range(bits):
+        chunk = np.frombuffer(payload, dtype=np.uint8, count=plane_bytes, offset=plane * plane_bytes)
+        values |= np.unpackbits(chunk, count=count).astype(dtype) << plane
+    return values
+
+
+def _run_length_encode(values):
+    """
+    (run values, run lengths) of a 1D array, found with one vectorized comparison.
+    """
+    boundaries = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    lengths = np.diff(np.concatenate((starts, [values.size])))
+    return values[starts], lengths
+
+
+def encode_mask(mask, codec='rle', level=6, affine=None):
+    """
+    Encodes an integer label mask as .bmsk bytes: any unsigned or boolean dtype, or a signed
+    one (e.g. int16/int32 label maps from nibabel) whose values are all non-negative.
+    Multi-byte values are stored little-endian whatever the host byte order.
+    codec='rle' stores (label, run length) pairs over the box in C order, which is the smallest
+    for compact lesions; 'bitpack' stores ceil(log2(max label + 1)) bits per voxel of the box,
+    whose size depends only on the box and label count. level is the zlib compression level (0-9). An optional 4x4 affine
+    is stored so the mask can be decoded straight to NIfTI.
+    """
+    if codec not in MASK_CODECS:
+        raise ValueError(f"Unknown mask codec '{codec}'. Choose from {MASK_CODECS}.")
+    mask = np.asarray(mask)
+    if mask.dtype.kind not in 'uib' or (mask.dtype.kind == 'i' and mask.min(initial=0) < 0):
+        raise ValueError("Masks must hold non-negative integer labels.")
+    if mask.dtype.kind == 'b':
+        mask = mask.astype(np.uint8)
+
+    box = bounding_box(mask)
+    start, stop = box if box is not None else ([0] * mask.ndim, [0] * mask.ndim)
+    cropped = mask[tuple(slice(a, b) for a, b in zip(start, stop))].ravel()
+
+    if codec == 'bitpack':
+        parameter = max(1, int(cropped.max(initial=0)).bit_length())
+        payload = _bitpack(cropped, parameter)
+    else:
+        values, lengths = _run_length_encode(cropped) if cropped.size else (cropped, np.zeros(0, np.int64))
+        length_dtype = np.dtype('<u2') if lengths.max(initial=0) < 2 ** 16 else np.dtype('<u4')
+        parameter = length_dtype.itemsize
+        payload = values.astype(mask.dtype.newbyteorder('<')).tobytes() + lengths.astype(length_dtype).tobytes()
+
+    header = _HEADER.pack(_MAGIC, _VERSION, MASK_CODECS.index(codec), mask.dtype.newbyteorder('<').str.encode(),
+                          mask.ndim, affine is not None, parameter)
+    geometry = struct.pack(f"<{3 * mask.ndim}I", *mask.shape, *start, *stop)
+    if affine is not None:
+        geometry += np.asarray(affine, dtype='<f8').reshape(4, 4).tobytes()
+    return header + geometry + zlib.compress(payload, level)
+
+
+def decode_mask(data):
+    """
+    Decodes .bmsk bytes into (full-size mask array, affine or None).
+    """
+    magic, version, codec_index, dtype_code, ndim, has_affine, parameter = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not a supported .bmsk mask.")
+    offset = _HEADER.size
+    geometry = struct.unpack_from(f"<{3 * ndim}I", data, offset)
+    offset += 4 * 3 * ndim
+    shape, start, stop = geometry[:ndim], geometry[ndim:2 * ndim], geometry[2 * ndim:]
+    affine = None
+    if has_affine:
+        affine = np.frombuffer(data, dtype='<f8', count=16, offset=offset).reshape(4, 4).copy()
+        offset += 16 * 8
+
+    dtype = np.dtype(dtype_code.decode()).newbyteorder('=')
+    payload = zlib.decompress(data[offset:])
+    box_shape = tuple(b - a for a, b in zip(start, stop))
+    count = int(np.prod(box_shape))
+
+    if MASK_CODECS[codec_index] == 'bitpack':
+        cropped = _bitunpack(payload, parameter, count, dtype)
+    else:
+        runs = len(payload) // (dtype.itemsize + parameter)
+        values = np.frombuffer(payload, dtype=dtype.newbyteorder('<'), count=runs)
+        lengths = np.frombuffer(payload, dtype='<u2' if parameter == 2 else '<u4',
+                                count=runs, offset=runs * dtype.itemsize)
+        cropped = np.repeat(values, lengths)
+
+    mask = np.zeros(shape, dtype=dtype)
+    mask[tuple(slice(a, b) for a, b in zip(start, stop))] = cropped.reshape(box_shape)
+    return mask, affine
+
+
+def save_mask(path, mask, codec='rle', level=6, affine=None):
+    with open(path, 'wb') as f:
+        f.write(encode_mask(mask, codec, level, affine))
+    print(f"Compact mask ({codec}, zlib level {level}) saved to {path}")
+
+
+def load_mask(path):
+    with open(path, 'rb') as f:
+        return decode_mask(f.read())
+
+
+def load_mask_as_nifti(path):
+    """
+    Decodes a .bmsk file into a nibabel Nifti1Image (identity affine if none was stored).
+    """
+    import nibabel as nib
+
+    mask, affine = load_mask(path)
+    return nib.Nifti1Image(mask, affine if affine is not None else np.eye(4))
@@ -1,54 +1,38 @@
-import nibabel as nib
-import pydicom
 import numpy as np
 import json
 import os
 import argparse
-from skimage.transform import resize
-import matplotlib.pyplot as plt
+import time
+from volume_io import METADATA_FILENAME, PROCESSED_FILENAME, load_nifti_volume, read_dicom_series
+from disk_cache import DiskCache, hash_input, make_cache_key
+from resampling import DEFAULT_BACKEND, RESAMPLING_BACKENDS, resample_volume
+from intensity_normalization import NORMALIZATION_MODES, normalize_volume
+from preview_renderer import PREVIEW_FORMATS, render_previews, render_slice
+from spatial_transforms import bounding_box, forward_transform
+from skull_stripping import SKULL_STRIP_MODES, brain_mask
 
-def read_mri_file(filepath):
+def read_mri_file(filepath, dicom_workers=None):
     """
     Reads NIfTI or DICOM files.
     Returns image data (numpy array) and header/metadata.
+    DICOM series directories are decoded in parallel with `dicom_workers` threads.
     """
     if filepath.endswith('.nii') or filepath.endswith('.nii.gz'):
-        img = nib.load(filepath)
-        data = img.get_fdata()
-        header = img.header
+        # Keep the on-disk dtype; uncompressed files stay memory-mapped until a stage needs floats.
+        volume = load_nifti_volume(filepath)
+        data = volume.array()
+        header = volume.header
         print(f"Loaded NIfTI file: {filepath}")
         return data, header, 'nifti'
     elif os.path.isdir(filepath):
         # Assuming a DICOM series in a directory
         # This is a simplified approach, real DICOM series loading can be complex
-        dicom_files = [pydicom.dcmread(os.path.join(filepath, f)) for f in os.listdir(filepath) if f.endswith('.dcm')]
-        dicom_files.sort(key=lambda x: int(x.InstanceNumber))
-        
-        if not dicom_files:
-            raise ValueError("No DICOM files found in the directory.")
-
-        # Assume all files have the same dimensions and are axial slices
-        slice_thickness = float(dicom_files[0].SliceThickness) if 'SliceThickness' in dicom_files[0] else None
-        pixel_spacing = [float(x) for x in dicom_files[0].PixelSpacing] if 'PixelSpacing' in dicom_files[0] else None
-
-        # Create 3D array
-        data = np.stack([s.pixel_array for s in dicom_files], axis=-1)
-        
-        # Combine relevant header info
-        header = {
-            "SliceThickness": slice_thickness,
-            "PixelSpacing": pixel_spacing,
-            "SOPInstanceUID": [s.SOPInstanceUID for s in dicom_files], # Example of extracting multiple UIDs
-            "StudyInstanceUID": dicom_files[0].StudyInstanceUID,
-            "SeriesInstanceUID": dicom_files[0].SeriesInstanceUID,
-            "Modality": dicom_files[0].Modality,
-            "PatientName": str(dicom_files[0].PatientName),
-            "PatientID": dicom_files[0].PatientID,
-            # Add other common DICOM tags as needed
-        }
+        data, header = read_dicom_series(filepath, max_workers=dicom_workers)
         print(f"Loaded DICOM series from directory: {filepath}")
         return data, header, 'dicom'
     elif filepath.endswith('.dcm'):
+        import pydicom
+
         dicom_file = pydicom.dcmread(filepath)
         data = dicom_file.pixel_array
         header = {
@@ -66,24 +50,26 @@ def read_mri_file(filepath):
     else:
         raise ValueError("Unsupported file format. Please provide a .nii, .nii.gz, .dcm file or a directory containing .dcm files.")
 
-def normalize_image(image_data):
+def normalize_image(image_data, mode='minmax', lower_percentile=0.5, upper_percentile=99.5):
     """
-    Normalizes image data to a [0, 1] range.
+    Normalizes image data (to a [0, 1] range with the default 'minmax' mode).
+    Statistics are gathered in one streaming pass over slabs and the transform is applied slab by slab,
+    so memory-mapped volumes are never fully loaded; see intensity_normalization for the modes.
+    Returns a new float32 array.
     """
-    min_val = np.min(image_data)
-    max_val = np.max(image_data)
-    if max_val - min_val == 0:
-        return np.zeros_like(image_data)
-    normalized_data = (image_data - min_val) / (max_val - min_val)
-    print("Image data normalized.")
+    normalized_data, _ = normalize_volume(image_data, mode=mode,
+                                          lower_percentile=lower_percentile, upper_percentile=upper_percentile)
+    print(f"Image data normalized ({mode}).")
     return normalized_data
 
-def resize_image(image_data, target_shape=(128, 128, 128)):
+def resize_image(image_data, target_shape=(128, 128, 128), order=1, backend=DEFAULT_BACKEND, threads=None):
     """
     Resizes 3D image data to a target shape.
+    Uses anti-aliased linear interpolation in float32 (order=1) or nearest-neighbour for
+    label maps (order=0); see resampling.RESAMPLING_BACKENDS for the available backends.
     """
-    resized_data = resize(image_data, target_shape, anti_aliasing=True)
-    print(f"Image resized to {target_shape}.")
+    resized_data = resample_volume(image_data, target_shape, order=order, backend=backend, threads=threads)
+    print(f"Image resized to {target_shape} ({backend}).")
     return resized_data
 
 def simple_skull_strip(image_data, threshold_factor=0.1):
@@ -102,6 +88,52 @@ def simple_skull_strip(image_data, threshold_factor=0.1):
     print("Performed simple skull stripping.")
     return stripped_data, binary_mask
 
+# Intermediate results preprocess_volume can hand back in addition to the final volume.
+INTERMEDIATE_STAGES = ('mask', 'stripped', 'normalized')
+
+def preprocess_volume(image_data, target_shape=(128, 128, 128), threshold_factor=0.1, keep=(),
+                      resampler=DEFAULT_BACKEND, resample_threads=None, normalization='minmax',
+                      clip_percentiles=(0.5, 99.5), skull_strip='threshold'):
+    """
+    Fused skull strip -> normalize -> resize pass in float32.
+    skull_strip selects the stripping mask (see skull_stripping.SKULL_STRIP_MODES): the global
+    threshold of simple_skull_strip or morphology on a downsampled proxy.
+    Works on a single float32 copy of the input, updated in place at every stage.
+    Intermediates are only copied out when named in `keep` (see INTERMEDIATE_STAGES).
+    Returns the processed volume, a dict of the kept intermediates and the skull-strip mask's
+    bounding box on the input grid ((start, stop) lists, None if the mask is empty).
+    """
+    unknown_stages = set(keep) - set(INTERMEDIATE_STAGES)
+    if unknown_stages:
+        raise ValueError(f"Unknown intermediate stage(s): {sorted(unknown_stages)}. Choose from {INTERMEDIATE_STAGES}.")
+    intermediates = {}
+
+    # The only copy of the raw data; the input (possibly a read-only memmap) is left untouched.
+    buffer = np.array(image_data, dtype=np.float32)
+
+    # 1. Skull strip (skull_strip='threshold' is the same threshold as simple_skull_strip)
+    binary_mask = brain_mask(buffer, skull_strip, threshold_factor)
+    np.multiply(buffer, binary_mask, out=buffer)
+    foreground_box = bounding_box(binary_mask)
+    if 'mask' in keep:
+        intermediates['mask'] = binary_mask
+    if 'stripped' in keep:
+        intermediates['stripped'] = buffer.copy()
+    del binary_mask
+
+    # 2. Normalize in place. Percentile and z-score statistics ignore the zeroed background, which stays 0.
+    normalize_volume(buffer, mode=normalization, out=buffer, nonzero_only=normalization != 'minmax',
+                     lower_percentile=clip_percentiles[0], upper_percentile=clip_percentiles[1])
+    if 'normalized' in keep:
+        intermediates['normalized'] = buffer.copy()
+
+    # 3. Resize, skipped when the volume already has the target shape
+    if buffer.shape != tuple(target_shape):
+        buffer = resize_image(buffer, target_shape, backend=resampler, threads=resample_threads)
+
+    print(f"Fused preprocessing complete (stripped, normalized, resized). Shape: {buffer.shape}")
+    return buffer, intermediates, foreground_box
+
 def extract_metadata(header, file_type):
     """
     Extracts relevant metadata for volume calculation and general info.
@@ -109,11 +141,12 @@ def extract_metadata(header, file_type):
     metadata = {}
     if file_type == 'nifti':
         metadata['file_type'] = 'NIfTI'
-        metadata['voxel_sizes'] = header.get_zooms() # typically (x, y, z)
+        metadata['voxel_sizes'] = [float(z) for z in header.get_zooms()] # typically (x, y, z)
         metadata['slice_thickness'] = metadata['voxel_sizes'][2] if len(metadata['voxel_sizes']) > 2 else None
         metadata['pixel_spacing'] = metadata['voxel_sizes'][0:2] # x, y
         metadata['dimensions'] = header['dim'][1:4].tolist() # (x, y, z)
-        metadata['units'] = nib.affcodes.get_units(header['xyzt_units'])[0]
+        metadata['units'] = header.get_xyzt_units()[0]
+        metadata['affine'] = header.get_best_affine().tolist()
     elif file_type == 'dicom':
         metadata['file_type'] = 'DICOM'
         metadata['slice_thickness'] = header.get('SliceThickness')
@@ -129,6 +162,7 @@ def extract_metadata(header, file_type):
         metadata['modality'] = header.get('Modality')
         metadata['study_uid'] = header.get('StudyInstanceUID')
         metadata['series_uid'] = header.get('SeriesInstanceUID')
+        metadata['affine'] = header.get('Affine')
 
         # Calculate volume if all necessary metadata is present
         if metadata['slice_thickness'] and metadata['pixel_spacing']:
@@ -145,6 +179,7 @@ def extract_metadata(header, file_type):
 def generate_thumbnail(image_data, output_path, title="Thumbnail"):
     """
     Generates a 2D thumbnail from the 3D image data (e.g., middle slice).
+    Rendered directly with Pillow; the format follows the output_path extension (.png, .webp).
     """
     if image_data.ndim == 3:
         # Take a middle slice for thumbnail
@@ -155,24 +190,178 @@ def generate_thumbnail(image_data, output_path, title="Thumbnail"):
         print("Warning: Cannot generate thumbnail for image data with dimensions other than 2 or 3.")
         return
 
-    plt.figure(figsize=(6, 6))
-    plt.imshow(middle_slice, cmap='gray')
-    plt.title(title)
-    plt.axis('off')
-    plt.savefig(output_path, bbox_inches='tight', pad_inches=0.1)
-    plt.close()
+    image = render_slice(middle_slice, float(np.min(middle_slice)), float(np.max(middle_slice)),
+                         size=256, title=title)
+    image.save(output_path)
     print(f"Thumbnail generated and saved to {output_path}")
 
+def open_preprocessing_cache(cache_dir, max_gb=10.0):
+    """
+    Returns a DiskCache for preprocessed volumes, or None when cache_dir is not set.
+    """
+    if not cache_dir:
+        return None
+    return DiskCache(cache_dir, max_bytes=int(max_gb * 1024 ** 3), name="preprocessing cache")
+
+def add_preprocessing_arguments(parser):
+    """
+    Adds the preprocess_volume options shared by the preprocessing, batch and segmentation CLIs.
+    """
+    parser.add_argument("--resampler", type=str, default=DEFAULT_BACKEND, choices=RESAMPLING_BACKENDS,
+                        help="Resampling backend used to resize volumes.")
+    parser.add_argument("--resample_threads", type=int, default=None,
+                        help="Threads used by the separable and torch resampling backends (default: CPU count).")
+    parser.add_argument("--normalization", type=str, default="minmax", choices=NORMALIZATION_MODES,
+                        help="Intensity normalization: minmax, percentile (clipped to --clip_percentiles) or zscore.")
+    parser.add_argument("--clip_percentiles", type=str, default="0.5,99.5",
+                        help="Lower and upper percentiles for percentile normalization, e.g., '0.5,99.5'.")
+    parser.add_argument("--skull_strip", type=str, default="threshold", choices=SKULL_STRIP_MODES,
+                        help="Skull stripping: global intensity threshold, or threshold plus morphology (largest component, hole filling, opening/closing) on a downsampled proxy.")
+
+def preprocessing_options_from_args(args):
+    """
+    Collects the options added by add_preprocessing_arguments into keyword arguments for preprocess_volume.
+    """
+    return {
+        "resampler": args.resampler,
+        "resample_threads": args.resample_threads,
+        "normalization": args.normalization,
+        "clip_percentiles": tuple(map(float, args.clip_percentiles.split(','))),
+        "skull_strip": args.skull_strip,
+    }
+
+# preprocess_volume options that only affect speed, not the output, and so stay out of cache keys.
+RUNTIME_ONLY_OPTIONS = ('resample_threads',)
+
+# Part of every preprocessing cache key. Bump it whenever the pipeline's output (the volume or its
+# metadata) changes, so caches filled by older code are not served as current results.
+PREPROCESSING_VERSION = 1
+
+def preprocessing_cache_key(input_path, target_shape, threshold_factor, preprocess_options=None):
+    """
+    Cache key for a preprocessed volume: input content hash, PREPROCESSING_VERSION and every parameter
+    that changes the output.
+    """
+    params = {"version": PREPROCESSING_VERSION, "target_shape": list(target_shape),
+              "threshold_factor": threshold_factor}
+    params.update({k: v for k, v in (preprocess_options or {}).items() if k not in RUNTIME_ONLY_OPTIONS})
+    return make_cache_key(hash_input(input_path), params)
+
+def load_or_preprocess(input_path, target_shape=(128, 128, 128), threshold_factor=0.1, cache=None,
+                       dicom_workers=None, keep_intermediates=(), preprocess_options=None):
+    """
+    Returns (processed_data, metadata, intermediates, cache_hit) for one scan.
+    When a DiskCache is given, a hit skips reading and preprocessing entirely; a miss
+    runs the pipeline and stores the result. Requests for intermediates bypass the
+    cache lookup, since only the final volume is cached.
+    """
+    cache_key = None
+    if cache is not None:
+        cache_key = preprocessing_cache_key(input_path, target_shape, threshold_factor, preprocess_options)
+        cached = None if keep_intermediates else cache.get(cache_key)
+        if cached is not None:
+            arrays, metadata = cached
+            print(f"Preprocessing cache hit for {input_path} (key {cache_key[:12]}).")
+            return arrays["processed"], metadata, {}, True
+        print(f"Preprocessing cache miss for {input_path} (key {cache_key[:12]}).")
+
+    # 1. Read MRI file
+    image_data, header, file_type = read_mri_file(input_path, dicom_workers=dicom_workers)
+    print(f"Original image shape: {image_data.shape}")
+
+    # 2. Skull strip, normalize and resize in a single float32 pass
+    final_processed_data, intermediates, foreground_box = preprocess_volume(
+        image_data, target_shape, threshold_factor, keep=keep_intermediates, **(preprocess_options or {}))
+    print(f"Final processed (stripped, normalized, resized) image shape: {final_processed_data.shape}")
+
+    # 3. Extract Metadata
+    extracted_metadata = extract_metadata(header, file_type)
+    extracted_metadata['processed_shape'] = list(final_processed_data.shape)
+    extracted_metadata['input_shape'] = list(image_data.shape)
+    extracted_metadata['input_voxels'] = int(image_data.size)
+    # Forward transform (native grid -> processed grid) so masks can be mapped back to native space.
+    extracted_metadata['transform'] = forward_transform(image_data.shape, final_processed_data.shape,
+                                                        extracted_metadata.get('affine'))
+    # Skull-strip bounding box on the input grid, so inference can be limited to the brain
+    # (see spatial_transforms.processed_box and segmentation_engine --crop_to_brain).
+    if foreground_box is not None:
+        extracted_metadata['brain_bbox'] = {"start": foreground_box[0], "stop": foreground_box[1]}
+
+    if cache is not None:
+        cache.put(cache_key, {"processed": final_processed_data}, extracted_metadata)
+    return final_processed_data, extracted_metadata, intermediates, False
+
+def run_preprocessing(input_path, output_dir, target_shape=(128, 128, 128), threshold_factor=0.1,
+                      dicom_workers=None, keep_intermediates=(), cache=None, save_dtype='float32',
+                      preprocess_options=None, preview_format=None):
+    """
+    Runs the full preprocessing pipeline for one scan and writes its outputs to output_dir:
+    the processed volume (PROCESSED_FILENAME, as save_dtype), metadata.json and a thumbnail,
+    plus axial/coronal/sagittal previews when preview_format ('png' or 'webp') is set.
+    Returns a small summary dict (input shape/voxel count, processed shape, elapsed seconds, cache hit).
+    """
+    start_time = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    final_processed_data, extracted_metadata, intermediates, cache_hit = load_or_preprocess(
+        input_path, target_shape, threshold_factor, cache=cache,
+        dicom_workers=dicom_workers, keep_intermediates=keep_intermediates,
+        preprocess_options=preprocess_options)
+
+    for stage, stage_data in intermediates.items():
+        stage_output_path = os.path.join(output_dir, f"{stage}.npy")
+        np.save(stage_output_path, stage_data)
+        print(f"Intermediate '{stage}' saved to {stage_output_path}")
+
+    # Raw .npy so the segmentation engine can memory-map it and run inference without decoding or renormalizing.
+    processed_output_path = os.path.join(output_dir, PROCESSED_FILENAME)
+    np.save(processed_output_path, np.asarray(final_processed_data, dtype=save_dtype))
+    print(f"Processed volume saved to {processed_output_path} ({save_dtype})")
+
+    extracted_metadata = dict(extracted_metadata, processed_path=PROCESSED_FILENAME,
+                              processed_dtype=save_dtype, normalized=True)
+    metadata_output_path = os.path.join(output_dir, METADATA_FILENAME)
+    with open(metadata_output_path, 'w') as f:
+        json.dump(extracted_metadata, f, indent=4)
+    print(f"Extracted metadata saved to {metadata_output_path}")
+
+    # Generate Thumbnail (from the final processed data)
+    thumbnail_output_path = os.path.join(output_dir, "thumbnail.png")
+    generate_thumbnail(final_processed_data, thumbnail_output_path, title="Processed MRI Thumbnail")
+    if preview_format:
+        render_previews(final_processed_data, output_dir, fmt=preview_format)
+
+    return {
+        "input_shape": extracted_metadata['input_shape'],
+        "input_voxels": extracted_metadata['input_voxels'],
+        "processed_shape": list(final_processed_data.shape),
+        "seconds": time.perf_counter() - start_time,
+        "cache_hit": cache_hit,
+    }
+
 def main():
     parser = argparse.ArgumentParser(description="MRI Preprocessor for NIfTI and DICOM files.")
     parser.add_argument("input_path", type=str,
                         help="Path to the MRI file (.nii, .nii.gz, .dcm) or a directory containing DICOM series.")
     parser.add_argument("--output_dir", type=str, default="./processed_mri",
-                        help="Directory to save processed outputs (metadata, thumbnail).")
+                        help="Directory to save processed outputs (processed volume, metadata, thumbnail).")
     parser.add_argument("--target_shape", type=str, default="128,128,128",
                         help="Target shape for resizing, e.g., '128,128,128'.")
     parser.add_argument("--threshold_factor", type=float, default=0.1,
                         help="Threshold factor for simple skull stripping (0.0 to 1.0).")
+    parser.add_argument("--dicom_workers", type=int, default=None,
+                        help="Number of threads used to decode DICOM series slices (default: based on CPU count).")
+    parser.add_argument("--keep_intermediates", nargs="*", default=[], choices=INTERMEDIATE_STAGES,
+                        help="Intermediate stages to save as .npy next to the metadata (mask, stripped, normalized).")
+    parser.add_argument("--save_dtype", type=str, default="float32", choices=["float32", "float16"],
+                        help="Dtype of the saved processed volume (processed.npy).")
+    parser.add_argument("--preview_format", type=str, default=None, choices=PREVIEW_FORMATS,
+                        help="Also write axial, coronal and sagittal previews in this format.")
+    add_preprocessing_arguments(parser)
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Directory of the preprocessed-volume cache. Disabled if not set.")
+    parser.add_argument("--cache_max_gb", type=float, default=10.0,
+                        help="Size cap of the preprocessed-volume cache in GB (least recently used entries are evicted).")
 
     args = parser.parse_args()
 
@@ -180,44 +369,18 @@ def main():
     output_dir = args.output_dir
     target_shape = tuple(map(int, args.target_shape.split(',')))
 
-    os.makedirs(output_dir, exist_ok=True)
+    cache = open_preprocessing_cache(args.cache_dir, args.cache_max_gb)
 
     print(f"Starting MRI preprocessing for: {input_path}")
 
     try:
-        # 1. Read MRI file
-        image_data, header, file_type = read_mri_file(input_path)
-        print(f"Original image shape: {image_data.shape}")
-
-        # 2. Normalize image data
-        normalized_data = normalize_image(image_data.copy())
-
-        # 3. Resize image data
-        resized_data = resize_image(normalized_data, target_shape)
-        print(f"Resized image shape: {resized_data.shape}")
-
-        # 4. Skull Stripping Prototype
-        # Skull stripping should ideally happen before normalization/resizing for best results
-        # but for a prototype, order might be less critical.
-        # Let's apply it to the original data for now, then re-normalize and resize.
-        stripped_original_data, _ = simple_skull_strip(image_data.copy(), args.threshold_factor)
-        normalized_stripped_data = normalize_image(stripped_original_data)
-        final_processed_data = resize_image(normalized_stripped_data, target_shape)
-        print(f"Final processed (stripped, normalized, resized) image shape: {final_processed_data.shape}")
-
-        # 5. Extract Metadata
-        extracted_metadata = extract_metadata(header, file_type)
-        extracted_metadata['processed_shape'] = final_processed_data.shape
-        
-        metadata_output_path = os.path.join(output_dir, "metadata.json")
-        with open(metadata_output_path, 'w') as f:
-            json.dump(extracted_metadata, f, indent=4)
-        print(f"Extracted metadata saved to {metadata_output_path}")
-
-        # 6. Generate Thumbnail (from the final processed data)
-        thumbnail_output_path = os.path.join(output_dir, "thumbnail.png")
-        generate_thumbnail(final_processed_data, thumbnail_output_path, title="Processed MRI Thumbnail")
-
+        run_preprocessing(input_path, output_dir, target_shape, args.threshold_factor,
+                          dicom_workers=args.dicom_workers, keep_intermediates=args.keep_intermediates,
+                          cache=cache, save_dtype=args.save_dtype,
+                          preprocess_options=preprocessing_options_from_args(args),
+                          preview_format=args.preview_format)
+        if cache is not None:
+            cache.print_stats()
         print("Preprocessing complete!")
 
     except Exception as e:
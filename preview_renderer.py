@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+
+PREVIEW_PLANES = ('axial', 'coronal', 'sagittal')
+PREVIEW_FORMATS = ('png', 'webp')
+
+# RGB overlay colours per mask label (cycled for labels beyond the palette).
+LABEL_COLORS = (
+    (255, 64, 64),
+    (64, 200, 255),
+    (255, 210, 64),
+    (120, 255, 120),
+    (220, 120, 255),
+)
+
+
+def extract_plane(volume, plane, index=None):
+    """
+    Returns a 2D slice of a (x, y, z) volume for display. Defaults to the middle slice.
+    Axial slices are returned as stored (same orientation as the original thumbnail);
+    coronal and sagittal slices are rotated so the z axis points up.
+    """
+    axis = {'axial': 2, 'coronal': 1, 'sagittal': 0}[plane]
+    if index is None:
+        index = volume.shape[axis] // 2
+    image_slice = np.take(volume, index, axis=axis)
+    if plane != 'axial':
+        image_slice = np.rot90(image_slice)
+    return image_slice
+
+
+def to_uint8(image_slice, low, high):
+    """
+    Windows a slice to [low, high] and scales it to 8-bit grey levels.
+    """
+    image_slice = np.asarray(image_slice, dtype=np.float32)
+    if high <= low:
+        return np.zeros(image_slice.shape, dtype=np.uint8)
+    scaled = (image_slice - low) * (255.0 / (high - low))
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def render_slice(image_slice, low, high, mask_slice=None, alpha=0.4, size=None, title=None):
+    """
+    Renders one 2D slice as a Pillow RGB image, optionally blending a label mask on top
+    and adding a title caption. size scales the longer side to that many pixels.
+    """
+    from PIL import Image, ImageDraw
+
+    grey = to_uint8(image_slice, low, high)
+    rgb = np.repeat(grey[:, :, None], 3, axis=2)
+
+    if mask_slice is not None:
+        mask_slice = np.asarray(mask_slice)
+        rgb = rgb.astype(np.float32)
+        for label in np.unique(mask_slice):
+            if label == 0:
+                continue
+            color = np.array(LABEL_COLORS[(int(label) - 1) % len(LABEL_COLORS)], dtype=np.float32)
+            selected = mask_slice == label
+            rgb[selected] = (1 - alpha) * rgb[selected] + alpha * color
+        rgb = rgb.astype(np.uint8)
+
+    image = Image.fromarray(np.ascontiguousarray(rgb))
+    if size:
+        scale = size / max(image.size)
+        new_size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+        image = image.resize(new_size, Image.Resampling.NEAREST if mask_slice is not None else Image.Resampling.BILINEAR)
+
+    if title:
+        caption_height = 16
+        captioned = Image.new('RGB', (image.size[0], image.size[1] + caption_height), (0, 0, 0))
+        captioned.paste(image, (0, caption_height))
+        ImageDraw.Draw(captioned).text((4, 2), title, fill=(255, 255, 255))
+        image = captioned
+    return image
+
+
+def render_previews(volume, output_dir, mask=None, planes=PREVIEW_PLANES, fmt='png', size=256,
+                    prefix='preview', alpha=0.4):
+    """
+    Writes middle-slice previews of a 3D volume for each requested plane, with an optional
+    label mask overlay, straight from numpy arrays through Pillow (no matplotlib).
+    All planes share one intensity window so they are directly comparable.
+    Returns a dict of plane -> written file path.
+    """
+    if fmt not in PREVIEW_FORMATS:
+        raise ValueError(f"Unsupported preview format '{fmt}'. Choose from {PREVIEW_FORMATS}.")
+    if volume.ndim != 3:
+        raise ValueError("Previews require a 3D volume.")
+    if mask is not None and mask.shape != volume.shape:
+        raise ValueError(f"Mask shape {mask.shape} does not match volume shape {volume.shape}.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    low, high = float(np.min(volume)), float(np.max(volume))
+    paths = {}
+    for plane in planes:
+        image_slice = extract_plane(volume, plane)
+        mask_slice = extract_plane(mask, plane) if mask is not None else None
+        image = render_slice(image_slice, low, high, mask_slice=mask_slice, alpha=alpha, size=size)
+        path = os.path.join(output_dir, f"{prefix}_{plane}.{fmt}")
+        image.save(path)
+        paths[plane] = path
+    print(f"Previews ({', '.join(planes)}) saved to {output_dir}")
+    return paths
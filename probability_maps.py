@@ -0,0 +1,73 @@
+import os
+import json
+
+import numpy as np
+
+# float16 keeps about 3 significant digits; uint8 stores round(p * 255), i.e. steps of 1/255.
+PROBABILITY_DTYPES = ('float16', 'uint8')
+UINT8_SCALE = 255
+
+
+def probability_map_paths(output_dir, scan_name):
+    """
+    (map .npy path, sidecar .json path) of a scan's saved probability map.
+    """
+    base = os.path.join(output_dir, f"probabilities_{scan_name}")
+    return base + ".npy", base + ".json"
+
+
+def save_probability_map(output_dir, scan_name, probabilities, metadata, dtype='float16', original_nifti_path=None):
+    """
+    Saves the model output (sigmoid or softmax probabilities) as a .npy file of the given dtype,
+    plus a JSON sidecar with the scan name, the preprocessing metadata (spacing, transform) and the
+    original NIfTI path, which is everything rethreshold.py needs to rebuild the mask and its export.
+    Returns the .npy path.
+    """
+    if dtype not in PROBABILITY_DTYPES:
+        raise ValueError(f"Unknown probability map dtype '{dtype}'. Choose from {PROBABILITY_DTYPES}.")
+    map_path, sidecar_path = probability_map_paths(output_dir, scan_name)
+    probabilities = np.asarray(probabilities)
+    if dtype == 'uint8':
+        stored = np.empty(probabilities.shape, dtype=np.uint8)
+        np.rint(np.clip(probabilities, 0.0, 1.0) * UINT8_SCALE, out=stored, casting='unsafe')
+    else:
+        stored = probabilities.astype(np.float16)
+    np.save(map_path, stored)
+    with open(sidecar_path, 'w') as f:
+        json.dump({"scan_name": scan_name, "dtype": dtype, "metadata": metadata,
+                   "original_nifti_path": original_nifti_path}, f, indent=4)
+    print(f"Probability map ({dtype}, {stored.nbytes / 1024 ** 2:.1f} MB) saved to {map_path}")
+    return map_path
+
+
+def load_probability_map(map_path):
+    """
+    Returns (read-only memory-mapped probability map, sidecar dict).
+    """
+    sidecar_path = os.path.splitext(map_path)[0] + ".json"
+    with open(sidecar_path, 'r') as f:
+        sidecar = json.load(f)
+    return np.load(map_path, mmap_mode='r'), sidecar
+
+
+def probabilities_to_mask(probabilities, threshold=0.5, channel_axis=0):
+    """
+    uint8 mask from model probabilities; the one rule shared by perform_inference and rethreshold.py.
+    A single channel axis at channel_axis (0 for one (C, D, H, W) volume, 1 for a (B, C, D, H, W)
+    batch) is dropped, and every channel is thresholded independently (p > threshold), so
+    multi-channel outputs give one binary mask per channel. uint8 maps are compared in their
+    integer domain, so no float copy of the volume is made.
+    """
+    if probabilities.ndim == channel_axis + 4 and probabilities.shape[channel_axis] == 1:
+        probabilities = probabilities.squeeze(axis=channel_axis)
+    if probabilities.dtype == np.uint8:
+        return (probabilities > threshold * UINT8_SCALE).view(np.uint8)
+    return (probabilities > threshold).view(np.uint8)
+
+
+def threshold_probability_map(probabilities, threshold=0.5):
+    """
+    uint8 label mask from a stored probability map, built exactly as perform_inference builds
+    its mask (see probabilities_to_mask).
+    """
+    return probabilities_to_mask(probabilities, threshold)
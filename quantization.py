@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import warnings
+
+import numpy as np
+
+from volume_io import PROCESSED_FILENAME, load_preprocessed_volume
+
+QUANTIZATION_ENGINES = ('x86', 'fbgemm', 'qnnpack')
+QUANTIZATION_MODES = ('static', 'dynamic')
+DEFAULT_ENGINE = 'x86'
+
+
+def find_preprocessed_volumes(directory):
+    """
+    Lists the preprocessed volumes under directory: every mri_preprocessor output directory
+    (holding PROCESSED_FILENAME) and every other .npy file, in sorted order.
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        if PROCESSED_FILENAME in files:
+            paths.append(root)
+            continue
+        paths.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.npy'))
+    return paths
+
+
+def iter_volumes(paths):
+    for path in paths:
+        data, _ = load_preprocessed_volume(path)
+        yield np.asarray(data, dtype=np.float32)
+
+
+def quantize_static(model, calibration_volumes, engine=DEFAULT_ENGINE):
+    """
+    Post-training static int8 quantization with torch.ao FX graph mode.
+
+    Conv + ReLU pairs are fused, observers record activation ranges while the calibration
+    volumes (an iterable of (D, H, W) arrays) run through the model, and the observed model
+    is converted to int8 weights and activations. Returns the quantized module (CPU only).
+    """
+    import torch
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = engine
+    model = model.cpu().eval()
+    calibration_volumes = iter(calibration_volumes)
+    first = next(calibration_volumes, None)
+    if first is None:
+        raise ValueError("At least one calibration volume is required.")
+
+    example = torch.from_numpy(first)[None, None]
+    with warnings.catch_warnings():
+        # torch.ao FX quantization emits deprecation notices that are irrelevant here.
+        warnings.simplefilter('ignore')
+        prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (example,))
+        count = 0
+        with torch.inference_mode():
+            for volume in itertools.chain([first], calibration_volumes):
+                prepared(torch.from_numpy(volume)[None, None])
+                count += 1
+        quantized = convert_fx(prepared)
+    print(f"Calibrated int8 observers on {count} volumes ({engine} engine).")
+    return quantized
+
+
+def quantize_dynamic(model, engine=DEFAULT_ENGINE):
+    """
+    Post-training dynamic int8 quantization: Conv3d and Linear weights are quantized ahead of
+    time and activations are quantized on the fly from their observed range at every call, so
+    no calibration data is needed. torch's default dynamic mapping covers only Linear and
+    recurrent layers, so Conv3d is mapped to its dynamic quantized module explicitly.
+    Returns the quantized module (CPU only).
+    """
+    import torch
+    import torch.nn as nn
+    import torch.ao.nn.quantized.dynamic as nnqd
+    from torch.ao.quantization import default_dynamic_qconfig
+    from torch.ao.quantization import quantize_dynamic as torch_quantize_dynamic
+
+    torch.backends.quantized.engine = engine
+    model = model.cpu().eval()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        quantized = torch_quantize_dynamic(
+            model, {nn.Conv3d: default_dynamic_qconfig, nn.Linear: default_dynamic_qconfig}, dtype=torch.qint8,
+            mapping={nn.Conv3d: nnqd.Conv3d, nn.Linear: nnqd.Linear})
+    print(f"Dynamically quantized Conv3d and Linear weights to int8 ({engine} engine).")
+    return quantized
+
+
+def save_quantized_model(quantized_model, path, example_shape):
+    """
+    Saves a quantized model as TorchScript, so loading needs neither the model class nor FX.
+    """
+    import torch
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        scripted = torch.jit.trace(quantized_model, torch.zeros(example_shape))
+    torch.jit.save(scripted, path)
+    print(f"Quantized model saved to {path}")
+
+
+def load_quantized_model(path, engine=DEFAULT_ENGINE):
+    import torch
+
+    torch.backends.quantized.engine = engine
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = torch.jit.load(path, map_location='cpu')
+    model.eval()
+    return model
+
+
+def _time_forward(model, input_tensor, repeats):
+    """
+    Mean wall time of `repeats` forward passes, and the output of the last one.
+    """
+    start = time.perf_counter()
+    for _ in range(repeats):
+        output = model(input_tensor)
+    return (time.perf_counter() - start) / repeats, output
+
+
+def compare_models(reference_model, candidate_model, volumes, threshold=0.5, warmup=2, repeats=3):
+    """
+    Runs both models on each volume and compares their masks: Dice, relative difference in
+    segmented volume (voxel counts, so independent of spacing), the largest difference in
+    model output, and forward-pass time.
+    Each model first runs `warmup` untimed passes (the first TorchScript calls profile and
+    optimize the graph), then its time is the mean of `repeats` passes.
+    Returns a report with per-volume rows and their means.
+    """
+    import torch
+
+    rows = []
+    with torch.inference_mode():
+        for volume in volumes:
+            input_tensor = torch.from_numpy(volume)[None, None]
+            for _ in range(warmup):
+                reference_model(input_tensor)
+                candidate_model(input_tensor)
+            reference_seconds, reference_output = _time_forward(reference_model, input_tensor, repeats)
+            candidate_seconds, candidate_output = _time_forward(candidate_model, input_tensor, repeats)
+            reference_output, candidate_output = reference_output[0, 0], candidate_output[0, 0].float()
+            reference, candidate = reference_output > threshold, candidate_output > threshold
+
+            reference_voxels = int(reference.sum())
+            candidate_voxels = int(candidate.sum())
+            total = reference_voxels + candidate_voxels
+            rows.append({
+                "dice": 2.0 * int((reference & candidate).sum()) / total if total else 1.0,
+                "volume_difference_pct": (100.0 * (candidate_voxels - reference_voxels) / reference_voxels
+                                          if reference_voxels else 0.0),
+                "max_output_difference": float((reference_output - candidate_output).abs().max()),
+                "fp32_seconds": reference_seconds,
+                "int8_seconds": candidate_seconds,
+            })
+    if not rows:
+        raise ValueError("No volumes to compare.")
+    summary = {key: float(np.mean([row[key] for row in rows])) for key in rows[0]}
+    summary["speedup"] = summary["fp32_seconds"] / summary["int8_seconds"]
+    return {"volumes": rows, "mean": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-training int8 quantization of the segmentation model.")
+    parser.add_argument("calibration_dir", type=str,
+                        help="Directory of preprocessed volumes (mri_preprocessor outputs or .npy files) used for calibration"
+                             " (static mode) and, by default, for the comparison.")
+    parser.add_argument("--mode", type=str, default="static", choices=QUANTIZATION_MODES,
+                        help="Static int8 (calibrated activation ranges) or dynamic int8 (activation ranges computed per call, no calibration).")
+    parser.add_argument("--model_path", type=str, default=None,
+                        help="Path to the fp32 PyTorch model state_dict file (.pt). The dummy model is used if not set.")
+    parser.add_argument("--output_path", type=str, default="segmentation_model_int8.pt",
+                        help="Where to save the quantized TorchScript model.")
+    parser.add_argument("--num_calibration", type=int, default=32,
+                        help="Maximum number of calibration volumes.")
+    parser.add_argument("--evaluation_dir", type=str, default=None,
+                        help="Directory of volumes for the fp32 vs int8 comparison (default: the calibration volumes).")
+    parser.add_argument("--engine", type=str, default=DEFAULT_ENGINE, choices=QUANTIZATION_ENGINES,
+                        help="Quantized CPU kernel engine.")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Timed forward passes per model and volume in the comparison, after two warm-up passes.")
+
+    args = parser.parse_args()
+
+    from segmentation_engine import load_model
+
+    calibration_paths = find_preprocessed_volumes(args.calibration_dir)[:args.num_calibration]
+    if not calibration_paths:
+        raise ValueError(f"No preprocessed volumes found in {args.calibration_dir}")
+    evaluation_paths = find_preprocessed_volumes(args.evaluation_dir) if args.evaluation_dir else calibration_paths
+
+    model = load_model(args.model_path, device='cpu')
+    if args.mode == 'dynamic':
+        quantized = quantize_dynamic(model, engine=args.engine)
+    else:
+        quantized = quantize_static(model, iter_volumes(calibration_paths), engine=args.engine)
+    example_shape = (1, 1) + next(iter_volumes(calibration_paths[:1])).shape
+    save_quantized_model(quantized, args.output_path, example_shape)
+
+    # Compare against fp32 through the saved checkpoint, exactly as load_model(quantized=True) will use it.
+    report = compare_models(model, load_quantized_model(args.output_path, args.engine), iter_volumes(evaluation_paths),
+                            repeats=args.repeats)
+    report.update({"model_path": args.model_path, "quantized_model_path": args.output_path, "mode": args.mode,
+                   "engine": args.engine, "calibration_volumes": len(calibration_paths) if args.mode == 'static' else 0})
+    report_path = os.path.splitext(args.output_path)[0] + "_report.json"
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    mean = report["mean"]
+    print(f"int8 vs fp32 over {len(report['volumes'])} volumes: Dice {mean['dice']:.4f}, "
+          f"volume difference {mean['volume_difference_pct']:+.2f}%, "
+          f"max output difference {mean['max_output_difference']:.4f}, speedup {mean['speedup']:.2f}x")
+    print(f"Comparison report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Resampling backends selectable through resize_image/resample_volume.
+RESAMPLING_BACKENDS = ('separable', 'scipy', 'torch', 'skimage')
+DEFAULT_BACKEND = 'separable'
+
+
+def _antialias_sigmas(input_shape, output_shape):
+    """
+    Per-axis Gaussian sigma used before downsampling, same rule as skimage.transform.resize.
+    """
+    factors = np.divide(input_shape, output_shape)
+    return np.maximum(0, (factors - 1) / 2)
+
+
+def _source_coordinates(input_size, output_size):
+    """
+    Maps output sample centers to (fractional) input coordinates with the half-pixel
+    convention skimage and scipy's grid_mode use. Coordinates past the first/last voxel
+    are mirrored back inside, like skimage's default 'reflect' boundary mode.
+    """
+    scale = input_size / output_size
+    coords = (np.arange(output_size, dtype=np.float64) + 0.5) * scale - 0.5
+    coords = np.abs(coords)
+    coords = np.where(coords > input_size - 1, 2 * (input_size - 1) - coords, coords)
+    return np.clip(coords, 0, input_size - 1)
+
+
+def _nearest_indices(input_size, output_size):
+    """
+    Input index sampled by each output voxel for nearest-neighbour resampling.
+    """
+    scale = input_size / output_size
+    indices = np.floor((np.arange(output_size) + 0.5) * scale).astype(np.intp)
+    return np.minimum(indices, input_size - 1)
+
+
+def _resample_axis(data, axis, output_size, order, sigma, out):
+    """
+    Resamples `data` along one axis into `out` (1D Gaussian prefilter, then linear or
+    nearest-neighbour interpolation). Every other axis is left untouched.
+    """
+    from scipy.ndimage import gaussian_filter1d
+
+    input_size = data.shape[axis]
+    if order == 0:
+        np.take(data, _nearest_indices(input_size, output_size), axis=axis, out=out)
+        return
+
+    if sigma > 0:
+        data = gaussian_filter1d(data, sigma, axis=axis, mode='mirror', output=np.float32)
+
+    coords = _source_coordinates(input_size, output_size)
+    lower = np.floor(coords).astype(np.intp)
+    upper = np.minimum(lower + 1, input_size - 1)
+    weight_shape = [1] * data.ndim
+    weight_shape[axis] = output_size
+    weights = (coords - lower).astype(np.float32).reshape(weight_shape)
+
+    np.take(data, lower, axis=axis, out=out)
+    upper_values = np.take(data, upper, axis=axis)
+    # out = lower + w * (upper - lower), computed in place
+    np.subtract(upper_values, out, out=upper_values)
+    upper_values *= weights
+    out += upper_values
+
+
+def _resize_separable(data, target_shape, order, threads):
+    """
+    Separable resampling: one 1D pass per axis, starting with the axis that shrinks the most
+    so later passes touch fewer voxels. Each pass is split into chunks along another axis
+    and run on a thread pool (numpy and scipy.ndimage release the GIL for these kernels).
+    """
+    output_dtype = data.dtype if order == 0 else np.float32
+    current = data if order == 0 else np.asarray(data, dtype=np.float32)
+    sigmas = _antialias_sigmas(data.shape, target_shape)
+    axes = sorted(range(data.ndim), key=lambda a: target_shape[a] / data.shape[a])
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for axis in axes:
+            if current.shape[axis] == target_shape[axis]:
+                continue
+            out_shape = list(current.shape)
+            out_shape[axis] = target_shape[axis]
+            out = np.empty(out_shape, dtype=output_dtype)
+
+            # Chunk along the largest other axis; each chunk is independent for this pass.
+            split_axis = max((a for a in range(current.ndim) if a != axis), key=lambda a: current.shape[a])
+            bounds = np.linspace(0, current.shape[split_axis], min(threads, current.shape[split_axis]) + 1).astype(int)
+
+            def run_chunk(start, stop, axis=axis, split_axis=split_axis, source=current, out=out):
+                region = [slice(None)] * source.ndim
+                region[split_axis] = slice(start, stop)
+                region = tuple(region)
+                _resample_axis(source[region], axis, target_shape[axis], order, sigmas[axis], out[region])
+
+            list(executor.map(run_chunk, bounds[:-1], bounds[1:]))
+            current = out
+
+    if current is data:
+        current = data.copy()
+    return current
+
+
+def _resize_scipy(data, target_shape, order):
+    """
+    scipy.ndimage.zoom in float32 with the same Gaussian anti-aliasing as skimage.
+    """
+    from scipy import ndimage
+
+    if order == 0:
+        zoom_factors = np.divide(target_shape, data.shape)
+        return ndimage.zoom(data, zoom_factors, order=0, mode='nearest', grid_mode=True)
+
+    data = np.asarray(data, dtype=np.float32)
+    sigmas = _antialias_sigmas(data.shape, target_shape)
+    if np.any(sigmas > 0):
+        data = ndimage.gaussian_filter(data, sigmas, mode='mirror', output=np.float32)
+    zoom_factors = np.divide(target_shape, data.shape)
+    return ndimage.zoom(data, zoom_factors, order=order, mode='mirror', grid_mode=True, output=np.float32)
+
+
+def _gaussian_kernel_1d(sigma, truncate=4.0):
+    radius = int(truncate * sigma + 0.5)
+    x = np.arange(-radius, radius + 1, dtype=np.float32)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def _resize_torch(data, target_shape, order, threads):
+    """
+    torch.nn.functional.interpolate on CPU (trilinear or nearest-exact), with a separable
+    Gaussian convolution as anti-aliasing filter when downsampling. interpolate clamps
+    rather than mirrors at the volume border, so upsampled edge voxels differ slightly
+    from the skimage reference.
+    """
+    import torch
+    import torch.nn.functional as F
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    if order == 0:
+        # interpolate does not support integer tensors; labels survive the round trip through float32.
+        tensor = torch.from_numpy(np.asarray(data, dtype=np.float32))[None, None]
+        resized = F.interpolate(tensor, size=tuple(target_shape), mode='nearest-exact')
+        return resized[0, 0].numpy().astype(data.dtype)
+
+    tensor = torch.from_numpy(np.ascontiguousarray(data, dtype=np.float32))[None, None]
+    with torch.no_grad():
+        for axis, sigma in enumerate(_antialias_sigmas(data.shape, target_shape)):
+            if sigma <= 0:
+                continue
+            kernel = torch.from_numpy(_gaussian_kernel_1d(sigma))
+            radius = kernel.numel() // 2
+            kernel_shape = [1, 1, 1, 1, 1]
+            kernel_shape[axis + 2] = kernel.numel()
+            # F.pad lists padding from the last dimension backwards.
+            padding = [0] * 6
+            padding[2 * (2 - axis)] = padding[2 * (2 - axis) + 1] = radius
+            pad_mode = 'reflect' if radius < tensor.shape[axis + 2] else 'replicate'
+            tensor = F.conv3d(F.pad(tensor, padding, mode=pad_mode), kernel.view(kernel_shape))
+        resized = F.interpolate(tensor, size=tuple(target_shape), mode='trilinear', align_corners=False)
+    return resized[0, 0].numpy()
+
+
+def _resize_skimage(data, target_shape, order):
+    """
+    Original skimage.transform.resize path (float64 internally, single-threaded), kept as the reference.
+    """
+    from skimage.transform import resize
+
+    if order == 0:
+        return resize(data, target_shape, order=0, anti_aliasing=False, preserve_range=True).astype(data.dtype)
+    return resize(data, target_shape, anti_aliasing=True).astype(np.float32)
+
+
+def resample_volume(data, target_shape, order=1, backend=DEFAULT_BACKEND, threads=None):
+    """
+    Resamples a 3D volume to target_shape.
+    order=1 gives anti-aliased linear interpolation in float32 (for intensity volumes),
+    order=0 gives nearest-neighbour in the input dtype (for label maps).
+    threads sets the worker count of the separable and torch backends (default: CPU count).
+    """
+    if backend not in RESAMPLING_BACKENDS:
+        raise ValueError(f"Unknown resampling backend '{backend}'. Choose from {RESAMPLING_BACKENDS}.")
+    if order not in (0, 1):
+        raise ValueError("Only order=0 (nearest) and order=1 (linear) are supported.")
+    target_shape = tuple(int(s) for s in target_shape)
+    if len(target_shape) != data.ndim:
+        raise ValueError(f"Target shape {target_shape} does not match data with {data.ndim} dimensions.")
+    threads = threads or os.cpu_count() or 1
+
+    if backend == 'separable':
+        return _resize_separable(data, target_shape, order, threads)
+    if backend == 'scipy':
+        return _resize_scipy(data, target_shape, order)
+    if backend == 'torch':
+        return _resize_torch(data, target_shape, order, threads)
+    return _resize_skimage(data, target_shape, order)
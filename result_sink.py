@@ -0,0 +1,242 @@
+import os
+import json
+import sqlite3
+import threading
+
+RESULT_SINKS = ('supabase', 'sqlite')
+MAX_RETRY_INTERVAL_S = 60.0
+
+
+class SupabaseTable:
+    """
+    Supabase table behind the bulk insert(rows) interface used by ResultSink.
+    """
+
+    def __init__(self, supabase_client, table_name):
+        self.client = supabase_client
+        self.table_name = table_name
+
+    def insert(self, rows):
+        response = self.client.table(self.table_name).insert(rows).execute()
+        if isinstance(response, dict) and response.get("error"):
+            raise Exception(f"Supabase DB insert failed: {response['error']}")
+
+
+class SQLiteTable:
+    """
+    Local stand-in for the results table. Columns are added the first time a row key appears
+    (result rows differ per label set and metric), lists and dicts are stored as JSON text,
+    and every insert() is one transaction.
+    """
+
+    def __init__(self, path, table_name="segmentation_results"):
+        self.table_name = table_name
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" (id INTEGER PRIMARY KEY AUTOINCREMENT)')
+            self._columns = self._existing_columns()
+
+    def _existing_columns(self):
+        return {row[1] for row in self._connection.execute(f'PRAGMA table_info("{self.table_name}")')}
+
+    def insert(self, rows):
+        if not rows:
+            return
+        with self._lock, self._connection:
+            for column in sorted({key for row in rows for key in row} - self._columns):
+                self._connection.execute(f'ALTER TABLE "{self.table_name}" ADD COLUMN "{column}"')
+                self._columns.add(column)
+            # One statement per distinct key set, so executemany can batch rows of the same shape.
+            groups = {}
+            for row in rows:
+                groups.setdefault(tuple(row), []).append(row)
+            for columns, group in groups.items():
+                names = ", ".join(f'"{c}"' for c in columns)
+                placeholders = ", ".join("?" for _ in columns)
+                self._connection.executemany(
+                    f'INSERT INTO "{self.table_name}" ({names}) VALUES ({placeholders})',
+                    [[_sql_value(row[c]) for c in columns] for row in group])
+
+    def select(self):
+        """
+        Every stored row as a dict (NULL columns omitted), in insertion order.
+        """
+        with self._lock:
+            cursor = self._connection.execute(f'SELECT * FROM "{self.table_name}" ORDER BY id')
+            names = [d[0] for d in cursor.description]
+            return [{n: v for n, v in zip(names, values) if v is not None} for values in cursor]
+
+    def close(self):
+        self._connection.close()
+
+
+def _sql_value(value):
+    return json.dumps(value) if isinstance(value, (list, tuple, dict)) else value
+
+
+class ResultSink:
+    """
+    Write-behind buffer for result rows: put() appends the row to a local JSON-lines journal
+    and returns, and a background thread bulk-inserts the buffered rows into table when
+    max_rows are waiting, and otherwise every max_interval_s. close() flushes whatever is left.
+
+    The journal makes buffered rows durable: it holds {"seq", "row"} lines and a
+    {"flushed_through": seq} line after every successful insert, and rows written after the
+    last marker are re-queued when a sink is opened on the same journal. A crash between an
+    insert and its marker replays those rows, so delivery is at-least-once.
+    Failed inserts keep their rows buffered and are retried after max_interval_s, doubling
+    with each consecutive failure up to MAX_RETRY_INTERVAL_S.
+    """
+
+    def __init__(self, table, journal_path, max_rows=100, max_interval_s=2.0, fsync=True):
+        self.table = table
+        self.journal_path = journal_path
+        self.max_rows = max_rows
+        self.max_interval_s = max_interval_s
+        self.fsync = fsync
+        self._buffer = []
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        self._recover()
+        self._journal = open(journal_path, 'a')
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+
+    def _recover(self):
+        if not os.path.exists(self.journal_path):
+            return
+        pending, flushed_through = [], 0
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A torn last line from a crash mid-write.
+                if "flushed_through" in entry:
+                    flushed_through = max(flushed_through, entry["flushed_through"])
+                else:
+                    pending.append(entry)
+                    self._seq = max(self._seq, entry["seq"])
+        self._buffer = [(e["seq"], e["row"]) for e in pending if e["seq"] > flushed_through]
+        if self._buffer:
+            print(f"Recovered {len(self._buffer)} unflushed result rows from {self.journal_path}")
+        # Rewrite the journal with only the rows still pending.
+        with open(self.journal_path, 'w') as f:
+            for seq, row in self._buffer:
+                f.write(json.dumps({"seq": seq, "row": row}) + "\n")
+
+    def _append(self, entry):
+        self._journal.write(json.dumps(entry, default=str) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def put(self, row):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("ResultSink is closed.")
+            self._seq += 1
+            row = json.loads(json.dumps(row, default=str))
+            self._append({"seq": self._seq, "row": row})
+            self._buffer.append((self._seq, row))
+            if len(self._buffer) >= self.max_rows:
+                self._condition.notify()
+
+    def flush(self):
+        """
+        Inserts every buffered row as one bulk insert. Returns the number of rows inserted.
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch = list(self._buffer)
+            if not batch:
+                return 0
+            self.table.insert([row for _, row in batch])
+            with self._condition:
+                del self._buffer[:len(batch)]
+                self._append({"flushed_through": batch[-1][0]})
+                if not self._buffer:
+                    # Everything is stored: start the journal over so it does not grow without bound.
+                    self._journal.truncate(0)
+            return len(batch)
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._condition:
+                if self._closed:
+                    return
+                if failures:
+                    # Back off after a failed insert even when the buffer is full (put() keeps
+                    # notifying then), or a down table would be retried in a tight loop.
+                    self._condition.wait_for(lambda: self._closed,
+                                             min(self.max_interval_s * 2 ** (failures - 1), MAX_RETRY_INTERVAL_S))
+                elif len(self._buffer) < self.max_rows:
+                    self._condition.wait(self.max_interval_s)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"Result insert failed (attempt {failures}), keeping rows buffered for the next attempt: {e}")
+
+    def close(self):
+        """
+        Stops the background thread and makes a final insert. If that insert fails, the rows stay
+        in the journal for the next sink opened on it, and close() reports them instead of raising.
+        Returns the number of rows left unflushed.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Final result insert failed: {e}. {len(self._buffer)} result rows stay in "
+                  f"{self.journal_path} and are inserted on the next run.")
+        finally:
+            self._journal.close()
+        return len(self._buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def add_result_sink_arguments(parser):
+    parser.add_argument("--result_sink", type=str, default=None, choices=RESULT_SINKS,
+                        help="Store result rows in Supabase (--supabase_table) or a local SQLite database, with buffered bulk inserts.")
+    parser.add_argument("--results_db", type=str, default="segmentation_results.sqlite",
+                        help="SQLite database file for --result_sink sqlite.")
+    parser.add_argument("--results_journal", type=str, default=None,
+                        help="Journal of result rows not yet inserted (default: <output_dir>/results_journal.jsonl).")
+    parser.add_argument("--results_batch_rows", type=int, default=100,
+                        help="Insert as soon as this many result rows are buffered.")
+    parser.add_argument("--results_batch_interval", type=float, default=2.0,
+                        help="Insert buffered result rows at least this often (seconds).")
+
+
+def result_sink_from_args(args, table_name, journal_path):
+    """
+    ResultSink for the CLI arguments, or None when --result_sink is not set.
+    The Supabase table reads args.supabase_url and args.supabase_key.
+    """
+    if not args.result_sink:
+        return None
+    if args.result_sink == 'supabase':
+        from supabase import create_client
+        table = SupabaseTable(create_client(args.supabase_url, args.supabase_key), table_name)
+    else:
+        table = SQLiteTable(args.results_db, table_name)
+    return ResultSink(table, args.results_journal or journal_path,
+                      max_rows=args.results_batch_rows, max_interval_s=args.results_batch_interval)
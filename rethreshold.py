@@ -0,0 +1,60 @@
+import os
+import json
+import time
+import argparse
+
+from mask_codec import MASK_CODECS
+from probability_maps import load_probability_map, threshold_probability_map
+from segmentation_engine import MASK_FORMATS, calculate_volume, export_segmentation_mask
+
+
+def rethreshold(map_path, threshold, output_dir, mask_format='nifti', mask_codec='rle', compression_level=6):
+    """
+    Rebuilds the mask, segment volumes and mask export of a scan from the probability map that
+    segmentation_engine.py --save_probabilities wrote, without loading torch or the model.
+    Outputs are named after the scan and threshold, e.g. segmentation_mask_<scan>_t0.3.nii.gz.
+    Returns the results dict.
+    """
+    start = time.perf_counter()
+    probabilities, sidecar = load_probability_map(map_path)
+    mask = threshold_probability_map(probabilities, threshold)
+    metadata = sidecar["metadata"]
+    segment_volumes = calculate_volume(mask, metadata)
+
+    os.makedirs(output_dir, exist_ok=True)
+    scan_name = f"{sidecar['scan_name']}_t{threshold:g}"
+    mask_path = export_segmentation_mask(mask, metadata, output_dir, scan_name, sidecar.get("original_nifti_path"),
+                                         mask_format=mask_format, mask_codec=mask_codec,
+                                         compression_level=compression_level)
+    results = {"probability_map_path": map_path, "threshold": threshold,
+               "segmentation_mask_path": mask_path, **segment_volumes}
+    with open(os.path.join(output_dir, f"rethreshold_results_{scan_name}.json"), 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Re-thresholded at {threshold:g} in {1000 * (time.perf_counter() - start):.1f} ms.")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a segmentation mask from a saved probability map at a new threshold.")
+    parser.add_argument("probability_map_path", type=str,
+                        help="probabilities_<scan>.npy written by segmentation_engine.py --save_probabilities.")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.5],
+                        help="One or more probability thresholds; one mask is written per threshold.")
+    parser.add_argument("--output_dir", type=str, default=None,
+                        help="Output directory (default: the directory of the probability map).")
+    parser.add_argument("--mask_format", type=str, default="nifti", choices=MASK_FORMATS,
+                        help="Mask file format: NIfTI (.nii.gz) or the compact bounding-box encoding (.bmsk).")
+    parser.add_argument("--mask_codec", type=str, default="rle", choices=MASK_CODECS,
+                        help="Label encoding inside .bmsk masks.")
+    parser.add_argument("--mask_compression_level", type=int, default=6, choices=range(10), metavar="{0..9}",
+                        help="zlib compression level of .bmsk masks.")
+
+    args = parser.parse_args()
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(args.probability_map_path))
+    for threshold in args.threshold:
+        rethreshold(args.probability_map_path, threshold, output_dir, mask_format=args.mask_format,
+                    mask_codec=args.mask_codec, compression_level=args.mask_compression_level)
+
+
+if __name__ == "__main__":
+    main()
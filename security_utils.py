@@ -1,10 +1,9 @@
 import os
-import pydicom
-import nibabel as nib
 import numpy as np
 import argparse
-from datetime import datetime
-import supabase # Supabase 설치 후 주석 해제
+from volume_io import read_dicom_series
+
+# pydicom, nibabel, supabase는 실제로 사용하는 함수 안에서 import하여 CLI 시작 시간을 줄입니다.
 
 # --- Supabase Configuration (Placeholder) ---
 # SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -20,7 +19,7 @@ def get_supabase_client(url, key):
         print("경고: Supabase 자격 증명이 설정되지 않았습니다. 더미 클라이언트를 사용합니다.")
         return DummySupabaseClient()
     
-    from supabase import create_client, Client # supabase 설치 후 주석 해제
+    from supabase import create_client # supabase 설치 후 주석 해제
     return create_client(url, key)
     # print("Supabase 클라이언트 (더미) 초기화.")
     # return DummySupabaseClient() # 실제 클라이언트 대신 더미 클라이언트 반환
@@ -66,6 +65,8 @@ def anonymize_dicom(dicom_filepath, output_filepath=None):
     DICOM 파일의 PII를 삭제하거나 가명화합니다.
     output_filepath가 None이면 원본 파일을 덮어씁니다 (주의!).
     """
+    import pydicom
+
     try:
         ds = pydicom.dcmread(dicom_filepath)
 
@@ -118,6 +119,9 @@ def dicom_to_nifti_and_export(dicom_filepath_or_dir, output_nifti_filepath, supa
     """
     DICOM 파일(또는 시리즈)을 NIfTI로 변환하고, 선택적으로 Supabase Storage에 업로드합니다.
     """
+    import pydicom
+    import nibabel as nib
+
     try:
         # DICOM 데이터 읽기 (mri_preprocessor.py의 로직을 재사용)
         # 단일 DICOM 파일 처리
@@ -129,16 +133,10 @@ def dicom_to_nifti_and_export(dicom_filepath_or_dir, output_nifti_filepath, supa
             affine = np.eye(4) 
         # DICOM 시리즈 디렉토리 처리
         elif os.path.isdir(dicom_filepath_or_dir):
-            dicom_files = [pydicom.dcmread(os.path.join(dicom_filepath_or_dir, f)) for f in os.listdir(dicom_filepath_or_dir) if f.endswith('.dcm')]
-            dicom_files.sort(key=lambda x: int(x.InstanceNumber))
-            
-            if not dicom_files:
-                raise ValueError("지정된 디렉토리에서 DICOM 파일을 찾을 수 없습니다.")
-
-            # 3D 배열 생성
-            image_data = np.stack([s.pixel_array for s in dicom_files], axis=-1)
-            # 어파인 정보는 DICOM 시리즈에서 추출해야 하지만, 여기서는 단순화를 위해 단위 행렬 사용
-            affine = np.eye(4)
+            # mri_preprocessor와 동일한 병렬 시리즈 로더를 사용합니다.
+            image_data, header = read_dicom_series(dicom_filepath_or_dir)
+            # 시리즈 로더가 계산한 어파인을 사용하고, 계산할 수 없었으면 단위 행렬을 사용합니다.
+            affine = np.asarray(header["Affine"]) if header.get("Affine") is not None else np.eye(4)
         else:
             raise ValueError("유효한 DICOM 파일 또는 디렉토리를 제공하십시오.")
 
@@ -149,12 +147,10 @@ def dicom_to_nifti_and_export(dicom_filepath_or_dir, output_nifti_filepath, supa
 
         # Supabase Storage에 업로드
         if supabase_client and supabase_storage_path:
-            with open(output_nifti_filepath, 'rb') as f:
-                file_data = f.read()
-            
-            response = supabase_client.storage().from_(supabase_bucket).upload(supabase_storage_path, file_data)
-            if response.get("error"):
-                raise Exception(f"Supabase Storage 업로드 실패: {response['error']}")
+            # 파일 전체를 메모리에 읽지 않고 스트리밍하며, 실패 시 백오프 후 재시도합니다.
+            from upload_pipeline import SupabaseStorageBackend, upload_with_retry
+            upload_with_retry(SupabaseStorageBackend(supabase_client, supabase_bucket),
+                              output_nifti_filepath, supabase_storage_path, skip_existing=False)
             print(f"익명화된 NIfTI 파일을 Supabase Storage '{supabase_bucket}/{supabase_storage_path}'에 업로드 완료.")
             return True
         else:
@@ -170,8 +166,7 @@ def suggest_db_audit_logic():
     mri_scans 테이블에서 'is_shared' 플래그를 관리하고,
     공유 만료 시 접근을 차단하는 백엔드 검증 로직을 제안합니다.
     """
-    print("
---- 백엔드 데이터베이스 감사 로직 제안 ---")
+    print("\n--- 백엔드 데이터베이스 감사 로직 제안 ---")
     print("1. 'mri_scans' 테이블 구조:")
     print("   - `id`: Primary Key, UUID")
     print("   - `patient_id`: 환자 ID (익명화된 ID)")
@@ -182,13 +177,11 @@ def suggest_db_audit_logic():
     print("   - `created_at`: TIMESTAMPZ")
     print("   - `updated_at`: TIMESTAMPZ")
     
-    print("
-2. 'is_shared' 플래그 관리 로직:")
+    print("\n2. 'is_shared' 플래그 관리 로직:")
     print("   - 익명화된 NIfTI 파일이 Supabase Storage에 업로드되면, 해당 `mri_scans` 레코드의 `is_shared`를 True로 설정하고 `anonymized_nifti_url`을 업데이트합니다.")
     print("   - 공유 기간이 설정된 경우 `shared_until` 필드를 함께 업데이트합니다.")
     
-    print("
-3. 공유 만료 시 접근 차단 백엔드 검증 로직 (Supabase RLS 및 Edge Function/API 사용):")
+    print("\n3. 공유 만료 시 접근 차단 백엔드 검증 로직 (Supabase RLS 및 Edge Function/API 사용):")
     print("   a. Supabase Row Level Security (RLS):")
     print("      - `mri_scans` 테이블에 RLS 정책을 설정하여, `is_shared`가 True이고 `shared_until`이 현재 시간보다 미래인 경우에만 해당 레코드에 접근을 허용합니다.")
     print("      - 예시 RLS 정책 (SELECT 권한): `(is_shared = TRUE AND (shared_until IS NULL OR shared_until > now()))`")
@@ -200,13 +193,11 @@ def suggest_db_audit_logic():
     print("      - `shared_until`이 만료되었거나 `is_shared`가 False인 경우, 접근을 거부하고 403 Forbidden 응답을 반환합니다.")
     print("      - 유효한 경우에만 Storage의 서명된 URL(Signed URL)을 생성하여 클라이언트에 반환합니다. 이는 제한된 시간 동안만 유효한 다운로드 링크를 제공합니다.")
     
-    print("
-4. 주기적인 만료 처리 (Optional):")
+    print("\n4. 주기적인 만료 처리 (Optional):")
     print("   - Supabase Scheduler 또는 외부 Cron 작업을 사용하여 주기적으로 `mri_scans` 테이블을 스캔합니다.")
     print("   - `shared_until`이 지난 레코드에 대해 `is_shared` 플래그를 False로 업데이트하거나, 해당 Storage 파일을 삭제하여 접근을 명시적으로 차단합니다.")
     print("   - 이는 RLS와 Edge Function이 실시간 접근을 제어하지만, 데이터베이스 내 `is_shared` 상태를 최신으로 유지하여 관리 편의성을 높입니다.")
-    print("
---- 제안 종료 ---")
+    print("\n--- 제안 종료 ---")
 
 
 # --- Main Execution ---
@@ -255,8 +246,7 @@ def main():
     # 3. Database Audit (제안만 출력)
     suggest_db_audit_logic()
 
-    print("
-보안 유틸리티 실행 완료!")
+    print("\n보안 유틸리티 실행 완료!")
     print("최종 보안 점검: 구현된 익명화 로직과 데이터 흐름을 검토하고, 실제 사용 시 개인 정보 보호 규정(예: HIPAA, GDPR) 준수 여부를 확인하십시오.")
     print("특히 'mri_scans' 테이블의 `is_shared` 플래그와 `shared_until` 필드 관리에 대한 백엔드 로직은 추가 구현이 필요합니다.")
 
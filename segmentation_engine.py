@@ -1,41 +1,74 @@
-import torch
-import torch.nn as nn
-import nibabel as nib
 import numpy as np
 import os
+import sys
 import json
 import argparse
 import datetime
-import supabase
-
-# --- Dummy Model (Placeholder for a real segmentation model like U-Net or UNETR) ---
-class DummySegmentationModel(nn.Module):
-    def __init__(self, in_channels=1, out_channels=1, num_classes=2):
-        super().__init__()
-        # In a real model, this would be a U-Net, UNETR, etc.
-        # For a dummy, we just simulate an output.
-        self.conv1 = nn.Conv3d(in_channels, 16, kernel_size=3, padding=1)
-        self.relu = nn.ReLU()
-        self.conv2 = nn.Conv3d(16, out_channels, kernel_size=3, padding=1)
-        # Using sigmoid for binary segmentation, or softmax for multi-class
-        self.final_activation = nn.Sigmoid() if num_classes == 2 else nn.Softmax(dim=1)
-        self.num_classes = num_classes
-
-    def forward(self, x):
-        # Simulate some processing
-        x = self.relu(self.conv1(x))
-        x = self.conv2(x)
-        return self.final_activation(x)
+from typing import TYPE_CHECKING
+from volume_io import PROCESSED_FILENAME, load_nifti_volume, load_preprocessed_volume
+from resampling import resample_volume
+from preview_renderer import PREVIEW_FORMATS, render_previews
+from mask_codec import MASK_CODECS, MASK_EXTENSION
+from probability_maps import PROBABILITY_DTYPES, probabilities_to_mask
+
+# torch, nibabel and supabase are imported by the functions that need them, so that
+# `--help`, argument errors and torch-free helpers (volumes, Dice) start quickly.
+if TYPE_CHECKING:
+    import torch
+
+
+def __getattr__(name):
+    # DummySegmentationModel moved to segmentation_model; importing it from here still works.
+    if name == "DummySegmentationModel":
+        from segmentation_model import DummySegmentationModel
+        return DummySegmentationModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def select_device():
+    """
+    Returns the best available torch device (mps, then cuda, then cpu).
+    """
+    import torch
+
+    return torch.device("mps" if torch.backends.mps.is_available() else "cuda" if torch.cuda.is_available() else "cpu")
 
 # --- AI Model Inference Wrapper ---
-def load_model(model_path=None, in_channels=1, out_channels=1, num_classes=2, device='cpu'):
+def load_model(model_path=None, in_channels=1, out_channels=1, num_classes=2, device='cpu',
+               backend='eager', threads=None, autocast=None, quantized=False):
     """
     Loads a segmentation model. If model_path is None, a dummy model is returned.
+    backend, threads and autocast select the CPU inference backend (see inference_backends);
+    the default 'eager' returns the plain torch module.
+    With quantized=True, model_path is an int8 TorchScript checkpoint written by quantization.py
+    and runs on the CPU as is; other backends, autocast and non-CPU devices are rejected.
     """
+    import torch
+    from segmentation_model import DummySegmentationModel
+
+    if quantized:
+        from quantization import load_quantized_model
+        if backend != 'eager':
+            raise ValueError(f"Quantized models run as is; the '{backend}' backend does not apply.")
+        if autocast:
+            raise ValueError(f"Quantized models already run in int8; '{autocast}' autocast does not apply.")
+        if torch.device(device).type != 'cpu':
+            raise ValueError(f"Quantized models only run on the CPU, not on '{device}'.")
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"Quantized model not found: {model_path}")
+        if threads:
+            torch.set_num_threads(threads)
+        model = load_quantized_model(model_path)
+        print(f"Loaded int8 quantized model from {model_path}")
+        return model
+
     model = DummySegmentationModel(in_channels, out_channels, num_classes)
+    # Marks randomly initialized weights, which must never be used to cache results.
+    model.is_dummy = True
     if model_path and os.path.exists(model_path):
         try:
             model.load_state_dict(torch.load(model_path, map_location=device))
+            model.is_dummy = False
             print(f"Loaded model from {model_path}")
         except Exception as e:
             print(f"Warning: Could not load model from {model_path}. Using dummy model. Error: {e}")
@@ -43,13 +76,38 @@ def load_model(model_path=None, in_channels=1, out_channels=1, num_classes=2, de
         print("No model path provided or model not found. Using dummy segmentation model.")
     model.to(device)
     model.eval() # Set model to evaluation mode
+    if backend != 'eager' or threads or autocast:
+        from inference_backends import build_inference_model
+        model = build_inference_model(model, backend, threads=threads, autocast=autocast)
+        print(f"Using {backend} inference backend" + (f" with {autocast} autocast." if autocast else "."))
     return model
 
-def perform_inference(model, preprocessed_data: np.ndarray, device: torch.device):
+def perform_inference(model, preprocessed_data: np.ndarray, device: "torch.device", patch_size=None,
+                      patch_overlap=0.25, patch_batch_size=4, blend='gaussian', threads=None,
+                      return_probabilities=False):
     """
     Performs inference on preprocessed MRI data using the loaded model.
-    Returns a segmentation mask (numpy array).
+    Returns a segmentation mask (numpy array), or (mask, model output) with return_probabilities.
+    With patch_size, the volume is segmented by sliding-window patches (see
+    sliding_window_inference) so peak memory no longer grows with the volume size.
+    threads sets torch's intra-op thread count (default: torch's own setting).
     """
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    if patch_size is not None:
+        from sliding_window_inference import sliding_window_inference
+        output = sliding_window_inference(model, np.asarray(preprocessed_data, dtype=np.float32), patch_size,
+                                          device=device, overlap=patch_overlap, batch_size=patch_batch_size,
+                                          blend=blend)
+        # Drop a single channel axis like the whole-volume path; multi-channel outputs keep theirs.
+        probabilities = output[0] if len(output) == 1 else output
+        mask = probabilities_to_mask(probabilities)
+        print(f"Sliding-window inference complete ({patch_size} patches, {patch_overlap:.0%} overlap). Mask shape: {mask.shape}")
+        return (mask, probabilities) if return_probabilities else mask
+
     # Ensure data is float32 and add batch and channel dimensions (BxCxDxHxW)
     input_tensor = torch.from_numpy(preprocessed_data).float().unsqueeze(0).unsqueeze(0)
     input_tensor = input_tensor.to(device)
@@ -59,50 +117,129 @@ def perform_inference(model, preprocessed_data: np.ndarray, device: torch.device
     
     # Post-process output: remove batch and channel dims, convert to numpy
     # Apply a threshold for binary mask, assuming output is probabilities
-    mask = (output.squeeze(0).squeeze(0) > 0.5).cpu().numpy().astype(np.uint8)
+    probabilities = output.squeeze(0).squeeze(0).float().cpu().numpy()
+    mask = probabilities_to_mask(probabilities)
     print(f"Inference complete. Mask shape: {mask.shape}")
-    return mask
+    return (mask, probabilities) if return_probabilities else mask
+
+
+def threshold_batch_output(output, threshold=0.5):
+    """
+    uint8 masks from a batched (B, C, D, H, W) model output, post-processed like perform_inference:
+    single-channel outputs lose the channel axis, and every channel is thresholded at threshold.
+    """
+    return probabilities_to_mask(output.float().cpu().numpy(), threshold, channel_axis=1)
+
+
+def perform_batch_inference(model, volumes, device, memory_budget_mb=2048, activation_factor=32,
+                            max_batch_size=None, threshold=0.5):
+    """
+    Segments an iterable (list, generator, ...) of same-shape preprocessed volumes and yields
+    their uint8 masks in input order, post-processed as in perform_inference.
+    Volumes are read lazily and stacked into BxCxDxHxW chunks, one forward pass per chunk.
+    The chunk size is the number of volumes whose estimated footprint (input bytes times
+    activation_factor, the model's peak activation memory relative to its input) fits in
+    memory_budget_mb, capped by max_batch_size and never below one volume.
+    """
+    import itertools
+    import torch
+
+    volumes = iter(volumes)
+    first = next(volumes, None)
+    if first is None:
+        return
+    shape = np.shape(first)
+    volume_bytes = int(np.prod(shape)) * np.dtype(np.float32).itemsize
+    chunk_size = max(1, int(memory_budget_mb * 1024 ** 2 // (volume_bytes * activation_factor)))
+    if max_batch_size:
+        chunk_size = min(chunk_size, max_batch_size)
+
+    batch = np.empty((chunk_size, 1) + tuple(shape), dtype=np.float32)
+    pending = itertools.chain([first], volumes)
+    while True:
+        chunk = list(itertools.islice(pending, chunk_size))
+        if not chunk:
+            break
+        for i, volume in enumerate(chunk):
+            if np.shape(volume) != shape:
+                raise ValueError(f"All volumes must share one shape: got {np.shape(volume)}, expected {shape}.")
+            batch[i, 0] = volume
+        with torch.inference_mode():
+            output = model(torch.from_numpy(batch[:len(chunk)]).to(device))
+        yield from threshold_batch_output(output, threshold)
+
+
+def add_inference_arguments(parser):
+    """
+    Adds the perform_inference options (sliding-window patches, threads) to an argparse parser.
+    """
+    from sliding_window_inference import BLEND_MODES
+    from inference_backends import AUTOCAST_DTYPES, INFERENCE_BACKENDS
+
+    parser.add_argument("--patch_size", type=str, default=None,
+                        help="Sliding-window patch size, e.g., '96,96,96'. Whole-volume inference if not set.")
+    parser.add_argument("--patch_overlap", type=float, default=0.25,
+                        help="Fraction of each patch that overlaps its neighbours.")
+    parser.add_argument("--patch_batch_size", type=int, default=4,
+                        help="Number of patches stacked into one forward pass.")
+    parser.add_argument("--blend", type=str, default="gaussian", choices=BLEND_MODES,
+                        help="Weighting used to blend overlapping patch outputs.")
+    parser.add_argument("--inference_threads", type=int, default=None,
+                        help="Intra-op threads used for inference (default: the backend's setting).")
+    parser.add_argument("--backend", type=str, default="eager", choices=INFERENCE_BACKENDS,
+                        help="Inference backend: eager PyTorch, TorchScript trace or torch.compile on the selected device, "
+                             "or onnxruntime, which always runs on the CPU.")
+    parser.add_argument("--autocast", type=str, default=None, choices=AUTOCAST_DTYPES,
+                        help="Run the torch backends under bf16/fp16 autocast on the selected device.")
+
+
+def inference_options_from_args(args):
+    """
+    Collects the perform_inference keyword arguments from parsed add_inference_arguments options.
+    """
+    return {
+        "patch_size": tuple(map(int, args.patch_size.split(','))) if args.patch_size else None,
+        "patch_overlap": args.patch_overlap,
+        "patch_batch_size": args.patch_batch_size,
+        "blend": args.blend,
+        "threads": args.inference_threads,
+    }
+
+# --crop_to_brain warns when the box keeps more than this fraction of the volume.
+CROP_WARNING_FRACTION = 0.9
+
+
+def brain_crop_box(metadata, shape, margin=4):
+    """
+    Slices of the processed volume covering metadata['brain_bbox'] plus margin voxels, or None
+    when the metadata has no box (older preprocessor output) or describes another grid.
+    Cropping changes model outputs within the receptive-field radius of the box edge, and a padded
+    3D U-Net sees far more than a few voxels, so predictions near the brain edge can differ from a
+    whole-volume pass; a wider margin moves that zone further from the brain at the cost of speed.
+    """
+    from spatial_transforms import processed_box
+
+    bbox, transform = metadata.get('brain_bbox'), metadata.get('transform')
+    if not bbox or not transform or list(shape) != transform['processed_shape']:
+        return None
+    start, stop = processed_box(transform, bbox['start'], bbox['stop'], margin)
+    return tuple(slice(a, b) for a, b in zip(start, stop))
 
 # --- Volume Calculation ---
 def calculate_volume(segmentation_mask: np.ndarray, metadata: dict) -> dict:
     """
     Calculates the volume of segmented regions in mm³.
-    Requires 'pixel_spacing' (for x,y) and 'slice_thickness' (for z) from metadata.
+    Requires 'pixel_spacing' (for x,y) and 'slice_thickness' (for z) from metadata; a mask on
+    the processed grid is measured with that grid's voxel size (see voxel_spacing_mm).
     Segmentation mask is expected to be binary or multi-class (0, 1, 2...).
+    All labels are counted in a single pass (see volume_statistics).
     """
-    if 'pixel_spacing' not in metadata or 'slice_thickness' not in metadata:
-        raise ValueError("Metadata must contain 'pixel_spacing' and 'slice_thickness' for volume calculation.")
-
-    # Ensure pixel_spacing is a list/tuple of two values
-    pixel_spacing = metadata['pixel_spacing']
-    if isinstance(pixel_spacing, (list, tuple)) and len(pixel_spacing) == 2:
-        voxel_width = float(pixel_spacing[0])
-        voxel_height = float(pixel_spacing[1])
-    elif isinstance(pixel_spacing, (list, tuple)) and len(pixel_spacing) > 2: # For NIfTI, might be (x,y,z)
-        voxel_width = float(pixel_spacing[0])
-        voxel_height = float(pixel_spacing[1])
-        if metadata.get('file_type') == 'NIfTI' and 'voxel_sizes' in metadata:
-            # If NIfTI, try to get from voxel_sizes explicitly
-            voxel_width = metadata['voxel_sizes'][0]
-            voxel_height = metadata['voxel_sizes'][1]
-    else: # Fallback for single value or other formats
-        voxel_width = float(pixel_spacing)
-        voxel_height = float(pixel_spacing)
-
-    slice_thickness = float(metadata['slice_thickness'])
-    
-    # Volume of a single voxel in mm³
-    voxel_volume_mm3 = voxel_width * voxel_height * slice_thickness
-    
-    unique_labels = np.unique(segmentation_mask)
-    segment_volumes = {}
+    from volume_statistics import label_volumes, voxel_spacing_mm
 
-    for label in unique_labels:
-        if label == 0: # Assuming 0 is background
-            continue
-        num_voxels = np.sum(segmentation_mask == label)
-        volume = num_voxels * voxel_volume_mm3
-        segment_volumes[f"segment_{label}_volume_mm3"] = float(volume)
+    segment_volumes = {}
+    spacing = voxel_spacing_mm(metadata, np.shape(segmentation_mask))
+    for label, (_, volume) in label_volumes(segmentation_mask, spacing).items():
+        segment_volumes[f"segment_{label}_volume_mm3"] = volume
         print(f"Segment {label} volume: {volume:.2f} mm³")
     
     return segment_volumes
@@ -112,61 +249,132 @@ def dice_coefficient(prediction: np.ndarray, ground_truth: np.ndarray, num_class
     """
     Calculates the Dice Coefficient between prediction and ground truth.
     Supports binary and multi-class (per label) calculation.
+    All classes come from one joint-label confusion matrix (see segmentation_metrics).
+    With num_classes, only labels below it are scored; larger labels count as other classes.
     """
-    if prediction.shape != ground_truth.shape:
-        raise ValueError("Prediction and ground truth masks must have the same shape.")
+    from segmentation_metrics import confusion_matrix, overlap_metrics
 
-    if num_classes is None:
-        num_classes = max(np.max(prediction), np.max(ground_truth)) + 1
-    
+    matrix = confusion_matrix(prediction, ground_truth)
+    if num_classes is not None and num_classes > len(matrix):
+        matrix = np.pad(matrix, (0, num_classes - len(matrix)))
+    dice = overlap_metrics(matrix)["dice_score"][:num_classes]
     dice_scores = {}
-    for i in range(1, num_classes): # Iterate through classes, excluding background (label 0)
-        pred_class = (prediction == i)
-        gt_class = (ground_truth == i)
-
-        intersection = np.sum(pred_class * gt_class)
-        union = np.sum(pred_class) + np.sum(gt_class)
-
-        if union == 0:
-            dice_scores[f"dice_score_class_{i}"] = 1.0 # Both are empty, perfect match
-        else:
-            dice_scores[f"dice_score_class_{i}"] = (2. * intersection) / union
+    for i in range(1, len(dice)): # Classes excluding background (label 0)
+        dice_scores[f"dice_score_class_{i}"] = float(dice[i])
         print(f"Dice score for class {i}: {dice_scores[f'dice_score_class_{i}']:.4f}")
     
     return dice_scores
 
+
+def evaluate_segmentation(prediction: np.ndarray, ground_truth: np.ndarray, spacing=None, boundary=True) -> dict:
+    """
+    Dice, IoU, precision, recall, volume similarity and (with boundary) HD95 and ASSD in mm
+    for every class, keyed '<metric>_class_<i>' (the Dice keys match dice_coefficient).
+    """
+    from segmentation_metrics import segmentation_metrics
+
+    metrics = segmentation_metrics(prediction, ground_truth, spacing=spacing, boundary=boundary)
+    for key, value in metrics.items():
+        print(f"{key}: {'undefined' if value is None else f'{value:.4f}'}")
+    return metrics
+
 # --- Mask Export ---
-def export_mask_as_nifti(mask_data: np.ndarray, original_nifti_path: str, output_path: str):
+MASK_FORMATS = ('nifti', 'bmsk')
+
+
+def native_space_mask(mask_data: np.ndarray, original_nifti_path: str, transform=None):
     """
-    Saves the segmentation mask as a NIfTI file, using the original NIfTI's affine.
+    Places the segmentation mask in the original NIfTI's space and returns (mask, affine, header).
+    A mask on the processed grid is first resampled back to the original grid (nearest
+    neighbour, see spatial_transforms) using the forward transform the preprocessor recorded
+    in metadata['transform'].
     """
+    import nibabel as nib
+
     if not os.path.exists(original_nifti_path):
         raise FileNotFoundError(f"Original NIfTI file not found: {original_nifti_path}")
     
     original_img = nib.load(original_nifti_path)
-    # Ensure mask_data has the same spatial dimensions as the original image data
-    # Resample mask to original image space if necessary, but for now assuming it's already aligned/resized
-    # If the mask is already resized, the affine might need to be adjusted or a new identity affine used.
-    # For simplicity, we assume the mask is in the same space as the data used for preprocessing that had the header.
-    # A more robust solution would resample the mask back to the original resolution.
-
-    # If the mask is a different shape than the original image after resizing
-    # this will need proper affine transformation or resampling.
-    # For now, let's assume the mask's shape is the same as the preprocessed input's shape.
-    # If the mask dimensions are different from the original_img.shape, we need to handle it.
-    # For now, we'll create a new NIfTI image with identity affine if shapes mismatch.
-    if mask_data.shape == original_img.shape:
-        nifti_mask = nib.Nifti1Image(mask_data, original_img.affine, original_img.header)
-    else:
-        # If the mask was resized, we might need a simpler affine or resample the mask.
-        # For this prototype, if shapes differ, use identity affine and new header.
-        print(f"Warning: Mask shape {mask_data.shape} differs from original NIfTI shape {original_img.shape}. "
-              "Saving mask with an identity affine.")
-        nifti_mask = nib.Nifti1Image(mask_data, np.eye(4)) # Use identity affine
-        
-    nib.save(nifti_mask, output_path)
+    if mask_data.shape != original_img.shape[:3] and transform is not None \
+            and list(original_img.shape[:3]) == transform["input_shape"] \
+            and list(mask_data.shape) == transform["processed_shape"]:
+        from spatial_transforms import inverse_resample_mask
+        mask_data = inverse_resample_mask(mask_data, transform)
+        print(f"Mask resampled from the processed grid back to the original grid {mask_data.shape}.")
+
+    if mask_data.shape == original_img.shape[:3]:
+        header = original_img.header.copy()
+        # Store labels in the mask's own dtype rather than the scan's (possibly scaled) one.
+        header.set_data_dtype(mask_data.dtype)
+        header.set_slope_inter(1, 0)
+        return mask_data, original_img.affine, header
+    # Without a matching recorded transform there is no way to place the mask in the original space.
+    print(f"Warning: Mask shape {mask_data.shape} differs from original NIfTI shape {original_img.shape}. "
+          "Saving mask with an identity affine.")
+    return mask_data, np.eye(4), None # Use identity affine
+
+
+def export_mask_as_nifti(mask_data: np.ndarray, original_nifti_path: str, output_path: str, transform=None):
+    """
+    Saves the segmentation mask as a NIfTI file, using the original NIfTI's affine and header
+    (see native_space_mask).
+    """
+    import nibabel as nib
+
+    mask_data, affine, header = native_space_mask(mask_data, original_nifti_path, transform)
+    nib.save(nib.Nifti1Image(mask_data, affine, header), output_path)
     print(f"Segmentation mask saved to {output_path}")
 
+
+def save_segmentation_mask(mask_data, output_path, affine, header=None, mask_format='nifti',
+                           mask_codec='rle', compression_level=6):
+    """
+    Writes the mask as NIfTI (.nii.gz) or as a compact mask_codec file (.bmsk: bounding box plus
+    bit-packed or run-length encoded labels, zlib at compression_level).
+    """
+    if mask_format == 'bmsk':
+        from mask_codec import save_mask
+        save_mask(output_path, mask_data, codec=mask_codec, level=compression_level, affine=affine)
+        return
+    import nibabel as nib
+    nib.save(nib.Nifti1Image(mask_data, affine, header), output_path)
+    print(f"Segmentation mask saved to {output_path}")
+
+def export_segmentation_mask(segmentation_mask, metadata, output_dir, scan_name, original_nifti_path=None,
+                             mask_format='nifti', mask_codec='rle', compression_level=6):
+    """
+    Writes segmentation_mask_<scan_name> in the scan's native space when it is known: on the
+    original NIfTI's grid, or on the native grid recorded in metadata['transform'] (e.g. a DICOM
+    series). Otherwise, or when the mask is not on the processed grid (e.g. a multi-channel
+    mask), it is saved as is with an identity affine.
+    Returns the mask path.
+    """
+    extension = MASK_EXTENSION if mask_format == 'bmsk' else ".nii.gz"
+    mask_output_path = os.path.join(output_dir, f"segmentation_mask_{scan_name}{extension}")
+
+    transform = metadata.get('transform')
+    header = None
+    if not original_nifti_path and transform and transform.get('input_affine') is not None \
+            and list(segmentation_mask.shape) != transform['processed_shape']:
+        # e.g. a (C, D, H, W) multi-channel mask: only a mask on the processed grid can be resampled.
+        print(f"Warning: Mask shape {segmentation_mask.shape} is not the processed shape "
+              f"{tuple(transform['processed_shape'])}. Mask will be saved with identity affine.")
+        export_mask, affine = segmentation_mask, np.eye(4)
+    elif not original_nifti_path and transform and transform.get('input_affine') is not None:
+        from spatial_transforms import inverse_resample_mask
+
+        # The preprocessor recorded the native grid and affine (e.g. of a DICOM series): export there.
+        export_mask, affine = inverse_resample_mask(segmentation_mask, transform), np.asarray(transform['input_affine'])
+        print(f"Segmentation mask resampled to the native grid {export_mask.shape}.")
+    elif not original_nifti_path:
+        print("Warning: Original NIfTI path not provided. Mask will be saved with identity affine.")
+        export_mask, affine = segmentation_mask, np.eye(4)
+    else:
+        export_mask, affine, header = native_space_mask(segmentation_mask, original_nifti_path, transform)
+    save_segmentation_mask(export_mask, mask_output_path, affine, header, mask_format=mask_format,
+                           mask_codec=mask_codec, compression_level=compression_level)
+    return mask_output_path
+
 # --- Supabase Integration (Placeholders for now) ---
 # SUPABASE_URL = "YOUR_SUPABASE_URL" # Placeholder
 # SUPABASE_KEY = "YOUR_SUPABASE_ANON_KEY" # Placeholder
@@ -183,19 +391,12 @@ def upload_to_supabase_storage(supabase_client, bucket_name, file_path, storage_
     if not supabase_client:
         raise RuntimeError("Supabase client not initialized.")
     
-    with open(file_path, 'rb') as f:
-        data = f.read()
-        response = supabase_client.storage.from_(bucket_name).upload(storage_path, data)
-        # Supabase Python 클라이언트의 upload 메서드는 'data' 필드를 직접 반환하지 않습니다.
-        # 에러 체크 로직은 API 응답 구조에 따라 조정해야 합니다.
-        # 일반적으로 upload 성공 시 response 객체에 error 필드가 None이거나,
-        # data 필드에 파일 정보가 포함될 수 있습니다.
-        # 현재 라이브러리 버전 기준으로 성공 시 `{'path': '...', 'id': '...'}`와 같은
-        # 딕셔너리를 반환하고, 실패 시 `{'error': {...}}` 형태일 수 있습니다.
-        if "error" in response and response["error"]:
-            raise Exception(f"Supabase Storage upload failed: {response['error']}")
-        print(f"File uploaded to Supabase Storage: {storage_path}")
-        return supabase_client.storage.from_(bucket_name).get_public_url(storage_path) # 공개 URL 반환
+    # Stream the file instead of reading it into memory (see upload_pipeline for background uploads).
+    from upload_pipeline import SupabaseStorageBackend, upload_with_retry
+    backend = SupabaseStorageBackend(supabase_client, bucket_name)
+    result = upload_with_retry(backend, file_path, storage_path, skip_existing=False)
+    print(f"File uploaded to Supabase Storage: {storage_path}")
+    return result["url"] # 공개 URL 반환
 
 def insert_results_to_supabase_db(supabase_client, table_name, results_data):
     if not supabase_client:
@@ -212,10 +413,228 @@ def insert_results_to_supabase_db(supabase_client, table_name, results_data):
 
 
 # --- Main Execution Flow ---
+def scan_name_from_path(input_path):
+    """
+    Name used in a scan's output file names: the input's base name without extensions. A
+    trailing separator is ignored, and a preprocessor output file (processed.npy) is named
+    after its directory, since every preprocessed scan shares that file name.
+    """
+    path = os.path.abspath(input_path)
+    if os.path.basename(path) == PROCESSED_FILENAME:
+        path = os.path.dirname(path)
+    return os.path.basename(path).split('.')[0]
+
+
+def segment_scan(model, device, input_path, output_dir, metadata_path=None, original_nifti_path=None,
+                 ground_truth_path=None, preview_format=None, cache=None, target_shape=(128, 128, 128),
+                 threshold_factor=0.1, preprocess_options=None, inference_options=None, server_url=None,
+                 lesion_stats=False, boundary_metrics=True, mask_format='nifti', mask_codec='rle',
+                 mask_compression_level=6, inference_cache=None, save_probabilities=None, crop_to_brain=False,
+                 crop_margin=4):
+    """
+    Runs the engine on one scan with an already loaded model: load data and metadata, infer,
+    measure volumes, optionally score against ground truth, and export the mask (and previews).
+    With a preprocessing cache, input_path is the raw scan; otherwise it is preprocessed data.
+    inference_options are passed to perform_inference (patch size, overlap, threads, ...).
+    With server_url, inference is delegated to a running inference_server and model/device are unused.
+    With lesion_stats, per-lesion statistics are written to lesion_statistics_<scan>.json.
+    Against a ground truth, overlap metrics are always computed and HD95/ASSD if boundary_metrics.
+    mask_format='bmsk' writes the mask with mask_codec instead of as .nii.gz (see mask_codec.py).
+    With an inference_cache.InferenceCache bound to the model, a prediction for the same weights,
+    input and options is reused instead of running the model again.
+    save_probabilities ('float16' or 'uint8') also stores the model output for rethreshold.py.
+    With crop_to_brain, only the skull-strip bounding box (plus crop_margin voxels) recorded by
+    the preprocessor is sent to the model, and the mask is pasted back into the full volume.
+    Returns the results dict (input path, mask path, segment volumes, Dice scores).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 1. Load Preprocessed Data and Metadata
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Preprocessed data not found: {input_path}")
+
+    metadata = None
+    if cache is not None:
+        # With a preprocessing cache, input_path is the raw scan. A cache hit is used directly
+        # (already stripped, normalized and resized); a miss runs the preprocessor and fills the cache.
+        from mri_preprocessor import load_or_preprocess
+        preprocessed_data, metadata, _, _ = load_or_preprocess(
+            input_path, target_shape, threshold_factor, cache=cache, preprocess_options=preprocess_options)
+        cache.print_stats()
+    else:
+        preprocessed_data, metadata = load_preprocessed_volume(input_path)
+
+    if metadata_path:
+        if not os.path.exists(metadata_path):
+            raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        print(f"Loaded metadata from {metadata_path}")
+    elif metadata is None:
+        raise ValueError("--metadata_path is required unless a preprocessor output directory or the preprocessing cache is used.")
+
+    # 2. Perform Inference
+    inference_input, brain_box = preprocessed_data, None
+    if crop_to_brain:
+        brain_box = brain_crop_box(metadata, preprocessed_data.shape, crop_margin)
+        if brain_box is None:
+            print("Warning: No brain bounding box in the metadata (re-run the preprocessor); inferring on the full volume.")
+        else:
+            inference_input = np.ascontiguousarray(preprocessed_data[brain_box])
+            print(f"Cropped to the brain bounding box {inference_input.shape}: "
+                  f"{inference_input.size / preprocessed_data.size:.0%} of {preprocessed_data.size} voxels.")
+            if inference_input.size > CROP_WARNING_FRACTION * preprocessed_data.size:
+                print("Warning: The brain bounding box covers most of the volume, so cropping saves little. "
+                      "The default threshold skull strip keeps background noise; preprocessing with "
+                      "--skull_strip morphology gives a tight box.")
+
+    probabilities = None
+    cached = inference_cache.get(inference_input, inference_options) if inference_cache is not None else None
+    if cached is not None:
+        segmentation_mask, probabilities = cached
+        print(f"Inference cache hit: reusing the stored mask {segmentation_mask.shape}.")
+    elif server_url:
+        from inference_server import request_segmentation
+        segmentation_mask = request_segmentation(server_url, inference_input)
+        print(f"Inference complete on {server_url}. Mask shape: {segmentation_mask.shape}")
+    elif inference_cache is not None or save_probabilities:
+        segmentation_mask, probabilities = perform_inference(model, inference_input, device, return_probabilities=True,
+                                                             **(inference_options or {}))
+        if inference_cache is not None:
+            inference_cache.put(inference_input, inference_options, segmentation_mask, probabilities)
+    else:
+        segmentation_mask = perform_inference(model, inference_input, device, **(inference_options or {}))
+    if inference_cache is not None:
+        inference_cache.print_stats()
+
+    if brain_box is not None:
+        # Everything outside the brain box is background.
+        from spatial_transforms import paste_box
+        segmentation_mask = paste_box(segmentation_mask, brain_box, preprocessed_data.shape)
+        if probabilities is not None:
+            probabilities = paste_box(probabilities, brain_box, preprocessed_data.shape)
+
+    # 3. Volume Calculation
+    segment_volumes = calculate_volume(segmentation_mask, metadata)
+    scan_name = scan_name_from_path(input_path)
+
+    probability_results = {}
+    if save_probabilities and probabilities is None:
+        print("Warning: The inference server returns masks only; no probability map is saved.")
+    elif save_probabilities:
+        from probability_maps import save_probability_map
+        probability_results["probability_map_path"] = save_probability_map(
+            output_dir, scan_name, probabilities, metadata, dtype=save_probabilities,
+            original_nifti_path=original_nifti_path)
+
+    lesion_results = {}
+    if lesion_stats:
+        from volume_statistics import lesion_statistics, voxel_spacing_mm
+        lesions = lesion_statistics(segmentation_mask, voxel_spacing_mm(metadata, segmentation_mask.shape))
+        lesion_output_path = os.path.join(output_dir, f"lesion_statistics_{scan_name}.json")
+        with open(lesion_output_path, 'w') as f:
+            json.dump(lesions, f, indent=4)
+        print(f"{len(lesions)} lesions found; statistics saved to {lesion_output_path}")
+        lesion_results = {"lesion_count": len(lesions), "lesion_statistics_path": lesion_output_path}
+
+    # 4. Dice Score Evaluation (if ground truth is provided)
+    dice_scores = {}
+    if ground_truth_path:
+        if not os.path.exists(ground_truth_path):
+            raise FileNotFoundError(f"Ground truth file not found: {ground_truth_path}")
+        
+        # Label maps are read in their stored dtype instead of being expanded to float64.
+        ground_truth_mask = load_nifti_volume(ground_truth_path).astype(np.uint8)
+        
+        # Resize ground truth to match segmentation mask if necessary
+        if ground_truth_mask.shape != segmentation_mask.shape:
+            print(f"Warning: Ground truth shape {ground_truth_mask.shape} differs from prediction shape {segmentation_mask.shape}. Resizing ground truth.")
+            ground_truth_mask = resample_volume(ground_truth_mask, segmentation_mask.shape, order=0)
+        
+        from volume_statistics import voxel_spacing_mm
+        # Boundary distances are measured on the processed grid, so use its voxel size.
+        dice_scores = evaluate_segmentation(segmentation_mask, ground_truth_mask,
+                                            spacing=voxel_spacing_mm(metadata, segmentation_mask.shape),
+                                            boundary=boundary_metrics)
+    
+    # 5. Mask Export
+    mask_output_path = export_segmentation_mask(segmentation_mask, metadata, output_dir, scan_name,
+                                                original_nifti_path, mask_format=mask_format, mask_codec=mask_codec,
+                                                compression_level=mask_compression_level)
+
+    if preview_format:
+        render_previews(preprocessed_data, output_dir, mask=segmentation_mask,
+                        fmt=preview_format, prefix="segmentation_preview")
+
+    return {
+        "input_data_path": input_path,
+        "segmentation_mask_path": mask_output_path,
+        **segment_volumes,
+        **probability_results,
+        **lesion_results,
+        **dice_scores,
+    }
+
+
+def result_row(results, device):
+    """
+    Database row for one scan: its results plus processing time and device.
+    """
+    row = {key: value for key, value in results.items() if key != "status"}
+    row["processed_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    row["device_used"] = str(device)
+    return row
+
+
+def run_worker(model, device, jobs_stream, defaults, results_stream, uploader=None, sink=None):
+    """
+    Warm worker loop: torch, the model and the preprocessing cache are loaded once, then each
+    JSON line of jobs_stream is processed as one scan. A job holds "preprocessed_data_path" and
+    may override any other segment_scan argument (output_dir, metadata_path, ...).
+    One JSON result line is written per job; a failing job is reported and the loop continues.
+    With an upload_pipeline.UploadPipeline, each mask is uploaded in the background while the
+    next job runs, and its object key is recorded in the result. With a result_sink.ResultSink,
+    each successful result is also queued as a database row (see result_row).
+    """
+    for line_number, line in enumerate(jobs_stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            input_path = job.pop("preprocessed_data_path")
+            options = {**defaults, **job}
+            result = {"status": "done", **segment_scan(model, device, input_path, **options)}
+            if uploader is not None:
+                result["segmentation_mask_key"], _ = uploader.submit(result["segmentation_mask_path"])
+            if sink is not None:
+                sink.put(result_row(result, device))
+        except Exception as e:
+            print(f"Job {line_number} failed: {e}")
+            result = {"status": "failed", "job": line, "error": str(e)}
+        results_stream.write(json.dumps(result) + "\n")
+        results_stream.flush()
+
+
+def report_uploads(summary):
+    """
+    Prints the summary returned by UploadPipeline.close().
+    """
+    failed = summary["failed"]
+    print(f"Uploads: {summary['stored'] + summary['skipped']} stored ({summary['skipped']} already present), "
+          f"{len(failed)} failed.")
+    for r in failed:
+        print(f"Upload of {r['path']} failed: {r['error']}")
+
+
 def main():
+    from mri_preprocessor import add_preprocessing_arguments
+    from upload_pipeline import add_upload_arguments, upload_pipeline_from_args
+    from result_sink import add_result_sink_arguments, result_sink_from_args
+
     parser = argparse.ArgumentParser(description="AI Model Inference for MRI Segmentation.")
-    parser.add_argument("preprocessed_data_path", type=str,
-                        help="Path to the preprocessed MRI data (e.g., numpy array saved as .npy, or derived from original NIfTI).")
+    parser.add_argument("preprocessed_data_path", type=str, nargs="?",
+                        help="Path to the preprocessed MRI data: a mri_preprocessor output directory, its processed.npy, or a NIfTI file.")
     parser.add_argument("--original_nifti_path", type=str,
                         help="Path to the original NIfTI file (needed for mask export affine).")
     parser.add_argument("--metadata_path", type=str,
@@ -226,6 +645,52 @@ def main():
                         help="Directory to save segmentation outputs (mask, results).")
     parser.add_argument("--model_path", type=str, default=None,
                         help="Path to the trained PyTorch model state_dict file (.pt).")
+    parser.add_argument("--server_url", type=str, default=None,
+                        help="URL of a running inference_server.py (e.g., http://127.0.0.1:8765). Inference is sent there instead of loading the model here.")
+    parser.add_argument("--quantized", action="store_true",
+                        help="model_path is an int8 TorchScript checkpoint from quantization.py (CPU only).")
+    parser.add_argument("--jobs", type=str, default=None,
+                        help="Warm worker mode: JSON-lines job file ('-' for stdin), one scan per line, processed with one loaded model.")
+    parser.add_argument("--jobs_output", type=str, default=None,
+                        help="JSON-lines file receiving one result per job in worker mode (default: <output_dir>/worker_results.jsonl).")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Preprocessing cache directory. If set, preprocessed_data_path is the raw scan and cached volumes are reused.")
+    parser.add_argument("--cache_max_gb", type=float, default=10.0,
+                        help="Size cap of the preprocessing cache in GB.")
+    parser.add_argument("--target_shape", type=str, default="128,128,128",
+                        help="Preprocessing target shape used for the cache lookup, e.g., '128,128,128'.")
+    parser.add_argument("--threshold_factor", type=float, default=0.1,
+                        help="Preprocessing skull stripping threshold factor used for the cache lookup.")
+    parser.add_argument("--inference_cache_dir", type=str, default=None,
+                        help="Inference cache directory: masks for an unchanged model, input and inference options are reused.")
+    parser.add_argument("--inference_cache_max_gb", type=float, default=5.0,
+                        help="Size cap of the inference cache in GB.")
+    add_preprocessing_arguments(parser)
+    add_inference_arguments(parser)
+    add_upload_arguments(parser)
+    add_result_sink_arguments(parser)
+    parser.add_argument("--preview_format", type=str, default=None, choices=PREVIEW_FORMATS,
+                        help="Also write axial, coronal and sagittal previews with the predicted mask overlaid.")
+    parser.add_argument("--crop_to_brain", action="store_true",
+                        help="Send only the skull-strip bounding box recorded by the preprocessor to the model; voxels outside it are background. "
+                             "Use together with --skull_strip morphology when preprocessing: the default threshold strip keeps "
+                             "background voxels, so its box covers about the whole volume and cropping saves nothing.")
+    parser.add_argument("--crop_margin", type=int, default=4,
+                        help="Voxels added around the brain bounding box with --crop_to_brain. Predictions within the model's "
+                             "receptive-field radius of the box edge may differ from a whole-volume pass; a larger margin keeps "
+                             "that zone away from the brain but crops less.")
+    parser.add_argument("--save_probabilities", type=str, default=None, choices=PROBABILITY_DTYPES,
+                        help="Also save the model's probability map (float16 or uint8-quantized) so rethreshold.py can rebuild masks without inference.")
+    parser.add_argument("--mask_format", type=str, default="nifti", choices=MASK_FORMATS,
+                        help="Mask file format: NIfTI (.nii.gz) or the compact bounding-box encoding (.bmsk, see mask_codec.py).")
+    parser.add_argument("--mask_codec", type=str, default="rle", choices=MASK_CODECS,
+                        help="Label encoding inside .bmsk masks: run-length encoded or bit-packed.")
+    parser.add_argument("--mask_compression_level", type=int, default=6, choices=range(10), metavar="{0..9}",
+                        help="zlib compression level of .bmsk masks.")
+    parser.add_argument("--no_boundary_metrics", action="store_true",
+                        help="Skip HD95 and ASSD when evaluating against --ground_truth_path.")
+    parser.add_argument("--lesion_stats", action="store_true",
+                        help="Also write per-lesion volume, centroid, bounding box and surface area (connected components).")
     parser.add_argument("--supabase_url", type=str, default="YOUR_SUPABASE_URL",
                         help="Supabase Project URL.")
     parser.add_argument("--supabase_key", type=str, default="YOUR_SUPABASE_ANON_KEY",
@@ -236,88 +701,95 @@ def main():
                         help="Supabase table name for results.")
 
     args = parser.parse_args()
-
-    # Determine device for PyTorch
-    device = torch.device("mps" if torch.backends.mps.is_available() else "cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
-
-    os.makedirs(args.output_dir, exist_ok=True)
-
-    # 1. Load Preprocessed Data and Metadata
-    if not os.path.exists(args.preprocessed_data_path):
-        raise FileNotFoundError(f"Preprocessed data not found: {args.preprocessed_data_path}")
-    if not os.path.exists(args.metadata_path):
-        raise FileNotFoundError(f"Metadata file not found: {args.metadata_path}")
-    
-    # Assuming preprocessed_data_path is a NIfTI file for simplicity, 
-    # as mri_preprocessor.py processes and outputs a file.
-    # In a real pipeline, the preprocessor might save a numpy array.
-    # For now, let's assume it's a NIfTI from which we can extract data.
-    # It would be better if mri_preprocessor.py saved the processed array as a .npy file.
-    
-    try:
-        # Try loading as NIfTI, if it fails, assume it's a numpy array.
-        preprocessed_img = nib.load(args.preprocessed_data_path)
-        preprocessed_data = preprocessed_img.get_fdata()
-        # Normalize the preprocessed data to 0-1 range before inference if not already.
-        preprocessed_data = (preprocessed_data - np.min(preprocessed_data)) / (np.max(preprocessed_data) - np.min(preprocessed_data) + 1e-8)
-        print(f"Loaded preprocessed data from NIfTI: {args.preprocessed_data_path}, shape: {preprocessed_data.shape}")
-    except Exception:
-        # Fallback to loading as numpy array if it's not a NIfTI file
-        preprocessed_data = np.load(args.preprocessed_data_path)
-        print(f"Loaded preprocessed data from .npy: {args.preprocessed_data_path}, shape: {preprocessed_data.shape}")
-
-    with open(args.metadata_path, 'r') as f:
-        metadata = json.load(f)
-    print(f"Loaded metadata from {args.metadata_path}")
-    
-    # 2. Load Model and Perform Inference
-    model = load_model(args.model_path, device=device)
-    segmentation_mask = perform_inference(model, preprocessed_data, device)
-
-    # 3. Volume Calculation
-    segment_volumes = calculate_volume(segmentation_mask, metadata)
-
-    # 4. Dice Score Evaluation (if ground truth is provided)
-    dice_scores = {}
-    if args.ground_truth_path:
-        if not os.path.exists(args.ground_truth_path):
-            raise FileNotFoundError(f"Ground truth file not found: {args.ground_truth_path}")
-        
-        gt_img = nib.load(args.ground_truth_path)
-        ground_truth_mask = gt_img.get_fdata()
-        
-        # Resize ground truth to match segmentation mask if necessary
-        if ground_truth_mask.shape != segmentation_mask.shape:
-            print(f"Warning: Ground truth shape {ground_truth_mask.shape} differs from prediction shape {segmentation_mask.shape}. Resizing ground truth.")
-            ground_truth_mask = resize(ground_truth_mask, segmentation_mask.shape, order=0, anti_aliasing=False, preserve_range=True).astype(np.uint8)
-        
-        dice_scores = dice_coefficient(segmentation_mask, ground_truth_mask)
-    
-    # 5. Mask Export & Supabase Sync
-    mask_output_filename = f"segmentation_mask_{os.path.basename(args.preprocessed_data_path).split('.')[0]}.nii.gz"
-    mask_output_path = os.path.join(args.output_dir, mask_output_filename)
-
-    if not args.original_nifti_path:
-        print("Warning: Original NIfTI path not provided. Mask will be saved with identity affine.")
-        # Create a dummy NIfTI image for affine if no original_nifti_path is given
-        # This is a simplification; ideally, the affine should be derived from the preprocessed data.
-        dummy_img = nib.Nifti1Image(np.zeros(segmentation_mask.shape), np.eye(4))
-        nib.save(nib.Nifti1Image(segmentation_mask, dummy_img.affine, dummy_img.header), mask_output_path)
+    if not args.preprocessed_data_path and not args.jobs:
+        parser.error("preprocessed_data_path is required unless --jobs is given.")
+    if args.server_url and args.patch_size:
+        parser.error("--patch_size is not supported with --server_url; the server runs whole-volume batches.")
+
+    cache = None
+    if args.cache_dir:
+        from mri_preprocessor import open_preprocessing_cache
+        cache = open_preprocessing_cache(args.cache_dir, args.cache_max_gb)
+
+    from mri_preprocessor import preprocessing_options_from_args
+    scan_options = {
+        "output_dir": args.output_dir,
+        "metadata_path": args.metadata_path,
+        "original_nifti_path": args.original_nifti_path,
+        "ground_truth_path": args.ground_truth_path,
+        "preview_format": args.preview_format,
+        "cache": cache,
+        "target_shape": tuple(map(int, args.target_shape.split(','))),
+        "threshold_factor": args.threshold_factor,
+        "preprocess_options": preprocessing_options_from_args(args),
+        "inference_options": inference_options_from_args(args),
+        "server_url": args.server_url,
+        "lesion_stats": args.lesion_stats,
+        "boundary_metrics": not args.no_boundary_metrics,
+        "mask_format": args.mask_format,
+        "mask_codec": args.mask_codec,
+        "mask_compression_level": args.mask_compression_level,
+        "save_probabilities": args.save_probabilities,
+        "crop_to_brain": args.crop_to_brain,
+        "crop_margin": args.crop_margin,
+    }
+
+    if args.server_url:
+        # Thin client: the server owns torch and the model.
+        model, device = None, None
     else:
-        export_mask_as_nifti(segmentation_mask, args.original_nifti_path, mask_output_path)
+        # Determine device for PyTorch and load the model (quantized kernels only run on the CPU)
+        device = select_device() if not args.quantized else "cpu"
+        print(f"Using device: {device}")
+        model = load_model(args.model_path, device=device, backend=args.backend,
+                           threads=args.inference_threads, autocast=args.autocast, quantized=args.quantized)
+
+    if args.inference_cache_dir and args.server_url:
+        print("Warning: --inference_cache_dir is ignored with --server_url; the server owns the model.")
+    elif args.inference_cache_dir:
+        from inference_cache import open_inference_cache
+        inference_cache = open_inference_cache(args.inference_cache_dir, args.inference_cache_max_gb)
+        if inference_cache.bind_model(model, args.model_path, {"backend": args.backend, "autocast": args.autocast,
+                                                               "quantized": args.quantized}):
+            scan_options["inference_cache"] = inference_cache
+
+    uploader = upload_pipeline_from_args(args, args.supabase_bucket, prefix="public")
+    sink = result_sink_from_args(args, args.supabase_table, os.path.join(args.output_dir, "results_journal.jsonl"))
+
+    if args.jobs:
+        os.makedirs(args.output_dir, exist_ok=True)
+        jobs_output = args.jobs_output or os.path.join(args.output_dir, "worker_results.jsonl")
+        jobs_stream = sys.stdin if args.jobs == '-' else open(args.jobs, 'r')
+        try:
+            with open(jobs_output, 'a') as results_stream:
+                run_worker(model, device, jobs_stream, scan_options, results_stream, uploader=uploader, sink=sink)
+        finally:
+            if jobs_stream is not sys.stdin:
+                jobs_stream.close()
+            if uploader is not None:
+                report_uploads(uploader.close())
+            if sink is not None:
+                sink.close()
+        print(f"Worker results written to {jobs_output}")
+        return
+
+    results = segment_scan(model, device, args.preprocessed_data_path, **scan_options)
+    if uploader is not None:
+        results["segmentation_mask_key"], _ = uploader.submit(results['segmentation_mask_path'])
+        report_uploads(uploader.close())
+    if sink is not None:
+        sink.put(result_row(results, device))
+        sink.close()
 
     # Supabase Integration
     # try:
     #     if setup_supabase_client(args.supabase_url, args.supabase_key):
-    #         supabase_storage_path = f"public/{mask_output_filename}"
-    #         mask_url = upload_to_supabase_storage(args.supabase_bucket, mask_output_path, supabase_storage_path)
+    #         supabase_storage_path = f"public/{os.path.basename(results['segmentation_mask_path'])}"
+    #         mask_url = upload_to_supabase_storage(args.supabase_bucket, results['segmentation_mask_path'], supabase_storage_path)
     #
     #         results_to_db = {
-    #             "input_data_path": args.preprocessed_data_path,
+    #             **results,
     #             "segmentation_mask_url": mask_url,
-    #             **segment_volumes,
-    #             **dice_scores,
     #             "processed_at": datetime.utcnow().isoformat() + "Z",
     #             "device_used": str(device),
     #         }
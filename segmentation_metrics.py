@@ -0,0 +1,130 @@
+import numpy as np
+
+# Voxels per bincount call when building the confusion matrix, to bound the int64 index buffer.
+CONFUSION_CHUNK_VOXELS = 1 << 22
+
+
+def confusion_matrix(prediction, ground_truth, num_classes=None):
+    """
+    Joint-label confusion matrix in one pass: entry [g, p] counts voxels with ground-truth
+    label g and predicted label p. Labels must be non-negative integers; float masks are
+    accepted when every value is a whole number.
+    """
+    prediction = np.asarray(prediction)
+    ground_truth = np.asarray(ground_truth)
+    if prediction.shape != ground_truth.shape:
+        raise ValueError("Prediction and ground truth masks must have the same shape.")
+    for mask in (prediction, ground_truth):
+        if mask.dtype.kind == 'f' and not np.array_equal(mask, np.round(mask)):
+            raise ValueError("Label masks must hold whole-number labels.")
+    if min(prediction.min(initial=0), ground_truth.min(initial=0)) < 0:
+        raise ValueError("Labels must be non-negative integers.")
+    max_label = int(max(prediction.max(initial=0), ground_truth.max(initial=0)))
+    if num_classes is None:
+        num_classes = max_label + 1
+    elif max_label >= num_classes:
+        raise ValueError(f"Label {max_label} does not fit num_classes={num_classes}; labels must be below it.")
+
+    flat_prediction = prediction.ravel()
+    flat_ground_truth = ground_truth.ravel()
+    counts = np.zeros(num_classes * num_classes, dtype=np.int64)
+    for start in range(0, flat_prediction.size, CONFUSION_CHUNK_VOXELS):
+        stop = start + CONFUSION_CHUNK_VOXELS
+        joint = flat_ground_truth[start:stop].astype(np.int64) * num_classes
+        joint += flat_prediction[start:stop].astype(np.int64)
+        counts += np.bincount(joint, minlength=num_classes * num_classes)
+    return counts.reshape(num_classes, num_classes)
+
+
+def _ratio(numerator, denominator, empty):
+    """
+    numerator / denominator per class, with `empty` where the denominator is zero.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), empty)
+
+
+def overlap_metrics(matrix):
+    """
+    Dice, IoU, precision, recall and volume similarity for every class of a confusion matrix,
+    as arrays indexed by label. A class absent from both masks scores 1.0 everywhere;
+    precision (recall) is 0.0 when nothing was predicted (present) but the other mask is not empty.
+    """
+    tp = np.diag(matrix).astype(np.float64)
+    fp = matrix.sum(axis=0) - tp
+    fn = matrix.sum(axis=1) - tp
+    both_empty = (tp + fp + fn) == 0
+    return {
+        "dice_score": _ratio(2 * tp, 2 * tp + fp + fn, 1.0),
+        "iou": _ratio(tp, tp + fp + fn, 1.0),
+        "precision": _ratio(tp, tp + fp, np.where(both_empty, 1.0, 0.0)),
+        "recall": _ratio(tp, tp + fn, np.where(both_empty, 1.0, 0.0)),
+        "volume_similarity": 1.0 - _ratio(np.abs(fp - fn), 2 * tp + fp + fn, 0.0),
+    }
+
+
+def _bounding_box(mask, margin=1):
+    coords = np.nonzero(mask)
+    return tuple(slice(max(int(c.min()) - margin, 0), min(int(c.max()) + margin + 1, size))
+                 for c, size in zip(coords, mask.shape))
+
+
+def _surface(mask):
+    from scipy import ndimage
+
+    return mask & ~ndimage.binary_erosion(mask, border_value=0)
+
+
+def surface_distances(prediction, ground_truth, spacing=None):
+    """
+    Distances (mm) from every prediction surface voxel to the ground-truth surface and back.
+    Distance transforms only run inside the joint bounding box of both masks (plus one voxel),
+    which contains every surface voxel, so the result equals the full-volume computation.
+    Returns (prediction -> ground truth, ground truth -> prediction) distance arrays.
+    """
+    from scipy import ndimage
+
+    box = _bounding_box(prediction | ground_truth)
+    prediction_surface = _surface(prediction[box])
+    ground_truth_surface = _surface(ground_truth[box])
+    to_ground_truth = ndimage.distance_transform_edt(~ground_truth_surface, sampling=spacing)
+    to_prediction = ndimage.distance_transform_edt(~prediction_surface, sampling=spacing)
+    return to_ground_truth[prediction_surface], to_prediction[ground_truth_surface]
+
+
+def boundary_metrics(prediction, ground_truth, spacing=None, percentile=95):
+    """
+    Hausdorff distance at the given percentile (the larger of both directions) and average
+    symmetric surface distance, in mm, for two binary masks. Both are 0.0 when both masks are
+    empty and None (undefined) when only one of them is.
+    """
+    prediction = np.asarray(prediction, dtype=bool)
+    ground_truth = np.asarray(ground_truth, dtype=bool)
+    has_prediction, has_ground_truth = prediction.any(), ground_truth.any()
+    if not has_prediction and not has_ground_truth:
+        return 0.0, 0.0
+    if not has_prediction or not has_ground_truth:
+        return None, None
+    forward, backward = surface_distances(prediction, ground_truth, spacing)
+    hausdorff = max(np.percentile(forward, percentile), np.percentile(backward, percentile))
+    assd = (forward.sum() + backward.sum()) / (forward.size + backward.size)
+    return float(hausdorff), float(assd)
+
+
+def segmentation_metrics(prediction, ground_truth, spacing=None, num_classes=None, boundary=True):
+    """
+    All per-class metrics (excluding background label 0) as a flat dict keyed
+    '<metric>_class_<i>': dice_score, iou, precision, recall, volume_similarity and, with
+    boundary=True, hd95_mm and assd_mm. spacing is the (x, y, z) voxel size in mm.
+    """
+    matrix = confusion_matrix(prediction, ground_truth, num_classes)
+    overlap = overlap_metrics(matrix)
+    metrics = {}
+    for i in range(1, matrix.shape[0]):
+        for name, values in overlap.items():
+            metrics[f"{name}_class_{i}"] = float(values[i])
+        if boundary:
+            hd95, assd = boundary_metrics(prediction == i, ground_truth == i, spacing)
+            metrics[f"hd95_mm_class_{i}"] = hd95
+            metrics[f"assd_mm_class_{i}"] = assd
+    return metrics
@@ -0,0 +1,22 @@
+import torch.nn as nn
+
+# --- Dummy Model (Placeholder for a real segmentation model like U-Net or UNETR) ---
+# Kept in its own module so that importing segmentation_engine does not import torch.
+class DummySegmentationModel(nn.Module):
+    def __init__(self, in_channels=1, out_channels=1, num_classes=2):
+        super().__init__()
+        # In a real model, this would be a U-Net, UNETR, etc.
+        # For a dummy, we just simulate an output.
+        self.conv1 = nn.Conv3d(in_channels, 16, kernel_size=3, padding=1)
+        self.relu = nn.ReLU()
+        self.conv2 = nn.Conv3d(16, out_channels, kernel_size=3, padding=1)
+        # Using sigmoid for binary segmentation, or softmax for multi-class
+        self.final_activation = nn.Sigmoid() if num_classes == 2 else nn.Softmax(dim=1)
+        self.num_classes = num_classes
+
+    def forward(self, x):
+        # Simulate some processing
+        x = self.relu(self.conv1(x))
+        x = self.conv2(x)
+        return self.final_activation(x)
+
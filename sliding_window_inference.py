@@ -0,0 +1,89 @@
+import numpy as np
+
+# Blending modes for overlapping patch outputs.
+BLEND_MODES = ('gaussian', 'linear')
+
+
+def window_starts(size, patch, step):
+    """
+    Start offsets of windows of length `patch` covering [0, size) with the given step.
+    The last window is aligned with the end of the axis so no voxel is left out.
+    """
+    if size <= patch:
+        return [0]
+    starts = list(range(0, size - patch, step))
+    starts.append(size - patch)
+    return starts
+
+
+def blending_weights(patch_size, mode='gaussian', sigma_scale=0.125):
+    """
+    Per-voxel weight map for one patch. 'gaussian' weights fall off from the patch centre
+    with sigma = sigma_scale * patch size per axis; 'linear' is a separable tent that is
+    highest in the centre. Both stay strictly positive so every voxel receives weight.
+    """
+    if mode not in BLEND_MODES:
+        raise ValueError(f"Unknown blend mode '{mode}'. Choose from {BLEND_MODES}.")
+    weights = np.ones((), dtype=np.float32)
+    for n in patch_size:
+        position = np.arange(n, dtype=np.float32)
+        if mode == 'gaussian':
+            center, sigma = (n - 1) / 2, max(n * sigma_scale, 1e-3)
+            profile = np.exp(-0.5 * ((position - center) / sigma) ** 2)
+        else:
+            profile = np.minimum(position + 1, n - position) / np.ceil(n / 2)
+        weights = np.multiply.outer(weights, profile.astype(np.float32))
+    weights /= weights.max()
+    return np.maximum(weights, 1e-3).astype(np.float32)
+
+
+def sliding_window_inference(model, volume, patch_size, device='cpu', overlap=0.25, batch_size=4,
+                             blend='gaussian'):
+    """
+    Runs model over a (D, H, W) volume patch by patch and blends the overlapping outputs.
+
+    Windows of patch_size are placed with a step of patch_size * (1 - overlap); batch_size
+    patches are stacked into one (B, 1, *patch_size) tensor per forward pass. Volumes smaller
+    than the patch are zero-padded. Only the accumulated output and weight maps scale with
+    the volume; model activations are bounded by batch_size and patch_size.
+    Returns the blended model output as a float32 (C, D, H, W) array.
+    """
+    import torch
+
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap must be in [0, 1).")
+    patch_size = tuple(int(p) for p in patch_size)
+    if len(patch_size) != volume.ndim:
+        raise ValueError(f"Patch size {patch_size} does not match a volume with {volume.ndim} dimensions.")
+
+    original_shape = volume.shape
+    padding = [(0, max(p - s, 0)) for p, s in zip(patch_size, original_shape)]
+    if any(after for _, after in padding):
+        volume = np.pad(volume, padding)
+
+    steps = [max(1, int(round(p * (1 - overlap)))) for p in patch_size]
+    starts = [window_starts(s, p, step) for s, p, step in zip(volume.shape, patch_size, steps)]
+    windows = [tuple(slice(z, z + p) for z, p in zip(corner, patch_size))
+               for corner in np.stack(np.meshgrid(*starts, indexing='ij'), -1).reshape(-1, volume.ndim)]
+
+    weights = blending_weights(patch_size, blend)
+    weight_sum = np.zeros(volume.shape, dtype=np.float32)
+    output = None
+    batch = np.empty((batch_size, 1) + patch_size, dtype=np.float32)
+
+    with torch.inference_mode():
+        for first in range(0, len(windows), batch_size):
+            batch_windows = windows[first:first + batch_size]
+            for i, window in enumerate(batch_windows):
+                batch[i, 0] = volume[window]
+            input_tensor = torch.from_numpy(batch[:len(batch_windows)]).to(device)
+            patch_outputs = model(input_tensor).float().cpu().numpy()
+
+            if output is None:
+                output = np.zeros((patch_outputs.shape[1],) + volume.shape, dtype=np.float32)
+            for window, patch_output in zip(batch_windows, patch_outputs):
+                output[(slice(None),) + window] += patch_output * weights
+                weight_sum[window] += weights
+
+    output /= weight_sum
+    return output[(slice(None),) + tuple(slice(0, s) for s in original_shape)]
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+def forward_transform(input_shape, processed_shape, input_affine=None, crop_start=None, crop_stop=None):
+    """
+    Describes how a processed volume was derived from its native scan: an optional crop
+    [crop_start, crop_stop) of the native grid, resized to processed_shape with the
+    half-voxel (pixel-centre) convention used by resampling.resample_volume.
+    Stored as JSON-serializable metadata['transform'] by mri_preprocessor.
+    """
+    input_shape = [int(s) for s in input_shape]
+    return {
+        "input_shape": input_shape,
+        "crop_start": [int(s) for s in crop_start] if crop_start is not None else [0] * len(input_shape),
+        "crop_stop": [int(s) for s in crop_stop] if crop_stop is not None else input_shape,
+        "processed_shape": [int(s) for s in processed_shape],
+        "input_affine": np.asarray(input_affine, dtype=np.float64).tolist() if input_affine is not None else None,
+    }
+
+
+def bounding_box(mask):
+    """
+    (start, stop) index lists of the smallest box holding every nonzero voxel, or None if empty.
+    """
+    nonzero = [np.flatnonzero(np.any(mask, axis=tuple(a for a in range(mask.ndim) if a != axis)))
+               for axis in range(mask.ndim)]
+    if not nonzero[0].size:
+        return None
+    return [int(n[0]) for n in nonzero], [int(n[-1]) + 1 for n in nonzero]
+
+
+def _scales(transform):
+    crop_size = np.subtract(transform["crop_stop"], transform["crop_start"])
+    return crop_size / np.asarray(transform["processed_shape"], dtype=np.float64)
+
+
+def processed_spacing(transform, native_spacing):
+    """
+    Voxel size of the processed grid: the native voxel size times the crop extent over the
+    processed shape, per axis.
+    """
+    return tuple(float(s) for s in np.asarray(native_spacing, dtype=np.float64) * _scales(transform))
+
+
+def processed_affine(transform):
+    """
+    Voxel-to-world affine of the processed grid: native voxel coordinate of processed voxel j
+    is crop_start + (j + 0.5) * scale - 0.5, composed with the native affine.
+    Returns None when the native affine is unknown.
+    """
+    if transform.get("input_affine") is None:
+        return None
+    scales = _scales(transform)
+    to_native = np.eye(4)
+    to_native[:3, :3] = np.diag(scales)
+    to_native[:3, 3] = np.asarray(transform["crop_start"]) + (scales - 1) / 2
+    return np.asarray(transform["input_affine"]) @ to_native
+
+
+def processed_box(transform, start, stop, margin=0):
+    """
+    Maps a native-grid box [start, stop) onto the processed grid: every processed voxel whose
+    footprint overlaps the box, widened by margin processed voxels and clipped to the grid.
+    Returns (start, stop) lists.
+    """
+    scales = _scales(transform)
+    offset = np.subtract(start, transform["crop_start"])
+    end = np.subtract(stop, transform["crop_start"])
+    processed_start = np.maximum(np.floor(offset / scales).astype(int) - margin, 0)
+    processed_stop = np.minimum(np.ceil(end / scales).astype(int) + margin, transform["processed_shape"])
+    return [int(s) for s in processed_start], [int(s) for s in processed_stop]
+
+
+def paste_box(cropped, box, shape):
+    """
+    Places an array computed on box (a tuple of slices) back into a zero array of the full
+    spatial shape. Leading axes (e.g. classes) in front of the spatial ones are kept.
+    """
+    leading = cropped.shape[:cropped.ndim - len(box)]
+    full = np.zeros(tuple(leading) + tuple(shape), dtype=cropped.dtype)
+    full[(Ellipsis,) + tuple(box)] = cropped
+    return full
+
+
+def inverse_resample_mask(mask, transform):
+    """
+    Resamples a label mask from the processed grid back onto the native grid with
+    nearest-neighbour lookup: native voxel i samples processed voxel
+    floor((i - crop_start + 0.5) / scale). Only the native region covering the mask's
+    bounding box is computed; everything else (including voxels cropped away) is background.
+    """
+    mask = np.asarray(mask)
+    if list(mask.shape) != transform["processed_shape"]:
+        raise ValueError(f"Mask shape {mask.shape} does not match the processed shape {transform['processed_shape']}.")
+
+    native = np.zeros(transform["input_shape"], dtype=mask.dtype)
+    nonzero = np.nonzero(mask)
+    if not nonzero[0].size:
+        return native
+
+    scales = _scales(transform)
+    index_arrays = []
+    for axis, coords in enumerate(nonzero):
+        start, stop = transform["crop_start"][axis], transform["crop_stop"][axis]
+        low, high = int(coords.min()), int(coords.max()) + 1
+        # Native voxels whose centres fall inside processed voxels [low, high).
+        native_low = max(start + int(np.floor(low * scales[axis])), start)
+        native_high = min(start + int(np.ceil(high * scales[axis])), stop)
+        native_indices = np.arange(native_low, native_high)
+        processed_indices = np.floor((native_indices - start + 0.5) / scales[axis]).astype(np.intp)
+        processed_indices = np.clip(processed_indices, 0, mask.shape[axis] - 1)
+        index_arrays.append((native_indices, processed_indices))
+
+    native_region = tuple(slice(n[0], n[-1] + 1) for n, _ in index_arrays)
+    native[native_region] = mask[np.ix_(*[p for _, p in index_arrays])]
+    return native
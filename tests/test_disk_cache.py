@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from disk_cache import DiskCache
+
+
+def test_eviction_keeps_recently_used_entries_within_the_cap(tmp_path):
+    volume = np.zeros(1024, dtype=np.float32)
+    cache = DiskCache(str(tmp_path), max_bytes=10 ** 9)
+    cache.put("aa01", {"processed": volume}, {"scan": 1})
+    entry_bytes = cache.size_bytes()
+    cache.put("aa02", {"processed": volume}, {"scan": 2})
+    # Make the insertion order explicit; mtimes of back-to-back writes can tie.
+    now = time.time()
+    os.utime(cache._entry_dir("aa01"), (now - 20, now - 20))
+    os.utime(cache._entry_dir("aa02"), (now - 10, now - 10))
+
+    # A hit makes the oldest entry the most recently used one.
+    assert cache.get("aa01") is not None
+    # Room for two entries but not three (meta.json sizes can differ by a few bytes).
+    cache.max_bytes = 2 * entry_bytes + 64
+    cache.put("aa03", {"processed": volume}, {"scan": 3})
+
+    assert cache.get("aa02") is None
+    assert cache.get("aa01")[1] == {"scan": 1}
+    assert cache.get("aa03")[1] == {"scan": 3}
+    assert cache.size_bytes() <= cache.max_bytes
+    assert cache.evictions == 1
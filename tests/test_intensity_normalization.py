@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intensity_normalization import compute_intensity_stats
+
+PERCENTILES = (0.5, 2, 50, 98, 99.5)
+
+
+def test_streaming_percentiles_match_numpy_on_float_volumes():
+    rng = np.random.default_rng(0)
+    volume = rng.gamma(2.0, 300.0, size=(64, 64, 48)).astype(np.float32)
+    stats = compute_intensity_stats(volume, slab_size=8)
+    # Coarsened bins bound the error by the bin width, far below the intensity range.
+    tolerance = 2 * stats.bin_width
+    assert tolerance < 1e-3 * (volume.max() - volume.min())
+    for q in PERCENTILES:
+        assert stats.percentile(q) == pytest.approx(np.percentile(volume, q), abs=tolerance)
+    assert (stats.min, stats.max) == (volume.min(), volume.max())
+    assert stats.mean == pytest.approx(volume.mean(dtype=np.float64))
+
+
+def test_integer_percentiles_stay_within_one_level():
+    volume = np.random.default_rng(1).integers(0, 4000, size=(48, 48, 32), dtype=np.int16)
+    stats = compute_intensity_stats(volume, slab_size=8)
+    assert stats.integer and stats.bin_width == 1.0
+    for q in PERCENTILES:
+        assert abs(stats.percentile(q) - np.percentile(volume, q)) <= 1
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mask_codec import MASK_CODECS, decode_mask, encode_mask
+
+
+def lesion_mask(dtype):
+    mask = np.zeros((12, 10, 8), dtype=dtype)
+    mask[2:6, 3:7, 1:4] = 1
+    if dtype != bool:
+        mask[7:9, 1:3, 5:8] = 3
+    return mask
+
+
+@pytest.mark.parametrize("codec", MASK_CODECS)
+@pytest.mark.parametrize("dtype", [bool, np.uint8, np.int16])
+@pytest.mark.parametrize("with_affine", [False, True])
+def test_round_trip(codec, dtype, with_affine):
+    mask = lesion_mask(dtype)
+    affine = np.diag([1.5, 1.5, 2.0, 1.0]) if with_affine else None
+    decoded, decoded_affine = decode_mask(encode_mask(mask, codec, affine=affine))
+    assert decoded.shape == mask.shape
+    assert np.array_equal(decoded, mask)
+    # Booleans are stored as uint8 labels; other dtypes keep their width.
+    assert decoded.dtype == (np.uint8 if dtype == bool else dtype)
+    if with_affine:
+        assert np.array_equal(decoded_affine, affine)
+    else:
+        assert decoded_affine is None
+
+
+@pytest.mark.parametrize("codec", MASK_CODECS)
+def test_empty_mask_round_trip(codec):
+    mask = np.zeros((5, 4, 3), dtype=np.uint8)
+    decoded, affine = decode_mask(encode_mask(mask, codec))
+    assert decoded.shape == mask.shape and not decoded.any()
+    assert affine is None
+
+
+def test_rejects_negative_labels():
+    with pytest.raises(ValueError):
+        encode_mask(np.array([[0, -1]], dtype=np.int16))
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_sink import ResultSink, SQLiteTable
+
+
+class FailingTable:
+    """
+    A table that is down: every insert raises.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def insert(self, rows):
+        self.calls += 1
+        raise ConnectionError("table unavailable")
+
+
+def test_failed_inserts_back_off_and_rows_survive(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    table = FailingTable()
+    sink = ResultSink(table, journal_path, max_rows=2, max_interval_s=0.05, fsync=False)
+    for i in range(5):
+        sink.put({"scan": i})
+    time.sleep(0.5)
+    # Buffer is over max_rows, so without backoff this would retry thousands of times.
+    # Waits of 0.05, 0.1, 0.2 s allow at most a handful of attempts in 0.5 s.
+    assert 1 <= table.calls <= 5
+    # The final insert fails too; close() reports the journaled rows instead of raising.
+    assert sink.close() == 5
+    assert os.path.getsize(journal_path) > 0
+
+    db_path = str(tmp_path / "results.sqlite")
+    with ResultSink(SQLiteTable(db_path, "results"), journal_path, fsync=False):
+        pass
+    with sqlite3.connect(db_path) as connection:
+        scans = [row[0] for row in connection.execute("SELECT scan FROM results ORDER BY scan")]
+    assert scans == [0, 1, 2, 3, 4]
+    assert os.path.getsize(journal_path) == 0
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+torch = pytest.importorskip("torch")
+
+from segmentation_engine import perform_inference
+from segmentation_model import DummySegmentationModel
+
+
+@pytest.mark.parametrize("out_channels", [1, 2])
+def test_patch_path_matches_whole_volume_shapes(out_channels):
+    torch.manual_seed(0)
+    model = DummySegmentationModel(out_channels=out_channels, num_classes=2).eval()
+    volume = np.random.default_rng(0).random((12, 10, 8), dtype=np.float32)
+
+    whole_mask, whole_probabilities = perform_inference(model, volume, 'cpu', return_probabilities=True)
+    patch_mask, patch_probabilities = perform_inference(model, volume, 'cpu', patch_size=(8, 8, 8),
+                                                        return_probabilities=True)
+    expected_shape = volume.shape if out_channels == 1 else (out_channels,) + volume.shape
+    assert whole_mask.shape == patch_mask.shape == expected_shape
+    assert whole_probabilities.shape == patch_probabilities.shape == expected_shape
+    assert np.array_equal(patch_mask, patch_probabilities > 0.5)
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segmentation_engine import dice_coefficient, evaluate_segmentation
+from segmentation_metrics import confusion_matrix
+from spatial_transforms import forward_transform
+from volume_statistics import voxel_spacing_mm
+
+METADATA = {"pixel_spacing": [1.0, 1.0], "slice_thickness": 1.0,
+            "transform": forward_transform((90, 100, 80), (64, 64, 64))}
+
+
+def test_processed_grid_spacing():
+    assert voxel_spacing_mm(METADATA, (64, 64, 64)) == pytest.approx((90 / 64, 100 / 64, 80 / 64))
+    assert voxel_spacing_mm(METADATA) == (1.0, 1.0, 1.0)
+
+
+def test_boundary_distances_use_processed_spacing():
+    # Two one-voxel-thick planes two processed voxels apart along x: every surface
+    # distance is 2 * 90 / 64 mm.
+    prediction = np.zeros((64, 64, 64), dtype=np.uint8)
+    ground_truth = np.zeros_like(prediction)
+    prediction[10] = 1
+    ground_truth[12] = 1
+    metrics = evaluate_segmentation(prediction, ground_truth, spacing=voxel_spacing_mm(METADATA, prediction.shape))
+    assert metrics["hd95_mm_class_1"] == pytest.approx(2 * 90 / 64)
+    assert metrics["assd_mm_class_1"] == pytest.approx(2 * 90 / 64)
+
+
+def test_confusion_matrix_rejects_fractional_labels():
+    prediction = np.array([0.0, 1.0, 0.7])
+    with pytest.raises(ValueError):
+        confusion_matrix(prediction, np.array([0, 1, 1]))
+    assert confusion_matrix(np.array([0.0, 1.0, 1.0]), np.array([0, 1, 1])).tolist() == [[1, 0], [0, 2]]
+
+
+def test_dice_scores_only_requested_classes():
+    prediction = np.array([0, 1, 1, 2, 2])
+    ground_truth = np.array([0, 1, 2, 2, 0])
+    # Label 2 lies beyond num_classes=2: it is not scored, and counts against class 1 like any other label.
+    assert dice_coefficient(prediction, ground_truth, num_classes=2) == {"dice_score_class_1": pytest.approx(2 / 3)}
+    assert dice_coefficient(prediction, ground_truth, num_classes=4)["dice_score_class_3"] == 1.0
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resampling import resample_volume
+from spatial_transforms import forward_transform, inverse_resample_mask
+
+
+@pytest.mark.parametrize("processed_shape", [(8, 4, 10), (32, 24, 20)])
+def test_inverse_resample_matches_nearest_zoom(processed_shape):
+    # A label volume cropped to [crop_start, crop_stop) and resized to processed_shape by
+    # whole-number factors (down- or upsampling), so nearest-neighbour lookups have no ties.
+    native_shape, crop_start, crop_stop = (24, 18, 12), (3, 2, 1), (19, 14, 11)
+    native = np.zeros(native_shape, dtype=np.uint8)
+    native[6:12, 5:11, 3:7] = 1
+    native[13:17, 4:8, 6:10] = 2
+    crop = tuple(slice(a, b) for a, b in zip(crop_start, crop_stop))
+    transform = forward_transform(native_shape, processed_shape, np.eye(4), crop_start, crop_stop)
+    processed = resample_volume(native[crop], processed_shape, order=0)
+
+    restored = inverse_resample_mask(processed, transform)
+
+    zoom = np.divide(np.subtract(crop_stop, crop_start), processed_shape)
+    expected = np.zeros(native_shape, dtype=np.uint8)
+    expected[crop] = ndimage.zoom(processed, zoom, order=0, grid_mode=True, mode='grid-constant')
+    assert restored.shape == native_shape
+    assert np.array_equal(restored, expected)
+
+
+def test_inverse_resample_of_an_empty_mask():
+    transform = forward_transform((10, 10, 10), (5, 5, 5))
+    restored = inverse_resample_mask(np.zeros((5, 5, 5), dtype=np.uint8), transform)
+    assert restored.shape == (10, 10, 10) and not restored.any()
+
+
+def test_inverse_resample_rejects_other_grids():
+    transform = forward_transform((10, 10, 10), (5, 5, 5))
+    with pytest.raises(ValueError):
+        inverse_resample_mask(np.zeros((2, 5, 5, 5), dtype=np.uint8), transform)
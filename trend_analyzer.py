@@ -1,12 +1,13 @@
 import os
 import json
 import argparse
-import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from sklearn.linear_model import LinearRegression
+from datetime import datetime
+from typing import TYPE_CHECKING
 
-import supabase # Supabase 설치 후 주석 해제
+# pandas와 supabase는 실제로 사용하는 함수 안에서 import하여 CLI 시작 시간을 줄입니다.
+if TYPE_CHECKING:
+    import pandas as pd
 
 # --- Supabase Configuration (Placeholder) ---
 # SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -22,7 +23,7 @@ def get_supabase_client(url, key):
         print("경고: Supabase 자격 증명이 설정되지 않았습니다. 더미 클라이언트를 사용합니다.")
         return DummySupabaseClient()
     
-    from supabase import create_client, Client # supabase 설치 후 주석 해제
+    from supabase import create_client # supabase 설치 후 주석 해제
     return create_client(url, key)
     # print("Supabase 클라이언트 (더미) 초기화.")
     # return DummySupabaseClient() # 실제 클라이언트 대신 더미 클라이언트 반환
@@ -95,6 +96,8 @@ def fetch_patient_segmentation_data(supabase_client, patient_id):
     """
     Supabase에서 특정 환자의 세분화 결과를 가져옵니다.
     """
+    import pandas as pd
+
     try:
         response = supabase_client.table("segmentation_results").select("*").eq("patient_id", patient_id).order("study_date", desc=False).execute()
         
@@ -119,7 +122,7 @@ def fetch_patient_segmentation_data(supabase_client, patient_id):
         print(f"데이터 로드 중 오류 발생: {e}")
         return pd.DataFrame()
 
-def calculate_volume_trend(df: pd.DataFrame):
+def calculate_volume_trend(df: "pd.DataFrame"):
     """
     환자의 시간에 따른 종양 부피 변화율을 계산하고 미래 크기를 예측합니다.
     """
@@ -135,14 +138,18 @@ def calculate_volume_trend(df: pd.DataFrame):
     df = df.sort_values(by="study_date")
     df["days_since_first_scan"] = (df["study_date"] - df["study_date"].min()).dt.days
 
-    X = df[["days_since_first_scan"]].values
+    X = df["days_since_first_scan"].values.astype(np.float64)
     y = df["tumor_volume_mm3"].values
 
-    model = LinearRegression()
-    model.fit(X, y)
+    # 단일 변수 최소제곱 직선 적합 (sklearn LinearRegression과 같은 결과이며, sklearn import 비용이 없습니다)
+    if np.ptp(X) == 0:
+        # 모든 스캔이 같은 날짜이면 기울기를 정할 수 없으므로 (LinearRegression과 같이) 0과 평균값을 사용합니다.
+        slope, intercept = 0.0, float(np.mean(y))
+    else:
+        slope, intercept = np.polyfit(X, y, 1)
 
     # 변화율 (일당 부피 변화)
-    volume_change_rate_per_day = model.coef_[0]
+    volume_change_rate_per_day = slope
 
     # 미래 예측
     last_scan_date = df["study_date"].max()
@@ -150,11 +157,11 @@ def calculate_volume_trend(df: pd.DataFrame):
 
     # 3개월 (약 90일) 후 예측
     days_3_months_later = last_days_since_first_scan + 90
-    prediction_3_months = model.predict(np.array([[days_3_months_later]]))[0]
+    prediction_3_months = slope * days_3_months_later + intercept
 
     # 6개월 (약 180일) 후 예측
     days_6_months_later = last_days_since_first_scan + 180
-    prediction_6_months = model.predict(np.array([[days_6_months_later]]))[0]
+    prediction_6_months = slope * days_6_months_later + intercept
 
     return {
         "trend_analysis_status": "Success",
@@ -178,20 +185,15 @@ def generate_clinical_text(trend_data: dict) -> str:
     volume_change_rate = trend_data["volume_change_rate_mm3_per_day"]
     last_volume = trend_data["last_measured_volume_mm3"]
 
-    text = "종양 부피 추세 분석 결과:
-"
-    text += f"최종 측정 부피: {last_volume:.2f} mm³ ({datetime.fromisoformat(trend_data['last_measured_date']).strftime('%Y-%m-%d')})
-"
+    text = "종양 부피 추세 분석 결과:\n"
+    text += f"최종 측정 부피: {last_volume:.2f} mm³ ({datetime.fromisoformat(trend_data['last_measured_date']).strftime('%Y-%m-%d')})\n"
     
     if volume_change_rate > 0:
-        text += f"일당 평균 부피 증가율은 {volume_change_rate:.2f} mm³/일입니다.
-"
+        text += f"일당 평균 부피 증가율은 {volume_change_rate:.2f} mm³/일입니다.\n"
         if trend_data["prediction_next_3_months_mm3"] is not None:
-            text += f"현재 추세대로라면, 향후 3개월 내 약 {trend_data['prediction_next_3_months_mm3']:.2f} mm³로 증가할 것으로 예측됩니다.
-"
+            text += f"현재 추세대로라면, 향후 3개월 내 약 {trend_data['prediction_next_3_months_mm3']:.2f} mm³로 증가할 것으로 예측됩니다.\n"
         if trend_data["prediction_next_6_months_mm3"] is not None:
-            text += f"향후 6개월 내에는 약 {trend_data['prediction_next_6_months_mm3']:.2f} mm³로 증가할 것으로 예측됩니다.
-"
+            text += f"향후 6개월 내에는 약 {trend_data['prediction_next_6_months_mm3']:.2f} mm³로 증가할 것으로 예측됩니다.\n"
         
         # 전회 대비 변화율 (가장 최근 두 측정값을 기준으로 계산)
         if trend_data["number_of_measurements"] >= 2:
@@ -212,14 +214,11 @@ def generate_clinical_text(trend_data: dict) -> str:
                 text += f"전회 대비 종양 부피가 약 {abs(percent_change):.2f}% 감소하였습니다."
 
     elif volume_change_rate < 0:
-        text += f"일당 평균 부피 감소율은 {abs(volume_change_rate):.2f} mm³/일입니다.
-"
+        text += f"일당 평균 부피 감소율은 {abs(volume_change_rate):.2f} mm³/일입니다.\n"
         if trend_data["prediction_next_3_months_mm3"] is not None:
-            text += f"현재 추세대로라면, 향후 3개월 내 약 {max(0, trend_data['prediction_next_3_months_mm3']):.2f} mm³로 감소할 것으로 예측됩니다.
-"
+            text += f"현재 추세대로라면, 향후 3개월 내 약 {max(0, trend_data['prediction_next_3_months_mm3']):.2f} mm³로 감소할 것으로 예측됩니다.\n"
         if trend_data["prediction_next_6_months_mm3"] is not None:
-            text += f"향후 6개월 내에는 약 {max(0, trend_data['prediction_next_6_months_mm3']):.2f} mm³로 감소할 것으로 예측됩니다.
-"
+            text += f"향후 6개월 내에는 약 {max(0, trend_data['prediction_next_6_months_mm3']):.2f} mm³로 감소할 것으로 예측됩니다.\n"
         
         # 전회 대비 변화율 (더미 데이터 기반 예시)
         if trend_data["number_of_measurements"] >= 2:
@@ -0,0 +1,241 @@
+import os
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from disk_cache import hash_file
+
+UPLOAD_BACKENDS = ('local', 'supabase')
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def object_key(file_path, prefix="", digest=None):
+    """
+    Idempotent storage key '<prefix>/<content hash>/<file name>': uploading the same bytes
+    again (a retry, a re-run) targets the same object. Without a sha256 hex digest of the
+    content, the file is hashed in chunks.
+    """
+    digest = (digest or hash_file(file_path).hexdigest())[:32]
+    return "/".join(part for part in (prefix.strip("/"), digest, os.path.basename(file_path)) if part)
+
+
+def stage_file(file_path, staging_dir):
+    """
+    Copies file_path in UPLOAD_CHUNK_SIZE chunks to a uniquely named file in staging_dir,
+    hashing the bytes as they are copied. Returns (staged path, sha256 hex digest), so the
+    digest always matches the bytes that are uploaded from the staged copy.
+    """
+    hasher = hashlib.sha256()
+    fd, staged_path = tempfile.mkstemp(dir=staging_dir, suffix="_" + os.path.basename(file_path))
+    try:
+        with open(file_path, 'rb') as source, os.fdopen(fd, 'wb') as staged:
+            for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+                staged.write(chunk)
+    except BaseException:
+        os.remove(staged_path)
+        raise
+    return staged_path, hasher.hexdigest()
+
+
+class LocalStorageBackend:
+    """
+    Filesystem stand-in for object storage: objects are files under root, named by their key.
+    Uploads stream in UPLOAD_CHUNK_SIZE chunks into a temporary file that is renamed into place,
+    so a failed upload never leaves a partial object behind.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Object key escapes the storage root: {key}")
+        return path
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def upload(self, key, stream):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.part"
+        try:
+            with open(temp_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, UPLOAD_CHUNK_SIZE)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def url(self, key):
+        return "file://" + self._path(key)
+
+
+class SupabaseStorageBackend:
+    """
+    Supabase Storage bucket. The open file object is handed to the client, which streams it
+    instead of holding the whole file in memory; upsert makes repeated uploads of a key harmless.
+    """
+
+    def __init__(self, supabase_client, bucket_name):
+        self.bucket = supabase_client.storage.from_(bucket_name)
+
+    def exists(self, key):
+        folder, _, name = key.rpartition("/")
+        return any(entry.get("name") == name for entry in self.bucket.list(folder, {"search": name}))
+
+    def upload(self, key, stream):
+        response = self.bucket.upload(key, stream, {"upsert": "true"})
+        if isinstance(response, dict) and response.get("error"):
+            raise Exception(f"Supabase Storage upload failed: {response['error']}")
+
+    def url(self, key):
+        return self.bucket.get_public_url(key)
+
+
+def upload_with_retry(backend, file_path, key, retries=3, backoff_s=0.5, skip_existing=True):
+    """
+    Streams file_path to backend under key, retrying failed attempts with exponential backoff
+    (backoff_s, 2 * backoff_s, ... plus up to 50% jitter). With skip_existing, an object that is
+    already stored under its content-addressed key is not uploaded again.
+    Returns {"path", "key", "url", "bytes", "attempts", "skipped"}.
+    """
+    result = {"path": file_path, "key": key, "bytes": os.path.getsize(file_path), "attempts": 0, "skipped": False}
+    if skip_existing and backend.exists(key):
+        result.update(skipped=True, url=backend.url(key))
+        return result
+
+    for attempt in range(retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            with open(file_path, 'rb') as stream:
+                backend.upload(key, stream)
+            break
+        except (FileNotFoundError, PermissionError, ValueError):
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff_s * 2 ** attempt * (1 + 0.5 * random.random())
+            print(f"Upload of {key} failed ({e}); retrying in {delay:.2f}s.")
+            time.sleep(delay)
+    result["url"] = backend.url(key)
+    return result
+
+
+class UploadPipeline:
+    """
+    Background uploads: submit() returns immediately with the object key and a Future while up
+    to max_workers uploads stream in parallel, so the caller can go on with the next scan.
+    At most max_pending uploads are queued or running; submit() blocks beyond that, which keeps
+    a fast producer from running arbitrarily far ahead of the network.
+    submit() snapshots the file into a staging directory and derives the key from the copied
+    bytes, so the caller may overwrite or delete the file as soon as submit() returns.
+    Finished uploads are only counted; failures are kept until close() reports them.
+    """
+
+    def __init__(self, backend, max_workers=4, max_pending=16, retries=3, backoff_s=0.5, prefix="",
+                 staging_dir=None):
+        self.backend = backend
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.prefix = prefix
+        self._staging = tempfile.TemporaryDirectory(prefix="upload_staging_", dir=staging_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._slots = threading.Semaphore(max(max_pending, max_workers))
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._stored = 0
+        self._skipped = 0
+        self._failed = []
+
+    def _upload(self, file_path, staged_path, key):
+        try:
+            result = upload_with_retry(self.backend, staged_path, key, self.retries, self.backoff_s)
+        finally:
+            os.remove(staged_path)
+        result["path"] = file_path
+        return result
+
+    def _done(self, file_path, future):
+        with self._lock:
+            self._pending.discard(future)
+            error = future.exception()
+            if error is not None:
+                self._failed.append({"path": file_path, "error": str(error)})
+            elif future.result()["skipped"]:
+                self._skipped += 1
+            else:
+                self._stored += 1
+        self._slots.release()
+
+    def submit(self, file_path, key=None):
+        self._slots.acquire()
+        try:
+            staged_path, digest = stage_file(file_path, self._staging.name)
+        except BaseException:
+            self._slots.release()
+            raise
+        key = key or object_key(file_path, self.prefix, digest)
+        try:
+            future = self._executor.submit(self._upload, file_path, staged_path, key)
+        except BaseException:
+            os.remove(staged_path)
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(lambda done: self._done(file_path, done))
+        return key, future
+
+    def close(self):
+        """
+        Waits for every submitted upload and returns {"stored", "skipped", "failed"}: the counts
+        of uploaded and already present objects, and a {"path", "error"} dict per failed upload
+        in completion order. Failed uploads are reported instead of raising.
+        """
+        self._executor.shutdown(wait=True)
+        self._staging.cleanup()
+        with self._lock:
+            summary = {"stored": self._stored, "skipped": self._skipped, "failed": self._failed}
+            self._stored, self._skipped, self._failed = 0, 0, []
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def add_upload_arguments(parser):
+    parser.add_argument("--upload_backend", type=str, default=None, choices=UPLOAD_BACKENDS,
+                        help="Upload outputs in the background: to a local storage directory (--upload_dir) or to Supabase Storage.")
+    parser.add_argument("--upload_dir", type=str, default="./storage",
+                        help="Root directory of the local storage backend.")
+    parser.add_argument("--upload_workers", type=int, default=4,
+                        help="Concurrent uploads.")
+    parser.add_argument("--upload_retries", type=int, default=3,
+                        help="Retries per failed upload, with exponential backoff.")
+
+
+def upload_pipeline_from_args(args, bucket_name, prefix=""):
+    """
+    UploadPipeline for the CLI arguments, or None when --upload_backend is not set.
+    The Supabase backend reads args.supabase_url and args.supabase_key.
+    """
+    if not args.upload_backend:
+        return None
+    if args.upload_backend == 'supabase':
+        from supabase import create_client
+        backend = SupabaseStorageBackend(create_client(args.supabase_url, args.supabase_key), bucket_name)
+    else:
+        backend = LocalStorageBackend(os.path.join(args.upload_dir, bucket_name))
+    return UploadPipeline(backend, max_workers=args.upload_workers, retries=args.upload_retries, prefix=prefix)
@@ -0,0 +1,250 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Output file names written by mri_preprocessor and read by segmentation_engine.
+PROCESSED_FILENAME = "processed.npy"
+METADATA_FILENAME = "metadata.json"
+
+
+def _pixel_dtype(ds):
+    """
+    Returns the numpy dtype pydicom will decode the pixel data into,
+    based on BitsAllocated and PixelRepresentation.
+    """
+    bits = int(ds.BitsAllocated)
+    signed = int(getattr(ds, 'PixelRepresentation', 0)) == 1
+    if bits not in (8, 16, 32):
+        raise ValueError(f"Unsupported BitsAllocated value: {bits}")
+    return np.dtype(f"{'int' if signed else 'uint'}{bits}")
+
+
+def _series_affine(first, last, num_slices):
+    """
+    Voxel-to-world affine (RAS, as in NIfTI) of a series stored as (rows, columns, slices),
+    from the first and last slice's ImagePositionPatient and the ImageOrientationPatient.
+    Returns None when the geometry tags are missing.
+    """
+    try:
+        orientation = np.array(first.ImageOrientationPatient, dtype=np.float64)
+        spacing = [float(x) for x in first.PixelSpacing]
+        origin = np.array(first.ImagePositionPatient, dtype=np.float64)
+        end = np.array(last.ImagePositionPatient, dtype=np.float64)
+    except AttributeError:
+        return None
+    if num_slices > 1:
+        slice_step = (end - origin) / (num_slices - 1)
+    else:
+        slice_step = np.cross(orientation[:3], orientation[3:]) * float(getattr(first, 'SliceThickness', 1.0))
+
+    affine = np.eye(4)
+    affine[:3, 0] = orientation[3:] * spacing[0]  # row index moves along the column direction
+    affine[:3, 1] = orientation[:3] * spacing[1]  # column index moves along the row direction
+    affine[:3, 2] = slice_step
+    affine[:3, 3] = origin
+    # DICOM patient coordinates are LPS; NIfTI affines are RAS.
+    affine[:2] *= -1
+    return affine.tolist()
+
+
+def read_dicom_series(directory, max_workers=None):
+    """
+    Reads a DICOM series directory into a single 3D volume (rows, columns, slices).
+
+    Headers are read first without pixel data and sorted by InstanceNumber, the output
+    volume is allocated once, and the slices are decoded in parallel straight into it.
+    Returns the volume and a header dict in the format used by read_mri_file.
+    """
+    import pydicom
+
+    start_time = time.perf_counter()
+    paths = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.dcm')]
+    if not paths:
+        raise ValueError("No DICOM files found in the directory.")
+
+    headers = [(pydicom.dcmread(p, stop_before_pixels=True), p) for p in paths]
+    headers.sort(key=lambda item: int(item[0].InstanceNumber))
+    first = headers[0][0]
+
+    rows, columns = int(first.Rows), int(first.Columns)
+    if int(getattr(first, 'SamplesPerPixel', 1)) != 1:
+        raise ValueError("Only single-channel (grayscale) DICOM series are supported.")
+
+    # Slices are written along the first axis so each decode fills one contiguous block;
+    # the returned view puts them on the last axis, matching np.stack(..., axis=-1).
+    volume = np.empty((len(headers), rows, columns), dtype=_pixel_dtype(first))
+
+    def decode_slice(index):
+        ds = pydicom.dcmread(headers[index][1])
+        pixels = ds.pixel_array
+        if pixels.shape != (rows, columns):
+            raise ValueError(f"Slice {headers[index][1]} has shape {pixels.shape}, expected {(rows, columns)}.")
+        volume[index] = pixels
+
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises the first decoding error, if any.
+        list(executor.map(decode_slice, range(len(headers))))
+
+    data = np.moveaxis(volume, 0, -1)
+
+    header = {
+        "SliceThickness": float(first.SliceThickness) if 'SliceThickness' in first else None,
+        "PixelSpacing": [float(x) for x in first.PixelSpacing] if 'PixelSpacing' in first else None,
+        "SOPInstanceUID": [ds.SOPInstanceUID for ds, _ in headers],
+        "StudyInstanceUID": first.StudyInstanceUID,
+        "SeriesInstanceUID": first.SeriesInstanceUID,
+        "Modality": first.Modality,
+        "PatientName": str(first.PatientName),
+        "PatientID": first.PatientID,
+        "Affine": _series_affine(first, headers[-1][0], len(headers)),
+    }
+
+    elapsed = time.perf_counter() - start_time
+    megabytes = volume.nbytes / (1024 ** 2)
+    print(f"Loaded {len(headers)} DICOM slices ({megabytes:.1f} MB) in {elapsed:.2f}s "
+          f"({len(headers) / elapsed:.1f} slices/s, {megabytes / elapsed:.1f} MB/s, {max_workers} workers).")
+    return data, header
+
+
+class LazyVolume:
+    """
+    Lazy handle on a NIfTI volume built on nibabel's dataobj proxy.
+
+    Uncompressed .nii files are memory-mapped, data stays in its on-disk dtype until
+    a caller asks for floats, and slices or slabs can be read without loading the
+    whole volume.
+    """
+
+    def __init__(self, filepath, mmap=True):
+        import nibabel as nib
+
+        self.filepath = filepath
+        self.mmap = mmap
+        self.img = nib.load(filepath, mmap=mmap)
+        self.header = self.img.header
+        self.affine = self.img.affine
+        self.dataobj = self.img.dataobj
+
+    @property
+    def shape(self):
+        return self.img.shape
+
+    @property
+    def ndim(self):
+        return len(self.img.shape)
+
+    @property
+    def dtype(self):
+        """
+        The dtype array reads return: the on-disk dtype, or float64 when the header
+        sets a scaling slope/intercept (nibabel applies the scaling on read).
+        """
+        slope = getattr(self.dataobj, 'slope', 1.0)
+        inter = getattr(self.dataobj, 'inter', 0.0)
+        if slope != 1.0 or inter != 0.0:
+            return np.dtype(np.float64)
+        return self.header.get_data_dtype()
+
+    @property
+    def is_memmapped(self):
+        """
+        Whether array() returns a memory map, decided from the proxy without reading data:
+        nibabel maps the file only when mmap is enabled, the file is uncompressed and no
+        scaling has to be applied on read.
+        """
+        import nibabel as nib
+        from nibabel.openers import Opener
+
+        if not self.mmap or not nib.is_proxy(self.dataobj):
+            return False
+        file_like = getattr(self.dataobj, 'file_like', None)
+        if not isinstance(file_like, str):
+            return False
+        if any(ext and file_like.endswith(ext) for ext in Opener.compress_ext_map):
+            return False
+        slope = getattr(self.dataobj, 'slope', 1.0)
+        inter = getattr(self.dataobj, 'inter', 0.0)
+        return slope == 1.0 and inter == 0.0
+
+    def __getitem__(self, index):
+        # Proxy slicing only reads the requested region from disk.
+        return np.asanyarray(self.dataobj[index])
+
+    def array(self):
+        """
+        Returns the full volume in its native dtype. For uncompressed files this
+        is a read-only memory map rather than an in-memory copy.
+        """
+        return np.asanyarray(self.dataobj)
+
+    def astype(self, dtype=np.float32):
+        """
+        Materializes the full volume as `dtype`, converting without a float64 detour.
+        """
+        return np.asarray(self.dataobj, dtype=dtype)
+
+    def slice(self, index, axis=2):
+        """
+        Reads a single 2D slice along `axis`.
+        """
+        region = [slice(None)] * self.ndim
+        region[axis] = index
+        return self[tuple(region)]
+
+    def slab(self, start, stop, axis=2):
+        """
+        Reads the slices [start, stop) along `axis` as one block.
+        """
+        region = [slice(None)] * self.ndim
+        region[axis] = slice(start, stop)
+        return self[tuple(region)]
+
+    def iter_slabs(self, slab_size, axis=2):
+        """
+        Yields (start, stop, slab) tuples covering the volume along `axis`.
+        """
+        for start in range(0, self.shape[axis], slab_size):
+            stop = min(start + slab_size, self.shape[axis])
+            yield start, stop, self.slab(start, stop, axis)
+
+
+def load_nifti_volume(filepath, mmap=True):
+    """
+    Opens a NIfTI file as a LazyVolume without reading its voxel data.
+    """
+    return LazyVolume(filepath, mmap=mmap)
+
+
+def load_preprocessed_volume(path):
+    """
+    Loads a preprocessed volume for inference. Accepts a mri_preprocessor output directory,
+    a processed .npy file, or a NIfTI file.
+
+    .npy volumes are memory-mapped (copy-on-write) and used as-is, since the preprocessor
+    already normalized them; NIfTI volumes are read as float32 and rescaled to [0, 1].
+    Returns the volume and the metadata stored next to it (None if there is none).
+    """
+    metadata = None
+    if os.path.isdir(path):
+        import json
+
+        with open(os.path.join(path, METADATA_FILENAME), 'r') as f:
+            metadata = json.load(f)
+        path = os.path.join(path, metadata.get('processed_path', PROCESSED_FILENAME))
+
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='c')
+        print(f"Memory-mapped preprocessed data from .npy: {path}, shape: {data.shape}, dtype: {data.dtype}")
+        return data, metadata
+
+    data = load_nifti_volume(path).astype(np.float32)
+    # Normalize the preprocessed data to 0-1 range before inference if not already.
+    min_val, max_val = np.min(data), np.max(data)
+    data -= min_val
+    data /= (max_val - min_val + 1e-8)
+    print(f"Loaded preprocessed data from NIfTI: {path}, shape: {data.shape}")
+    return data, metadata
@@ -0,0 +1,131 @@
+import numpy as np
+
+
+def voxel_spacing_mm(metadata, shape=None):
+    """
+    (x, y, z) voxel size in mm from mri_preprocessor metadata: 'pixel_spacing' for x and y
+    (or the NIfTI 'voxel_sizes'), 'slice_thickness' for z. These describe the native grid;
+    given the shape of a volume on the processed grid (metadata['transform']['processed_shape']),
+    the native size is scaled by the recorded crop and resize to that grid's voxel size.
+    """
+    if 'pixel_spacing' not in metadata or 'slice_thickness' not in metadata:
+        raise ValueError("Metadata must contain 'pixel_spacing' and 'slice_thickness' for volume calculation.")
+
+    # Ensure pixel_spacing is a list/tuple of two values
+    pixel_spacing = metadata['pixel_spacing']
+    if isinstance(pixel_spacing, (list, tuple)) and len(pixel_spacing) == 2:
+        voxel_width = float(pixel_spacing[0])
+        voxel_height = float(pixel_spacing[1])
+    elif isinstance(pixel_spacing, (list, tuple)) and len(pixel_spacing) > 2: # For NIfTI, might be (x,y,z)
+        voxel_width = float(pixel_spacing[0])
+        voxel_height = float(pixel_spacing[1])
+        if metadata.get('file_type') == 'NIfTI' and 'voxel_sizes' in metadata:
+            # If NIfTI, try to get from voxel_sizes explicitly
+            voxel_width = float(metadata['voxel_sizes'][0])
+            voxel_height = float(metadata['voxel_sizes'][1])
+    else: # Fallback for single value or other formats
+        voxel_width = float(pixel_spacing)
+        voxel_height = float(pixel_spacing)
+
+    spacing = (voxel_width, voxel_height, float(metadata['slice_thickness']))
+    transform = metadata.get('transform')
+    if shape is not None and transform and list(shape) == transform['processed_shape']:
+        from spatial_transforms import processed_spacing
+        spacing = processed_spacing(transform, spacing)
+    return spacing
+
+
+def label_voxel_counts(mask):
+    """
+    Voxel count of every label in one pass (np.bincount); index i holds the count of label i.
+    Float masks (e.g. read with get_fdata) are accepted when every value is a whole number.
+    """
+    mask = np.asarray(mask)
+    if mask.dtype.kind == 'f':
+        if not np.array_equal(mask, np.round(mask)):
+            raise ValueError("Label masks must hold whole-number labels.")
+        mask = mask.astype(np.int64)
+    if mask.dtype.kind not in 'ub' and (mask.dtype.kind != 'i' or mask.min() < 0):
+        raise ValueError("Label masks must hold non-negative integers.")
+    return np.bincount(mask.ravel())
+
+
+def label_volumes(mask, spacing):
+    """
+    Returns {label: (voxel count, volume in mm³)} for every non-background label present.
+    """
+    counts = label_voxel_counts(mask)
+    voxel_volume_mm3 = float(np.prod(spacing))
+    return {int(label): (int(counts[label]), float(counts[label] * voxel_volume_mm3))
+            for label in np.flatnonzero(counts) if label != 0}
+
+
+def _surface_areas(components, num_components, spacing):
+    """
+    Exposed voxel-face area of every component (index i holds component i; 0 is background).
+    A face counts when the neighbouring voxel belongs to another component or lies outside
+    the volume, so this is the area of the voxelized boundary, not of a smoothed mesh.
+    """
+    areas = np.zeros(num_components + 1, dtype=np.float64)
+    padded = np.pad(components, 1)
+    for axis in range(components.ndim):
+        face_area = np.prod([spacing[a] for a in range(components.ndim) if a != axis])
+        lower = np.moveaxis(padded, axis, 0)[:-1]
+        upper = np.moveaxis(padded, axis, 0)[1:]
+        boundary = lower != upper
+        areas += face_area * np.bincount(lower[boundary], minlength=num_components + 1)
+        areas += face_area * np.bincount(upper[boundary], minlength=num_components + 1)
+    areas[0] = 0.0
+    return areas
+
+
+def lesion_statistics(mask, spacing, connectivity=1):
+    """
+    Splits every label of mask into connected components (lesions) and returns one dict per
+    lesion with its label, voxel count, volume (mm³), centroid (voxel and mm coordinates),
+    bounding box (inclusive start, exclusive stop) and voxelized surface area (mm²).
+    connectivity=1 joins face neighbours only, 3 also joins edge and corner neighbours.
+    Per-lesion values are computed with bincount over all components at once.
+    """
+    from scipy import ndimage
+
+    mask = np.asarray(mask)
+    structure = ndimage.generate_binary_structure(mask.ndim, connectivity)
+    components = np.zeros(mask.shape, dtype=np.int32)
+    component_labels = [0]
+    for label in np.flatnonzero(label_voxel_counts(mask)):
+        if label == 0:
+            continue
+        labelled, count = ndimage.label(mask == label, structure=structure)
+        components[labelled > 0] = labelled[labelled > 0] + len(component_labels) - 1
+        component_labels.extend([int(label)] * count)
+    num_components = len(component_labels) - 1
+    if num_components == 0:
+        return []
+
+    flat = components.ravel()
+    counts = np.bincount(flat, minlength=num_components + 1)
+    coordinates = np.indices(mask.shape, sparse=True)
+    centroids = np.stack([
+        np.bincount(flat, weights=np.broadcast_to(c, mask.shape).ravel(), minlength=num_components + 1)
+        for c in coordinates
+    ], axis=1) / np.maximum(counts, 1)[:, None]
+    surface_areas = _surface_areas(components, num_components, spacing)
+    boxes = ndimage.find_objects(components)
+    voxel_volume_mm3 = float(np.prod(spacing))
+
+    lesions = []
+    for index in range(1, num_components + 1):
+        box = boxes[index - 1]
+        lesions.append({
+            "lesion_id": index,
+            "label": component_labels[index],
+            "voxel_count": int(counts[index]),
+            "volume_mm3": float(counts[index] * voxel_volume_mm3),
+            "centroid_voxel": [float(c) for c in centroids[index]],
+            "centroid_mm": [float(c * s) for c, s in zip(centroids[index], spacing)],
+            "bbox_start": [int(s.start) for s in box],
+            "bbox_stop": [int(s.stop) for s in box],
+            "surface_area_mm2": float(surface_areas[index]),
+        })
+    return lesions